@@ -0,0 +1,107 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from .embedding_cache import normalize_text
+
+
+def normalize_question(question):
+    """
+    Reduces a question to the form used for exact matches: case, spacing and
+    trailing punctuation don't change the answer.
+    """
+    return normalize_text(question).casefold().rstrip(" ?!.")
+
+
+class AnswerCache:
+    """
+    An in-process cache of generated answers.
+
+    Lookups first try an exact match on the normalized question, then the most
+    similar cached question by cosine similarity of the query embeddings. Entries
+    expire after `ttl` seconds and the oldest are dropped past `max_entries`.
+    """
+
+    def __init__(self, ttl, similarity_threshold, max_entries):
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._matrix = None
+        self._matrix_keys = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_exact(self, question):
+        key = normalize_question(question)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry['expires'] < time.monotonic():
+                self._remove(key)
+                return None
+            return entry['answer']
+
+    def get_similar(self, vector):
+        """
+        Returns the answer for the closest cached question at or above the similarity threshold.
+        """
+        query = self._unit(vector)
+        with self._lock:
+            if not self._entries:
+                return None
+            if self._matrix is None:
+                self._matrix_keys = [
+                    key for key, entry in self._entries.items() if entry['vector'] is not None
+                ]
+                if not self._matrix_keys:
+                    return None
+                self._matrix = np.stack([self._entries[key]['vector'] for key in self._matrix_keys])
+
+            scores = self._matrix @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.similarity_threshold:
+                return None
+
+            key = self._matrix_keys[best]
+            entry = self._entries[key]
+            if entry['expires'] < time.monotonic():
+                self._remove(key)
+                return None
+            return entry['answer']
+
+    def set(self, question, vector, answer):
+        """
+        Caches an answer. Without a query vector the entry only serves exact matches.
+        """
+        key = normalize_question(question)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = {
+                'answer': answer,
+                'vector': self._unit(vector) if vector is not None else None,
+                'expires': time.monotonic() + self.ttl,
+            }
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def _remove(self, key):
+        del self._entries[key]
+        self._matrix = None
+
+    @staticmethod
+    def _unit(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
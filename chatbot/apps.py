@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ChatbotConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'chatbot'
+
+    def ready(self):
+        # Keep the chatbot's records index in sync with edits to the core models
+        from .signals import connect_signals
+        connect_signals()
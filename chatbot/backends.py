@@ -0,0 +1,117 @@
+"""
+Local stand-ins for the Gemini embedding and chat models.
+
+They need no network access or API key, and are deterministic, so the RAG
+pipeline can be load-tested and profiled on an isolated machine. Select them
+with the CHATBOT_EMBEDDING_BACKEND and CHATBOT_LLM_BACKEND settings.
+"""
+import asyncio
+import hashlib
+import math
+import time
+from collections import Counter
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from .lexical import tokenize
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Embeds text as a hashed bag of unigrams and bigrams.
+
+    Each term is hashed into one of `dimension` buckets with a hash-derived sign,
+    weighted by 1 + log(term frequency), and the vector is L2-normalized. Texts
+    that share vocabulary end up close together, which is enough to exercise
+    retrieval realistically.
+    """
+
+    def __init__(self, dimension=512):
+        self.dimension = dimension
+
+    def _embed(self, text):
+        tokens = tokenize(text)
+        terms = Counter(tokens)
+        terms.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+
+        vector = [0.0] * self.dimension
+        for term, count in terms.items():
+            digest = hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimension
+            sign = 1.0 if digest[4] & 1 else -1.0
+            vector[bucket] += sign * (1.0 + math.log(count))
+
+        norm = math.sqrt(sum(value * value for value in vector))
+        if norm:
+            vector = [value / norm for value in vector]
+        return vector
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+class EchoChatModel(BaseChatModel):
+    """
+    A chat model that answers by echoing the question and the start of the retrieved context.
+
+    `latency` is the delay before the first token and `token_delay` the delay
+    between streamed words, so generation cost can be simulated.
+    """
+
+    latency: float = 0.0
+    token_delay: float = 0.0
+    context_chars: int = 300
+
+    @property
+    def _llm_type(self):
+        return "echo"
+
+    def _reply(self, messages):
+        question = ""
+        context = ""
+        for message in messages:
+            if isinstance(message, HumanMessage):
+                question = message.content
+            elif isinstance(message, SystemMessage):
+                # The prompt puts the retrieved context after the instructions
+                context = message.content.split("\n\n", 1)[-1]
+        excerpt = " ".join(context.split())[:self.context_chars]
+        return f"You asked: {question} Here is what my biography says: {excerpt}"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        reply = self._reply(messages)
+        time.sleep(self.latency + self.token_delay * len(reply.split()))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=reply))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        reply = self._reply(messages)
+        await asyncio.sleep(self.latency + self.token_delay * len(reply.split()))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=reply))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        for position, word in enumerate(self._reply(messages).split(" ")):
+            if position:
+                time.sleep(self.token_delay)
+                word = " " + word
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word))
+            if run_manager:
+                run_manager.on_llm_new_token(word, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        for position, word in enumerate(self._reply(messages).split(" ")):
+            if position:
+                await asyncio.sleep(self.token_delay)
+                word = " " + word
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word))
+            if run_manager:
+                await run_manager.on_llm_new_token(word, chunk=chunk)
+            yield chunk
@@ -0,0 +1,102 @@
+import asyncio
+import threading
+import weakref
+
+
+class Abandoned(Exception):
+    """Raised to callers waiting on a leader that stopped without an outcome; they should try again."""
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time across threads.
+
+    Callers that arrive while a call for their key is in flight wait for it and
+    share its result, or its exception, instead of starting their own.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def join(self, key):
+        """
+        Returns (call, leader). The leader must run the work and hand the outcome to
+        `finish`; everyone else calls `call.wait()`.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                return call, False
+            call = self._calls[key] = _Call()
+            return call, True
+
+    def finish(self, key, call, result=None, error=None):
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.result, call.error = result, error
+        call.done.set()
+
+    def do(self, key, fn):
+        call, leader = self.join(key)
+        while not leader:
+            try:
+                return call.wait()
+            except Abandoned:
+                call, leader = self.join(key)
+        try:
+            result = fn()
+        except BaseException as e:
+            self.finish(key, call, error=e)
+            raise
+        self.finish(key, call, result=result)
+        return result
+
+    def __len__(self):
+        return len(self._calls)
+
+
+class AsyncSingleFlight:
+    """
+    The asyncio counterpart of SingleFlight.
+
+    The shared call runs as its own task, shielded from its callers, so a caller
+    that times out or disconnects doesn't cancel it for the others. Tasks belong
+    to one event loop, so calls are only shared within a loop.
+    """
+
+    def __init__(self):
+        self._tasks = weakref.WeakKeyDictionary()
+
+    async def do(self, key, fn):
+        """
+        Awaits fn() for the first caller with this key, and the same task for any that join it.
+        """
+        tasks = self._tasks.setdefault(asyncio.get_running_loop(), {})
+        task = tasks.get(key)
+        if task is None:
+            task = tasks[key] = asyncio.ensure_future(fn())
+
+            def finished(done):
+                if tasks.get(key) is done:
+                    del tasks[key]
+                # Mark a failure as seen even if every caller has given up waiting
+                if not done.cancelled():
+                    done.exception()
+
+            task.add_done_callback(finished)
+        return await asyncio.shield(task)
@@ -0,0 +1,102 @@
+import math
+
+from langchain_core.documents import Document
+
+# Roughly four characters per token for English text with Gemini's tokenizer
+CHARS_PER_TOKEN = 4
+
+# Overlaps shorter than this are left alone; they're more likely coincidence than a shared chunk border
+MIN_OVERLAP_CHARS = 20
+
+# A chunk cut down to fewer tokens than this isn't worth keeping
+MIN_TRIMMED_TOKENS = 30
+
+# Marks a trimmed chunk
+TRIM_SUFFIX = " …"
+
+
+def estimate_tokens(text):
+    """
+    Estimates the prompt tokens a piece of text costs, without calling a tokenizer.
+    """
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _normalize(text):
+    return " ".join(text.split())
+
+
+def _border_overlap(left, right):
+    """
+    Returns the length of the longest suffix of `left` that starts `right`.
+    """
+    if len(right) < MIN_OVERLAP_CHARS:
+        return 0
+    # Only positions where right's opening characters occur can start an overlap; the first is the longest
+    probe = right[:MIN_OVERLAP_CHARS]
+    position = left.find(probe, max(0, len(left) - len(right)))
+    while position != -1:
+        if right.startswith(left[position:]):
+            return len(left) - position
+        position = left.find(probe, position + 1)
+    return 0
+
+
+def remove_overlap(text, kept):
+    """
+    Drops the parts of `text` already present in the kept chunks: a chunk contained
+    in one of them comes back empty, and text shared at a chunk border (from the
+    splitter's overlap) is cut off.
+    """
+    for other in kept:
+        if text in other:
+            return ""
+        overlap = _border_overlap(other, text)
+        if overlap:
+            text = text[overlap:].lstrip()
+        overlap = _border_overlap(text, other)
+        if overlap:
+            text = text[:-overlap].rstrip()
+    return text
+
+
+def trim_to_tokens(text, tokens):
+    """
+    Cuts text down to at most `tokens` estimated tokens, at a word boundary.
+    """
+    if estimate_tokens(text) <= tokens:
+        return text
+    # Room is kept for the suffix, so the trimmed text still fits
+    limit = tokens * CHARS_PER_TOKEN - len(TRIM_SUFFIX)
+    cut = text.rfind(" ", 0, limit)
+    return text[:cut if cut > 0 else limit].rstrip() + TRIM_SUFFIX
+
+
+def pack_documents(docs, budget):
+    """
+    Fits ranked documents into a prompt budget of `budget` estimated tokens.
+
+    Documents are taken best first. Text another document already covers is
+    removed, the last document that fits is trimmed, and the rest are dropped.
+    Returns new Documents; the originals are left as they are.
+    """
+    packed, kept, used = [], [], 0
+    for doc in docs:
+        text = remove_overlap(_normalize(doc.page_content), kept)
+        if not text:
+            continue
+
+        tokens = estimate_tokens(text)
+        if used + tokens > budget:
+            remaining = budget - used
+            if remaining < MIN_TRIMMED_TOKENS:
+                break
+            text = trim_to_tokens(text, remaining)
+            tokens = estimate_tokens(text)
+
+        kept.append(text)
+        packed.append(Document(page_content=text, metadata=doc.metadata, id=doc.id))
+        used += tokens
+        if used >= budget:
+            break
+    return packed
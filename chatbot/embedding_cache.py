@@ -0,0 +1,179 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+
+import numpy as np
+from django.conf import settings
+from langchain_core.embeddings import Embeddings
+
+from . import metrics
+
+_cache = None
+_cache_lock = threading.Lock()
+
+# Refreshing last-used on every hit would turn each lookup into a write, so it's throttled
+TOUCH_INTERVAL = 60 * 60
+
+
+def normalize_text(text):
+    """
+    Normalizes text so that trivially different inputs share one cache entry.
+    """
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+
+def cache_key(namespace, text):
+    return hashlib.sha256(f"{namespace}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    A persistent, size-bounded embedding store backed by a SQLite file.
+
+    Vectors are stored as raw float32 bytes. A hit refreshes the entry's
+    last-used time at most once per TOUCH_INTERVAL, and the least recently used
+    entries are evicted once the store grows past `max_entries`.
+    """
+
+    def __init__(self, path, max_entries):
+        self.path = str(path)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+
+    def get_many(self, keys):
+        """
+        Returns a dict of key -> vector for the keys that are cached.
+        """
+        if not keys:
+            return {}
+        found, stale = {}, []
+        now = time.time()
+        with self._lock:
+            unique_keys = list(dict.fromkeys(keys))
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(unique_keys), 500):
+                batch = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector, last_used FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob, last_used in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+                    if now - last_used > TOUCH_INTERVAL:
+                        stale.append(key)
+            if stale:
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key in stale]
+                )
+                self._conn.commit()
+        return found
+
+    def set_many(self, items):
+        """
+        Stores a dict of key -> vector, evicting the least recently used entries if needed.
+        """
+        if not items:
+            return
+        now = time.time()
+        rows = [
+            (key, np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for key, vector in items.items()
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN ("
+                    " SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embedding model so document chunks and queries are only embedded once.
+
+    Entries are keyed by (model name, task, normalized text hash); document and
+    query vectors are kept apart because providers embed them differently.
+    """
+
+    def __init__(self, embeddings, model_name, cache):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache = cache
+
+    def embed_documents(self, texts):
+        texts = [normalize_text(text) for text in texts]
+        keys = [cache_key(f"{self.model_name}:document", text) for text in texts]
+        cached = self.cache.get_many(keys)
+
+        # Embed each distinct missing text once, in a single batched call
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        metrics.count_cache('document_embedding', 'hit', len(keys) - len(missing))
+        metrics.count_cache('document_embedding', 'miss', len(missing))
+        if missing:
+            with metrics.timer('embed_documents'):
+                vectors = self.embeddings.embed_documents(list(missing.values()))
+            fresh = dict(zip(missing.keys(), vectors))
+            self.cache.set_many(fresh)
+            cached.update(fresh)
+
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text):
+        # The whole lookup is timed, so cache reads and writes show in the stage too
+        with metrics.timer('embed_query'):
+            text = normalize_text(text)
+            key = cache_key(f"{self.model_name}:query", text)
+            cached = self.cache.get_many([key])
+            if key in cached:
+                metrics.count_cache('query_embedding', 'hit')
+                return cached[key]
+
+            metrics.count_cache('query_embedding', 'miss')
+            vector = self.embeddings.embed_query(text)
+            self.cache.set_many({key: vector})
+        return vector
+
+
+def get_embedding_cache():
+    """
+    Returns the process-wide embedding cache configured in settings.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache(
+                    settings.CHATBOT_EMBEDDING_CACHE_PATH,
+                    settings.CHATBOT_EMBEDDING_CACHE_MAX_ENTRIES,
+                )
+    return _cache
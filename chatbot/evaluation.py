@@ -0,0 +1,175 @@
+"""
+Offline evaluation of the chatbot's retrieval against a fixed question set.
+
+Each question lists snippets of biography.txt that a good answer needs. A
+configuration is scored by how many of those snippets make it into the context
+the LLM would see, and how many prompt tokens that context costs, so chunking,
+top-k, MMR and the token budget can be tuned without calling the LLM.
+
+`benchmark_question` runs a question through the whole pipeline one stage at a
+time instead, for the latency report written by `manage.py benchmark_chatbot`.
+"""
+import hashlib
+import json
+import statistics
+import time
+
+from django.conf import settings
+
+from . import rag_logic
+from .context import estimate_tokens, pack_documents
+
+# Pipeline stages timed per question by benchmark_question, in order
+STAGES = ('embed_query', 'search', 'prompt_build', 'generate')
+
+DEFAULT_QUESTIONS_PATH = settings.BASE_DIR / 'chatbot' / 'data' / 'eval' / 'questions_v1.json'
+
+
+def load_questions(path=None):
+    with open(path or DEFAULT_QUESTIONS_PATH, encoding='utf-8') as f:
+        return json.load(f)['questions']
+
+
+def question_set_info(path=None):
+    """
+    Returns the version and content hash of a question set, so reports say exactly what they measured.
+    """
+    with open(path or DEFAULT_QUESTIONS_PATH, 'rb') as f:
+        raw = f.read()
+    return {
+        'path': str(path or DEFAULT_QUESTIONS_PATH),
+        'version': json.loads(raw).get('version'),
+        'sha256': hashlib.sha256(raw).hexdigest()[:16],
+    }
+
+
+def build_retriever(api_key, strategy=None, chunk_size=None, chunk_overlap=None, **overrides):
+    """
+    Splits and embeds the biography with the given chunking and returns (retriever, chunk count).
+
+    Only the biography is indexed, not the database records, so results don't
+    depend on the site's content. Chunk vectors go through the embedding cache.
+    """
+    text_content = rag_logic.get_text_content()
+    if not text_content:
+        raise ValueError('Could not load the biography knowledge base.')
+    splitter = rag_logic.get_text_splitter(strategy, chunk_size, chunk_overlap)
+    vectorstore = rag_logic.embed_vector_store(text_content, api_key, splitter)
+    lexical_index = rag_logic.build_lexical_index(vectorstore)
+    return rag_logic.get_retriever([vectorstore], lexical_index, **overrides), vectorstore.index.ntotal
+
+
+def score_question(question, docs):
+    """
+    Scores one question's retrieved documents: the share of expected snippets found
+    in them, and the 1-based rank of the first document holding any snippet.
+    """
+    texts = [" ".join(doc.page_content.split()).lower() for doc in docs]
+    context = "\n".join(texts)
+    expected = [" ".join(snippet.split()).lower() for snippet in question['expected']]
+    found = [snippet for snippet in expected if snippet in context]
+    first_rank = next(
+        (rank for rank, text in enumerate(texts, start=1) if any(snippet in text for snippet in expected)),
+        None,
+    )
+    return {
+        'id': question['id'],
+        'recall': len(found) / len(expected),
+        'answered': len(found) == len(expected),
+        'first_rank': first_rank,
+        'chunks': len(docs),
+        'context_tokens': sum(estimate_tokens(doc.page_content) for doc in docs),
+        'missing': [snippet for snippet in question['expected'] if " ".join(snippet.split()).lower() not in found],
+    }
+
+
+def evaluate(retriever, questions):
+    """
+    Runs every question through the retriever and returns the summary metrics
+    with the per-question scores under 'questions'.
+    """
+    results, timings = [], []
+    for question in questions:
+        started = time.perf_counter()
+        docs = retriever.invoke(question['question'])
+        timings.append(time.perf_counter() - started)
+        results.append(score_question(question, docs))
+
+    count = len(results)
+    return {
+        'questions': results,
+        'recall': sum(result['recall'] for result in results) / count,
+        'answered': sum(result['answered'] for result in results) / count,
+        'mrr': sum(1 / result['first_rank'] for result in results if result['first_rank']) / count,
+        'avg_chunks': sum(result['chunks'] for result in results) / count,
+        'avg_context_tokens': sum(result['context_tokens'] for result in results) / count,
+        'median_retrieval_ms': statistics.median(timings) * 1000,
+    }
+
+
+def benchmark_question(service, question, use_embedding_cache=True):
+    """
+    Answers one question through the service's retriever, prompt and LLM, bypassing
+    the answer cache, and returns its stage timings (ms) with the retrieval scores.
+
+    Questions with a decisive keyword match skip the query embedding, as they do
+    in production, so their embed_query time is 0.
+    """
+    retriever = service.retriever
+    timings = {}
+
+    # 1. Keyword search, done once; its time counts towards the search stage
+    started = time.perf_counter()
+    hits = retriever.lexical_hits(question['question'])
+    lexical_only = retriever.is_lexically_decisive(question['question'], hits)
+    lexical_seconds = time.perf_counter() - started
+
+    # 2. Embed the query, unless the keyword match alone will do
+    started = time.perf_counter()
+    embedding = None
+    if not lexical_only:
+        embeddings = retriever.embeddings if use_embedding_cache else retriever.embeddings.embeddings
+        embedding = embeddings.embed_query(question['question'])
+    timings['embed_query'] = time.perf_counter() - started
+
+    # 3. Rank and pack the chunks
+    started = time.perf_counter()
+    ranked = retriever.ranked_documents(question['question'], embedding, hits)
+    docs = pack_documents(ranked, retriever.context_token_budget) if retriever.context_token_budget else ranked
+    timings['search'] = lexical_seconds + time.perf_counter() - started
+
+    # 4. Fill the prompt the way the stuff documents chain does
+    started = time.perf_counter()
+    context = "\n\n".join(doc.page_content for doc in docs)
+    messages = rag_logic.get_prompt().format_messages(input=question['question'], context=context)
+    timings['prompt_build'] = time.perf_counter() - started
+
+    # 5. Generate
+    started = time.perf_counter()
+    answer = service.llm.invoke(messages).content
+    timings['generate'] = time.perf_counter() - started
+
+    expected = [" ".join(snippet.split()).lower() for snippet in question['expected']]
+    normalized_answer = " ".join(answer.split()).lower()
+    return {
+        **score_question(question, docs),
+        'recall_at_k': score_question(question, ranked)['recall'],
+        'answer_recall': sum(snippet in normalized_answer for snippet in expected) / len(expected),
+        'lexical_only': lexical_only,
+        'prompt_tokens': sum(estimate_tokens(message.content) for message in messages),
+        'answer_tokens': estimate_tokens(answer),
+        'timings_ms': {stage: round(seconds * 1000, 3) for stage, seconds in timings.items()},
+    }
+
+
+def summarize_timings(samples):
+    """
+    Returns median, p95, mean and max of a list of millisecond timings.
+    """
+    ordered = sorted(samples)
+    return {
+        'median': round(statistics.median(ordered), 3),
+        'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        'mean': round(statistics.mean(ordered), 3),
+        'max': round(ordered[-1], 3),
+    }
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import faiss
+from django.conf import settings
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from .lexical import BM25Index
+
+# Bump this whenever the on-disk layout changes so old artifacts are ignored.
+ARTIFACT_FORMAT = 2
+
+INDEX_FILENAME = 'index.faiss'
+CHUNKS_FILENAME = 'chunks.json'
+MANIFEST_FILENAME = 'manifest.json'
+LEXICAL_FILENAME = 'bm25.json'
+
+
+def artifact_version(text_content, build_params):
+    """
+    Returns the content hash that names the artifact for this text and build configuration.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"format={ARTIFACT_FORMAT}\n".encode('utf-8'))
+    digest.update(json.dumps(build_params, sort_keys=True).encode('utf-8'))
+    digest.update(b"\n")
+    digest.update(text_content.encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def artifact_path(version):
+    return os.path.join(settings.CHATBOT_INDEX_DIR, version)
+
+
+def write_artifact(vectorstore, lexical_index, version, build_params):
+    """
+    Writes the FAISS index, the BM25 inverted index and the chunk metadata to a versioned directory.
+
+    The files are written to a temporary directory first and renamed into place,
+    so a loader never sees a half-written artifact.
+    """
+    target = artifact_path(version)
+    os.makedirs(settings.CHATBOT_INDEX_DIR, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=f".{version}-", dir=settings.CHATBOT_INDEX_DIR)
+
+    try:
+        faiss.write_index(vectorstore.index, os.path.join(staging, INDEX_FILENAME))
+
+        chunks = []
+        for position in range(vectorstore.index.ntotal):
+            doc_id = vectorstore.index_to_docstore_id[position]
+            doc = vectorstore.docstore.search(doc_id)
+            chunks.append({
+                'id': doc_id,
+                'page_content': doc.page_content,
+                'metadata': doc.metadata,
+            })
+        with open(os.path.join(staging, CHUNKS_FILENAME), 'w', encoding='utf-8') as f:
+            json.dump(chunks, f, ensure_ascii=False)
+        with open(os.path.join(staging, LEXICAL_FILENAME), 'w', encoding='utf-8') as f:
+            json.dump(lexical_index.to_dict(), f, ensure_ascii=False)
+
+        manifest = {
+            'format': ARTIFACT_FORMAT,
+            'version': version,
+            'build_params': build_params,
+            'dimension': vectorstore.index.d,
+            'chunk_count': len(chunks),
+        }
+        with open(os.path.join(staging, MANIFEST_FILENAME), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+
+        if os.path.isdir(target):
+            shutil.rmtree(target)
+        os.replace(staging, target)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    return target
+
+
+def read_manifest(version):
+    """
+    Returns the manifest of a current-format artifact, or None if there isn't one.
+    """
+    manifest_file = os.path.join(artifact_path(version), MANIFEST_FILENAME)
+    if not os.path.exists(manifest_file):
+        return None
+    with open(manifest_file, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('format') != ARTIFACT_FORMAT:
+        return None
+    return manifest
+
+
+def load_artifact(version, embeddings):
+    """
+    Loads a prebuilt artifact as a FAISS vector store, or returns None if it does not exist.
+
+    The index's vectors are memory-mapped read-only in place (IO_FLAG_MMAP_IFC; plain
+    IO_FLAG_MMAP still copies a flat index onto the heap), so every worker process on
+    the host shares the same pages from the OS cache instead of holding its own copy.
+    The loaded index can't be added to: faiss aborts the process if it tries.
+    """
+    if read_manifest(version) is None:
+        return None
+
+    path = artifact_path(version)
+    index = faiss.read_index(
+        os.path.join(path, INDEX_FILENAME),
+        faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY,
+    )
+    with open(os.path.join(path, CHUNKS_FILENAME), 'r', encoding='utf-8') as f:
+        chunks = json.load(f)
+
+    docstore = InMemoryDocstore({
+        chunk['id']: Document(id=chunk['id'], page_content=chunk['page_content'], metadata=chunk['metadata'])
+        for chunk in chunks
+    })
+    index_to_docstore_id = {position: chunk['id'] for position, chunk in enumerate(chunks)}
+    return FAISS(embeddings, index, docstore, index_to_docstore_id)
+
+
+def load_lexical_index(version):
+    """
+    Loads the BM25 index stored with an artifact, or returns None if it does not exist.
+    """
+    if read_manifest(version) is None:
+        return None
+    with open(os.path.join(artifact_path(version), LEXICAL_FILENAME), 'r', encoding='utf-8') as f:
+        return BM25Index.from_dict(json.load(f))
@@ -0,0 +1,308 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import defaultdict
+
+import faiss
+from django.apps import apps
+from django.conf import settings
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+# The core models whose rows become knowledge-base documents
+RECORD_MODELS = (
+    'core.experience',
+    'core.project',
+    'core.education',
+    'core.certification',
+    'core.award',
+    'core.skill',
+)
+
+# Models that only appear inside other records' text (a skill's category, a project's category)
+RELATED_MODELS = (
+    'core.skillcategory',
+    'core.projectcategory',
+)
+
+# A records journal line asking every process to re-sync all records
+FULL_SYNC = '*'
+
+
+def _date(value):
+    return value.strftime('%B %Y') if value else 'present'
+
+
+def _experience_text(obj):
+    where = f" ({obj.location})" if obj.location else ""
+    return (
+        f"Experience: {obj.role} at {obj.company}{where}, "
+        f"{_date(obj.start_date)} to {_date(obj.end_date)}. {obj.description}"
+    )
+
+
+def _project_text(obj):
+    category = f" ({obj.category.name})" if obj.category else ""
+    parts = [f"Project: {obj.title}{category}."]
+    if obj.tech_stack:
+        parts.append(f"Tech stack: {obj.tech_stack}.")
+    parts.append(obj.description)
+    if obj.repo_url:
+        parts.append(f"Repository: {obj.repo_url}")
+    if obj.live_url:
+        parts.append(f"Live site: {obj.live_url}")
+    return " ".join(parts)
+
+
+def _education_text(obj):
+    return (
+        f"Education: {obj.program} at {obj.school}, "
+        f"{_date(obj.start_date)} to {_date(obj.end_date)}. {obj.description}"
+    )
+
+
+def _certification_text(obj):
+    issued = f" on {obj.issue_date:%B %Y}" if obj.issue_date else ""
+    issuer = f" issued by {obj.issuer}" if obj.issuer else ""
+    return f"Certification: {obj.name}{issuer}{issued}. {obj.url}"
+
+
+def _award_text(obj):
+    return f"Award: {obj.title} from {obj.issuer} ({obj.year}). {obj.description}"
+
+
+def _skill_text(obj):
+    return f"Skill: {obj.name} ({obj.category.name}), proficiency {obj.level}/100."
+
+
+RECORD_TEXT = {
+    'core.experience': _experience_text,
+    'core.project': _project_text,
+    'core.education': _education_text,
+    'core.certification': _certification_text,
+    'core.award': _award_text,
+    'core.skill': _skill_text,
+}
+
+
+def record_id(label, pk):
+    return f"{label}:{pk}"
+
+
+def document_for_instance(instance):
+    label = instance._meta.label_lower
+    text = " ".join(RECORD_TEXT[label](instance).split())
+    return Document(
+        id=record_id(label, instance.pk),
+        page_content=text,
+        metadata={'source': label, 'pk': instance.pk},
+    )
+
+
+def _queryset(label):
+    queryset = apps.get_model(label).objects.all()
+    if label in ('core.project', 'core.skill'):
+        queryset = queryset.select_related('category')
+    return queryset
+
+
+def record_documents():
+    """
+    Yields a document for every row of the record models.
+    """
+    for label in RECORD_MODELS:
+        for instance in _queryset(label):
+            yield document_for_instance(instance)
+
+
+def record_documents_for(doc_ids):
+    """
+    Returns (documents, missing ids) for record ids: the current document of each
+    row that still exists, and the ids of the rows that don't.
+    """
+    pks = defaultdict(list)
+    for doc_id in doc_ids:
+        label, pk = doc_id.rsplit(':', 1)
+        if label in RECORD_MODELS:
+            pks[label].append(pk)
+    docs = [
+        document_for_instance(instance)
+        for label, label_pks in pks.items()
+        for instance in _queryset(label).filter(pk__in=label_pks)
+    ]
+    found = {doc.id for doc in docs}
+    return docs, [doc_id for doc_id in doc_ids if doc_id not in found]
+
+
+# --- Records journal ---
+# Every process on the host appends the id of each record it changes to one file.
+# A process remembers how far it has read (the file's inode and length), so it only
+# re-reads the rows named since then instead of scanning every table.
+
+def journal_position():
+    """
+    Returns where the records journal ends, as (inode, length); (None, 0) if there isn't one yet.
+    """
+    try:
+        stat = os.stat(settings.CHATBOT_RECORDS_JOURNAL_PATH)
+    except OSError:
+        return (None, 0)
+    return (stat.st_ino, stat.st_size)
+
+
+def log_record_change(label=None, pk=None):
+    """
+    Appends a changed record, or with no arguments a request for a full re-sync, to the
+    records journal. Returns the journal positions just before and after the new line.
+    """
+    path = settings.CHATBOT_RECORDS_JOURNAL_PATH
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    line = ((FULL_SYNC if label is None else record_id(label, pk)) + '\n').encode('utf-8')
+
+    # Start a new journal once this one is long. It opens with a full re-sync request, so
+    # a process reading it from the start can't miss lines left behind in the old one.
+    if journal_position()[1] >= settings.CHATBOT_RECORDS_JOURNAL_MAX_BYTES:
+        fd, fresh = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(f'{FULL_SYNC}\n'.encode('utf-8'))
+        os.replace(fresh, path)
+
+    with open(path, 'ab') as f:
+        f.write(line)
+        f.flush()
+        # The append lands at the end of the file, wherever other processes left it
+        end = (os.fstat(f.fileno()).st_ino, f.tell())
+    return (end[0], end[1] - len(line)), end
+
+
+def read_record_changes(position):
+    """
+    Returns (record ids, new position) for the changes journaled after `position`.
+    The ids are None when only a full re-sync will do: one was requested, or the
+    journal was started afresh.
+    """
+    current = journal_position()
+    if position is not None and position[0] is None and current[0] is not None:
+        # No journal existed at the last sync, so everything in this one is new
+        position = (current[0], 0)
+    if position is None or current[0] != position[0] or current[1] < position[1]:
+        return None, current
+    if current == position:
+        return set(), current
+
+    with open(settings.CHATBOT_RECORDS_JOURNAL_PATH, 'rb') as f:
+        if os.fstat(f.fileno()).st_ino != position[0]:
+            return None, journal_position()
+        f.seek(position[1])
+        data = f.read(current[1] - position[1])
+    # A line still being written is left for next time
+    data = data[:data.rfind(b'\n') + 1]
+    end = (position[0], position[1] + len(data))
+
+    doc_ids = set(data.decode('utf-8').split())
+    if FULL_SYNC in doc_ids:
+        return None, end
+    return doc_ids, end
+
+
+def _fingerprint(doc):
+    return hashlib.sha256(doc.page_content.encode('utf-8')).hexdigest()
+
+
+class RecordStore:
+    """
+    A vector store of core model rows that is updated one row at a time.
+
+    Each document's content hash is tracked, so re-saving an unchanged row (for
+    example reordering it in the admin) does no work, and a changed row only
+    replaces its own vector. New text goes through the cached embedding model.
+    """
+
+    def __init__(self, embeddings, dimension, lexical_index):
+        self.vectorstore = FAISS(embeddings, faiss.IndexFlatL2(dimension), InMemoryDocstore(), {})
+        self.lexical_index = lexical_index
+        self.fingerprints = {}
+        # doc_id -> position in the FAISS index, built on first use after each change
+        self._positions = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+    @property
+    def docstore(self):
+        return self.vectorstore.docstore
+
+    def similarity_search_with_score_by_vector(self, embedding, k):
+        with self._lock:
+            if not self.fingerprints:
+                return []
+            return self.vectorstore.similarity_search_with_score_by_vector(embedding, k=k)
+
+    def stored_vectors(self, doc_ids):
+        """
+        Returns {doc_id: vector} for those of doc_ids in the store, read back from the FAISS index.
+        """
+        with self._lock:
+            if self._positions is None:
+                self._positions = {
+                    doc_id: position for position, doc_id in self.vectorstore.index_to_docstore_id.items()
+                }
+            return {
+                doc_id: self.vectorstore.index.reconstruct(self._positions[doc_id])
+                for doc_id in doc_ids if doc_id in self._positions
+            }
+
+    def upsert(self, docs):
+        """
+        Adds or replaces documents whose content changed. Returns the number updated.
+        """
+        changed = [doc for doc in docs if self.fingerprints.get(doc.id) != _fingerprint(doc)]
+        if not changed:
+            return 0
+
+        # Embed outside the lock so searches aren't held up by the embedding call
+        texts = [doc.page_content for doc in changed]
+        vectors = self.vectorstore.embedding_function.embed_documents(texts)
+
+        with self._lock:
+            self._delete([doc.id for doc in changed])
+            self.vectorstore.add_embeddings(
+                zip(texts, vectors),
+                metadatas=[doc.metadata for doc in changed],
+                ids=[doc.id for doc in changed],
+            )
+            for doc in changed:
+                self.lexical_index.add(doc.id, doc.page_content)
+                self.fingerprints[doc.id] = _fingerprint(doc)
+            self._positions = None
+        return len(changed)
+
+    def remove(self, doc_ids):
+        """
+        Removes documents by id. Returns the number removed.
+        """
+        with self._lock:
+            return self._delete(doc_ids)
+
+    def sync(self, docs):
+        """
+        Brings the store in line with the full set of documents: stale ids are removed
+        and only new or changed documents are embedded. Returns the number of changes.
+        """
+        docs = list(docs)
+        wanted = {doc.id for doc in docs}
+        removed = self.remove([doc_id for doc_id in self.fingerprints if doc_id not in wanted])
+        return removed + self.upsert(docs)
+
+    def _delete(self, doc_ids):
+        present = [doc_id for doc_id in doc_ids if doc_id in self.fingerprints]
+        if present:
+            self.vectorstore.delete(present)
+            self._positions = None
+            for doc_id in present:
+                self.lexical_index.remove(doc_id)
+                del self.fingerprints[doc_id]
+        return len(present)
@@ -0,0 +1,118 @@
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """
+    An in-memory inverted index scored with Okapi BM25.
+
+    Postings map each term to {doc_id: term frequency}, so a query only touches
+    the documents containing its terms. Each document's distinct terms are kept
+    too, so removing it only touches its own postings. Documents can be added and
+    removed one at a time (safely alongside searches), and the index round-trips
+    through plain dicts for storage.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(dict)
+        self.doc_lengths = {}
+        # doc_id -> the distinct terms it contains
+        self.doc_terms = {}
+        self.total_length = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.doc_lengths
+
+    def add(self, doc_id, text):
+        terms = Counter(tokenize(text))
+        with self._lock:
+            if doc_id in self.doc_lengths:
+                self.remove(doc_id)
+            for term, count in terms.items():
+                self.postings[term][doc_id] = count
+            length = sum(terms.values())
+            self.doc_lengths[doc_id] = length
+            self.doc_terms[doc_id] = tuple(terms)
+            self.total_length += length
+
+    def remove(self, doc_id):
+        with self._lock:
+            length = self.doc_lengths.pop(doc_id, None)
+            if length is None:
+                return
+            self.total_length -= length
+            for term in self.doc_terms.pop(doc_id, ()):
+                del self.postings[term][doc_id]
+                if not self.postings[term]:
+                    del self.postings[term]
+
+    def idf(self, term):
+        matches = len(self.postings.get(term, ()))
+        return math.log(1 + (len(self.doc_lengths) - matches + 0.5) / (matches + 0.5))
+
+    def search(self, query, k):
+        """
+        Returns up to k (doc_id, score, normalized_score) tuples, best first.
+
+        The normalized score divides by the score of a document of average length
+        containing each indexed query term once, capped at 1. Query terms that appear
+        in no document are left out, so filler words can't drag it down.
+        """
+        terms = Counter(tokenize(query))
+        with self._lock:
+            if not self.doc_lengths:
+                return []
+            average_length = self.total_length / len(self.doc_lengths) or 1
+
+            scores = defaultdict(float)
+            best_possible = 0.0
+            for term, query_count in terms.items():
+                if term not in self.postings:
+                    continue
+                idf = self.idf(term)
+                best_possible += query_count * idf
+                for doc_id, frequency in self.postings[term].items():
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / average_length)
+                    scores[doc_id] += query_count * idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [
+            (doc_id, score, min(1.0, score / best_possible) if best_possible else 0.0)
+            for doc_id, score in ranked
+        ]
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'k1': self.k1,
+                'b': self.b,
+                'postings': {term: dict(docs) for term, docs in self.postings.items()},
+                'doc_lengths': dict(self.doc_lengths),
+            }
+
+    @classmethod
+    def from_dict(cls, data):
+        index = cls(k1=data['k1'], b=data['b'])
+        index.postings = defaultdict(dict, data['postings'])
+        index.doc_lengths = dict(data['doc_lengths'])
+        index.total_length = sum(index.doc_lengths.values())
+        doc_terms = defaultdict(list)
+        for term, docs in index.postings.items():
+            for doc_id in docs:
+                doc_terms[doc_id].append(term)
+        index.doc_terms = {doc_id: tuple(terms) for doc_id, terms in doc_terms.items()}
+        return index
@@ -0,0 +1,159 @@
+import json
+import os
+import platform
+import time
+from datetime import datetime, timezone
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from chatbot import rag_logic
+from chatbot.evaluation import STAGES, benchmark_question, load_questions, question_set_info, summarize_timings
+from chatbot.service import RagService, RagServiceError
+
+
+class Command(BaseCommand):
+    help = ('Runs the evaluation question set through the full chatbot pipeline and writes a JSON report '
+            'of per-stage timings, recall@k and prompt sizes')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', help='Question set to use (default: chatbot/data/eval/questions_v1.json).')
+        parser.add_argument(
+            '--local',
+            action='store_true',
+            help='Use the offline hashing embeddings and echo LLM instead of the configured backends.',
+        )
+        parser.add_argument('--repeat', type=int, default=1, help='Times to run each question.')
+        parser.add_argument(
+            '--no-embedding-cache',
+            action='store_true',
+            help='Embed every query with the model, bypassing the on-disk embedding cache.',
+        )
+        parser.add_argument('--output', default='chatbot_benchmark.json', help='Where to write the report.')
+        parser.add_argument('--baseline', help='An earlier report to compare against.')
+        parser.add_argument(
+            '--max-recall-drop',
+            type=float,
+            default=0.0,
+            help='With --baseline, fail if recall@k fell by more than this.',
+        )
+
+    def handle(self, *args, **options):
+        if options['local']:
+            settings.CHATBOT_EMBEDDING_BACKEND = 'local'
+            settings.CHATBOT_LLM_BACKEND = 'echo'
+        api_key = os.getenv("GOOGLE_API_KEY")
+        if not api_key and rag_logic.requires_api_key():
+            raise CommandError('GOOGLE_API_KEY is not configured; use --local to benchmark offline.')
+
+        try:
+            questions = load_questions(options['questions'])
+            question_set = question_set_info(options['questions'])
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f'Could not load the question set: {e}')
+
+        # --- 1. Load: text, index, records, LLM client and chain ---
+        started = time.perf_counter()
+        try:
+            service = RagService(api_key)
+        except RagServiceError as e:
+            raise CommandError(str(e))
+        load_ms = (time.perf_counter() - started) * 1000
+        self.stdout.write(f'Loaded the pipeline in {load_ms:.1f}ms; running {len(questions)} questions...')
+
+        # --- 2. Questions, stage by stage ---
+        runs = []
+        for _ in range(options['repeat']):
+            for question in questions:
+                runs.append(benchmark_question(service, question, not options['no_embedding_cache']))
+        first_run = runs[:len(questions)]
+
+        retriever = service.retriever
+        report = {
+            'meta': {
+                'generated_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'question_set': question_set,
+                'repeat': options['repeat'],
+                'embedding_cache': not options['no_embedding_cache'],
+            },
+            'config': {
+                'embedding_backend': settings.CHATBOT_EMBEDDING_BACKEND,
+                'llm_backend': settings.CHATBOT_LLM_BACKEND,
+                **rag_logic.get_build_params(),
+                'k': retriever.k,
+                'fetch_k': retriever.fetch_k,
+                'mmr_lambda': retriever.mmr_lambda,
+                'context_token_budget': retriever.context_token_budget,
+            },
+            'timings_ms': {
+                'load': round(load_ms, 3),
+                **{stage: summarize_timings([run['timings_ms'][stage] for run in runs]) for stage in STAGES},
+                'total': summarize_timings([sum(run['timings_ms'].values()) for run in runs]),
+            },
+            'quality': {
+                'recall_at_k': round(sum(run['recall_at_k'] for run in first_run) / len(first_run), 4),
+                'context_recall': round(sum(run['recall'] for run in first_run) / len(first_run), 4),
+                'mrr': round(sum(1 / run['first_rank'] for run in first_run if run['first_rank']) / len(first_run), 4),
+                'answer_recall': round(sum(run['answer_recall'] for run in first_run) / len(first_run), 4),
+                'lexical_only': sum(run['lexical_only'] for run in first_run),
+                'avg_prompt_tokens': round(sum(run['prompt_tokens'] for run in first_run) / len(first_run), 1),
+            },
+            'questions': {
+                run['id']: {
+                    'recall_at_k': run['recall_at_k'],
+                    'context_recall': run['recall'],
+                    'first_rank': run['first_rank'],
+                    'answer_recall': run['answer_recall'],
+                    'lexical_only': run['lexical_only'],
+                    'prompt_tokens': run['prompt_tokens'],
+                    'missing': run['missing'],
+                }
+                for run in first_run
+            },
+        }
+
+        with open(options['output'], 'w', encoding='utf-8') as f:
+            # Sorted keys and one value per line keep reports diffable
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+        self.print_summary(report)
+        if options['baseline']:
+            self.compare(report, options['baseline'], options['max_recall_drop'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote the report to {options['output']}."))
+
+    def print_summary(self, report):
+        for stage, timing in report['timings_ms'].items():
+            if isinstance(timing, dict):
+                self.stdout.write(f"  {stage:<13} median {timing['median']:>9.3f}ms  p95 {timing['p95']:>9.3f}ms")
+            else:
+                self.stdout.write(f"  {stage:<13} {timing:>16.3f}ms")
+        self.stdout.write('  ' + '  '.join(f'{key}={value}' for key, value in report['quality'].items()))
+
+    def compare(self, report, baseline_path, max_recall_drop):
+        try:
+            with open(baseline_path, encoding='utf-8') as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Could not read the baseline report: {e}')
+
+        if baseline['meta']['question_set']['sha256'] != report['meta']['question_set']['sha256']:
+            self.stdout.write(self.style.WARNING('The baseline used a different question set.'))
+
+        self.stdout.write(f'Compared with {baseline_path}:')
+        for stage in STAGES + ('total',):
+            before, after = baseline['timings_ms'][stage]['median'], report['timings_ms'][stage]['median']
+            self.stdout.write(f'  {stage:<13} median {before:.3f} -> {after:.3f}ms')
+        for metric, after in report['quality'].items():
+            before = baseline['quality'].get(metric)
+            if before != after:
+                self.stdout.write(f'  {metric} {before} -> {after}')
+        for question_id, result in report['questions'].items():
+            before = baseline['questions'].get(question_id)
+            if before and result['recall_at_k'] < before['recall_at_k']:
+                self.stdout.write(self.style.WARNING(
+                    f"  {question_id}: recall@k {before['recall_at_k']} -> {result['recall_at_k']}"
+                ))
+
+        drop = baseline['quality']['recall_at_k'] - report['quality']['recall_at_k']
+        if drop > max_recall_drop:
+            raise CommandError(f'recall@k fell by {drop:.4f}, more than the allowed {max_recall_drop}.')
@@ -0,0 +1,40 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from chatbot import index_store, rag_logic
+
+
+class Command(BaseCommand):
+    help = 'Embeds biography.txt and writes the FAISS and BM25 indexes to a versioned on-disk artifact'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Rebuild the artifact even if one already exists for the current text.',
+        )
+
+    def handle(self, *args, **options):
+        api_key = os.getenv("GOOGLE_API_KEY")
+        if not api_key and rag_logic.requires_api_key():
+            raise CommandError('GOOGLE_API_KEY is not configured.')
+
+        text_content = rag_logic.get_text_content()
+        if not text_content:
+            raise CommandError('Could not load the biography knowledge base.')
+
+        build_params = rag_logic.get_build_params()
+        version = index_store.artifact_version(text_content, build_params)
+        path = index_store.artifact_path(version)
+
+        if os.path.isdir(path) and not options['force']:
+            self.stdout.write(f'Index {version} is already built at {path}.')
+            return
+
+        self.stdout.write(f'Embedding biography for index {version}...')
+        vectorstore = rag_logic.embed_vector_store(text_content, api_key)
+        lexical_index = rag_logic.build_lexical_index(vectorstore)
+        index_store.write_artifact(vectorstore, lexical_index, version, build_params)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {vectorstore.index.ntotal} chunks to {path}.'
+        ))
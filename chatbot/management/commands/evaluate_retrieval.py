@@ -0,0 +1,74 @@
+import json
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from chatbot import rag_logic
+from chatbot.evaluation import build_retriever, evaluate, load_questions
+
+
+def optional_float(value):
+    return None if value.lower() in ('none', 'off') else float(value)
+
+
+def optional_int(value):
+    return None if value.lower() in ('none', 'off') else int(value)
+
+
+class Command(BaseCommand):
+    help = 'Scores the chatbot retrieval settings against the offline question set, without calling the LLM'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', help='Question set to use (default: chatbot/data/eval/questions_v1.json).')
+        parser.add_argument('--strategy', choices=sorted(rag_logic.CHUNK_STRATEGIES), help='Chunking strategy.')
+        parser.add_argument('--chunk-size', type=int, help='Chunk size in characters.')
+        parser.add_argument('--chunk-overlap', type=int, help='Chunk overlap in characters.')
+        parser.add_argument('--k', type=int, help='Chunks retrieved per question.')
+        parser.add_argument('--mmr-lambda', type=optional_float, default=settings.CHATBOT_MMR_LAMBDA,
+                            help="MMR trade-off between 0 and 1, or 'off'.")
+        parser.add_argument('--budget', type=optional_int, default=settings.CHATBOT_CONTEXT_TOKEN_BUDGET,
+                            help="Context token budget, or 'off'.")
+        parser.add_argument('--json', dest='json_path', help='Also write the full results to this file.')
+        parser.add_argument('--show-misses', action='store_true', help='List the questions not fully answered.')
+
+    def handle(self, *args, **options):
+        api_key = os.getenv("GOOGLE_API_KEY")
+        if not api_key and settings.CHATBOT_EMBEDDING_BACKEND == 'google':
+            raise CommandError('GOOGLE_API_KEY is not configured.')
+
+        overrides = {'mmr_lambda': options['mmr_lambda'], 'context_token_budget': options['budget']}
+        if options['k']:
+            overrides['k'] = options['k']
+        try:
+            retriever, chunks = build_retriever(
+                api_key, options['strategy'], options['chunk_size'], options['chunk_overlap'], **overrides
+            )
+            questions = load_questions(options['questions'])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        results = evaluate(retriever, questions)
+        config = {
+            'strategy': options['strategy'] or settings.CHATBOT_CHUNK_STRATEGY,
+            'chunk_size': options['chunk_size'] or settings.CHATBOT_CHUNK_SIZE,
+            'chunk_overlap': settings.CHATBOT_CHUNK_OVERLAP if options['chunk_overlap'] is None else options['chunk_overlap'],
+            'chunks': chunks,
+            'k': retriever.k,
+            'mmr_lambda': retriever.mmr_lambda,
+            'context_token_budget': retriever.context_token_budget,
+        }
+
+        self.stdout.write(' '.join(f'{key}={value}' for key, value in config.items()))
+        self.stdout.write(
+            f"recall={results['recall']:.3f} answered={results['answered']:.3f} mrr={results['mrr']:.3f} "
+            f"avg_chunks={results['avg_chunks']:.2f} avg_context_tokens={results['avg_context_tokens']:.0f} "
+            f"median_retrieval_ms={results['median_retrieval_ms']:.2f}"
+        )
+        if options['show_misses']:
+            for result in results['questions']:
+                if not result['answered']:
+                    self.stdout.write(f"  missed {result['id']}: {', '.join(result['missing'])}")
+
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as f:
+                json.dump({'config': config, 'results': results}, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote results to {options['json_path']}."))
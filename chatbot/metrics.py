@@ -0,0 +1,359 @@
+"""
+In-process metrics for the chatbot pipeline, exposed in the Prometheus text format.
+
+Stage timers feed a histogram per pipeline stage (reading the biography,
+building the index, embedding the query, searching, generating, ...), and
+counters track cache hits and misses, LLM tokens, requests and errors by type.
+Gauges are read when the metrics are scraped (the contact form spool's depth).
+Each worker process keeps its own numbers, so scrape every worker (or sum
+them) when running several.
+
+With CHATBOT_METRICS_ENABLED off, `timer` returns a shared no-op context manager
+and the counting helpers return straight away.
+"""
+import bisect
+import contextlib
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from langchain_core.callbacks import BaseCallbackHandler
+
+from .context import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Seconds; from in-memory lookups up to slow LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_NOOP = contextlib.nullcontext()
+
+# The stage timings of the request being handled, for the per-request log line
+_request_stages = ContextVar('chatbot_request_stages', default=None)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{value}"' for name, value in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing count, one per combination of label values."""
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels[name] for name in self.labelnames), 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f'{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}'
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram:
+    """Observations counted into cumulative buckets, with their sum and count."""
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # label values -> [count per bucket..., count above the last bucket, sum]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            data[position] += 1
+            data[-1] += value
+
+    def count(self, **labels):
+        data = self._values.get(tuple(labels[name] for name in self.labelnames))
+        return sum(data[:-1]) if data else 0
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, list(data)) for key, data in self._values.items())
+        for key, data in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), data[:-1]):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [('le', bound)])
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = _format_labels(self.labelnames, key)
+            yield f'{self.name}_sum{labels} {_format_number(data[-1])}'
+            yield f'{self.name}_count{labels} {cumulative}'
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Gauge:
+    """A value read from `function` when the metrics are rendered; None leaves it out."""
+    type = 'gauge'
+
+    def __init__(self, name, documentation, function):
+        self.name = name
+        self.documentation = documentation
+        self.function = function
+
+    def samples(self):
+        value = self.function()
+        if value is not None:
+            yield f'{self.name} {_format_number(value)}'
+
+    def reset(self):
+        pass
+
+
+def _contact_spool_depth():
+    # Also reported after the spool is switched off, while messages queued before may still wait
+    if not settings.CONTACT_SPOOL_ENABLED and not os.path.exists(settings.CONTACT_SPOOL_PATH):
+        return None
+    from core.contact_spool import get_contact_spool
+    return get_contact_spool().depth()
+
+
+# --- The chatbot's metrics ---
+
+STAGE_SECONDS = Histogram(
+    'chatbot_stage_seconds', 'Time spent in each stage of the chatbot pipeline.', ['stage']
+)
+REQUEST_SECONDS = Histogram(
+    'chatbot_request_seconds', 'Time to answer a chatbot request, streamed answers included.', ['endpoint']
+)
+REQUESTS = Counter('chatbot_requests_total', 'Chatbot requests by endpoint and HTTP status.', ['endpoint', 'status'])
+CACHE_LOOKUPS = Counter(
+    'chatbot_cache_lookups_total', 'Answer and embedding cache lookups by result.', ['cache', 'result']
+)
+LLM_TOKENS = Counter(
+    'chatbot_llm_tokens_total', 'LLM tokens sent and received; estimated when the model reports none.', ['direction']
+)
+ERRORS = Counter('chatbot_errors_total', 'Errors raised while answering, by where and exception type.', ['where', 'type'])
+
+CONTACT_SPOOL_DEPTH = Gauge(
+    'contact_spool_depth', 'Contact form submissions waiting for process_contact_spool.', _contact_spool_depth
+)
+
+METRICS = (STAGE_SECONDS, REQUEST_SECONDS, REQUESTS, CACHE_LOOKUPS, LLM_TOKENS, ERRORS, CONTACT_SPOOL_DEPTH)
+
+
+def is_enabled():
+    return settings.CHATBOT_METRICS_ENABLED
+
+
+class _StageTimer:
+    __slots__ = ('stage', 'started')
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record_stage(self.stage, time.perf_counter() - self.started)
+
+
+def timer(stage):
+    """
+    Returns a context manager that records the time spent inside it under `stage`.
+    """
+    if not settings.CHATBOT_METRICS_ENABLED:
+        return _NOOP
+    return _StageTimer(stage)
+
+
+def record_stage(stage, seconds):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    stages = _request_stages.get()
+    if stages is not None:
+        stages[stage] = stages.get(stage, 0.0) + seconds
+
+
+def count_cache(cache, result, amount=1):
+    if settings.CHATBOT_METRICS_ENABLED and amount:
+        CACHE_LOOKUPS.inc(amount, cache=cache, result=result)
+
+
+def count_error(where, error):
+    if settings.CHATBOT_METRICS_ENABLED:
+        ERRORS.inc(where=where, type=type(error).__name__)
+
+
+class RequestMetrics:
+    """
+    Tracks one request: its duration and status, and the stages timed while it ran.
+
+    For a streamed response, pass its content through `wrap_stream` so the
+    request is recorded when the stream ends rather than when the view returns.
+    """
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.status = None
+        self.stages = {}
+        self.deferred = False
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        _request_stages.set(self.stages)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _request_stages.set(None)
+        if exc is not None:
+            self.status = 500
+        if not self.deferred:
+            self.finish()
+
+    def wrap_stream(self, content):
+        self.deferred = True
+
+        def stream():
+            _request_stages.set(self.stages)
+            try:
+                yield from content
+            finally:
+                _request_stages.set(None)
+                self.finish()
+
+        return stream()
+
+    def finish(self):
+        seconds = time.perf_counter() - self.started
+        REQUEST_SECONDS.observe(seconds, endpoint=self.endpoint)
+        REQUESTS.inc(endpoint=self.endpoint, status=str(self.status))
+        if settings.CHATBOT_METRICS_LOG_REQUESTS:
+            stages = ' '.join(f'{stage}={value * 1000:.1f}ms' for stage, value in self.stages.items())
+            logger.info('chatbot %s status=%s total=%.1fms %s', self.endpoint, self.status, seconds * 1000, stages)
+
+
+class _DisabledRequest:
+    status = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def wrap_stream(self, content):
+        return content
+
+
+def track_request(endpoint):
+    """
+    Returns a RequestMetrics context manager for a view, or a no-op one when metrics are off.
+    Set `.status` on it before it exits.
+    """
+    if not settings.CHATBOT_METRICS_ENABLED:
+        return _DisabledRequest()
+    return RequestMetrics(endpoint)
+
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """
+    Times LLM calls (time to first token and total generation) and counts their tokens.
+    """
+    # Run in the caller's thread and context, so timings land on the right request
+    run_inline = True
+
+    def __init__(self):
+        self._runs = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        if not settings.CHATBOT_METRICS_ENABLED:
+            return
+        prompt = ''.join(str(message.content) for batch in messages for message in batch)
+        self._runs[run_id] = [time.perf_counter(), False, estimate_tokens(prompt), _request_stages.get()]
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        run = self._runs.get(run_id)
+        if run is not None and not run[1]:
+            run[1] = True
+            self._record(run, 'first_token', time.perf_counter() - run[0])
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        self._record(run, 'generate', time.perf_counter() - run[0])
+
+        usage, text = None, ''
+        for generations in response.generations:
+            for generation in generations:
+                text += generation.text
+                usage = usage or getattr(getattr(generation, 'message', None), 'usage_metadata', None)
+        if usage:
+            LLM_TOKENS.inc(usage.get('input_tokens', 0), direction='input')
+            LLM_TOKENS.inc(usage.get('output_tokens', 0), direction='output')
+        else:
+            LLM_TOKENS.inc(run[2], direction='input')
+            LLM_TOKENS.inc(estimate_tokens(text), direction='output')
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        if self._runs.pop(run_id, None) is not None:
+            ERRORS.inc(where='llm', type=type(error).__name__)
+
+    @staticmethod
+    def _record(run, stage, seconds):
+        # Callbacks may run outside the request's context (e.g. after a thread hop), so
+        # the stages seen when the call started are used
+        STAGE_SECONDS.observe(seconds, stage=stage)
+        if run[3] is not None:
+            run[3][stage] = run[3].get(stage, 0.0) + seconds
+
+
+def render():
+    """
+    Returns every metric in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in METRICS:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    for metric in METRICS:
+        metric.reset()
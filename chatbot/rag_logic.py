@@ -1,100 +1,251 @@
+import logging
 import os
 from django.conf import settings
 from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_text_splitters import CharacterTextSplitter, RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
 from langchain_classic.chains import create_retrieval_chain
 from langchain_classic.chains.combine_documents import create_stuff_documents_chain
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.documents import Document
+from . import index_store, metrics
+from .backends import EchoChatModel, HashingEmbeddings
+from .embedding_cache import CachedEmbeddings, get_embedding_cache
+from .lexical import BM25Index
+from .retrievers import HybridRetriever
+
+logger = logging.getLogger(__name__)
+
+# --- Index Build Configuration ---
+EMBEDDING_MODEL = "models/embedding-001"
+
+# Chunking strategies for CHATBOT_CHUNK_STRATEGY, each taking (chunk_size, chunk_overlap) in characters:
+# 'recursive' splits at paragraphs, then lines, then words; 'sentence' prefers sentence ends over words;
+# 'line' packs whole lines, only splitting a line longer than a chunk at its own ends.
+CHUNK_STRATEGIES = {
+    "recursive": lambda size, overlap: RecursiveCharacterTextSplitter(chunk_size=size, chunk_overlap=overlap),
+    "sentence": lambda size, overlap: RecursiveCharacterTextSplitter(
+        chunk_size=size,
+        chunk_overlap=overlap,
+        separators=["\n\n", "\n", r"(?<=[.!?])\s+", " ", ""],
+        is_separator_regex=True,
+    ),
+    "line": lambda size, overlap: CharacterTextSplitter(separator="\n", chunk_size=size, chunk_overlap=overlap),
+}
 
 # --- Global Variables & Caching ---
 # Simple in-memory cache for the vector store to avoid rebuilding it on every request in a dev environment.
 # For production, a more robust caching mechanism like Redis would be better.
+# Holds a (version, vectorstore) pair so an edited biography is never served from a stale index.
 _vector_store_cache = None
 
+def get_text_path():
+    return os.path.join(settings.BASE_DIR, 'chatbot', 'data', 'biography.txt')
+
 def get_text_content():
     """
     Loads the biography text from the file.
     """
     try:
-        file_path = os.path.join(settings.BASE_DIR, 'chatbot', 'data', 'biography.txt')
-        with open(file_path, "r", encoding="utf-8") as f:
+        with open(get_text_path(), "r", encoding="utf-8") as f:
             return f.read()
     except FileNotFoundError:
-        print("Error: biography.txt not found.")
+        logger.error("biography.txt not found at %s", get_text_path())
         return None
-    except Exception as e:
-        print(f"Error reading file: {e}")
+    except Exception:
+        logger.exception("Error reading the biography")
         return None
 
+def requires_api_key():
+    """
+    Whether the configured backends call Google and so need GOOGLE_API_KEY.
+    """
+    return settings.CHATBOT_EMBEDDING_BACKEND == 'google' or settings.CHATBOT_LLM_BACKEND == 'google'
+
+def get_embedding_model_name():
+    if settings.CHATBOT_EMBEDDING_BACKEND == 'local':
+        return f"local-hashing-{settings.CHATBOT_LOCAL_EMBEDDING_DIM}"
+    return EMBEDDING_MODEL
+
+def get_embeddings(api_key):
+    """
+    Returns the embedding model used for both indexing and queries.
+    Vectors are cached on disk, so unchanged chunks and repeated questions are not re-embedded.
+    """
+    if settings.CHATBOT_EMBEDDING_BACKEND == 'local':
+        embeddings = HashingEmbeddings(dimension=settings.CHATBOT_LOCAL_EMBEDDING_DIM)
+    else:
+        embeddings = GoogleGenerativeAIEmbeddings(
+            model=EMBEDDING_MODEL,
+            google_api_key=api_key
+        )
+    return CachedEmbeddings(embeddings, get_embedding_model_name(), get_embedding_cache())
+
+def get_build_params():
+    """
+    Returns the settings that affect the index contents, used to version the on-disk artifact.
+    """
+    return {
+        "embedding_model": get_embedding_model_name(),
+        "chunk_strategy": settings.CHATBOT_CHUNK_STRATEGY,
+        "chunk_size": settings.CHATBOT_CHUNK_SIZE,
+        "chunk_overlap": settings.CHATBOT_CHUNK_OVERLAP,
+    }
+
+def get_text_splitter(strategy=None, chunk_size=None, chunk_overlap=None):
+    """
+    Returns the text splitter for a chunking strategy, by default the one configured in settings.
+    """
+    strategy = strategy or settings.CHATBOT_CHUNK_STRATEGY
+    if strategy not in CHUNK_STRATEGIES:
+        raise ValueError(f"Unknown chunking strategy {strategy!r}; expected one of {', '.join(CHUNK_STRATEGIES)}.")
+    return CHUNK_STRATEGIES[strategy](
+        chunk_size or settings.CHATBOT_CHUNK_SIZE,
+        settings.CHATBOT_CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap,
+    )
+
+def split_text(text_content, text_splitter=None):
+    """
+    Splits the raw text into the chunks that get embedded.
+    """
+    docs = [Document(page_content=text_content, metadata={"source": "biography"})]
+    return (text_splitter or get_text_splitter()).split_documents(docs)
+
+def embed_vector_store(text_content, api_key, text_splitter=None):
+    """
+    Splits and embeds the text into a new in-memory FAISS vector store.
+    """
+    splits = split_text(text_content, text_splitter)
+    return FAISS.from_documents(documents=splits, embedding=get_embeddings(api_key))
+
 def build_vector_store(text_content, api_key):
     """
     Builds or retrieves the FAISS vector store from raw text content.
+
+    A prebuilt artifact written by `manage.py build_chatbot_index` is memory-mapped
+    when one matches the current text; otherwise the text is embedded in-process.
     """
     global _vector_store_cache
-    if _vector_store_cache:
-        return _vector_store_cache
-
     if not text_content:
         return None
 
+    version = index_store.artifact_version(text_content, get_build_params())
+    if _vector_store_cache and _vector_store_cache[0] == version:
+        return _vector_store_cache[1]
+
     try:
-        # 1. Create a Document object
-        docs = [Document(page_content=text_content, metadata={"source": "biography"})]
+        # 1. Load the prebuilt index for this exact text, if there is one
+        vectorstore = index_store.load_artifact(version, get_embeddings(api_key))
 
-        # 2. Split text
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        splits = text_splitter.split_documents(docs)
+        # 2. Otherwise fall back to splitting and embedding in this process
+        if vectorstore is None:
+            logger.info("No prebuilt index for version %s; embedding biography in-process.", version)
+            vectorstore = embed_vector_store(text_content, api_key)
 
-        # 3. Create Embeddings
-        embeddings = GoogleGenerativeAIEmbeddings(
-            model="models/embedding-001",
-            google_api_key=api_key
-        )
-
-        # 4. Build and cache Index
-        vectorstore = FAISS.from_documents(documents=splits, embedding=embeddings)
-        _vector_store_cache = vectorstore
+        # 3. Cache the index
+        _vector_store_cache = (version, vectorstore)
         return vectorstore
 
-    except Exception as e:
-        print(f"Error creating vector store: {e}")
+    except Exception:
+        logger.exception("Error creating vector store")
         return None
 
-def get_rag_chain(vectorstore, api_key):
+def build_lexical_index(vectorstore):
     """
-    Creates the RAG chain for question answering.
+    Builds the BM25 inverted index over the same chunks as the vector store.
     """
-    try:
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash",
-            temperature=0.3,
-            google_api_key=api_key,
-            convert_system_message_to_human=True
-        )
+    lexical_index = BM25Index()
+    for doc_id in vectorstore.index_to_docstore_id.values():
+        lexical_index.add(doc_id, vectorstore.docstore.search(doc_id).page_content)
+    return lexical_index
 
-        system_prompt = (
-            "You are an AI assistant representing the person described in the context. "
-            "Answer questions as if you are that person, using the first person ('I', 'my', 'me'). "
-            "Use the following pieces of retrieved context to answer the question. "
-            "If the answer is not in the context, say you don't have information on that based on the biography. "
-            "Keep your answers concise and conversational. "
-            "\n\n"
-            "{context}"
-        )
+def get_lexical_index(vectorstore, version):
+    """
+    Loads the BM25 index prebuilt with the artifact, or builds it from the vector store's chunks.
+    """
+    lexical_index = index_store.load_lexical_index(version)
+    if lexical_index is None:
+        lexical_index = build_lexical_index(vectorstore)
+    return lexical_index
 
-        prompt = ChatPromptTemplate.from_messages(
-            [
-                ("system", system_prompt),
-                ("human", "{input}"),
-            ]
+def get_retriever(vectorstores, lexical_index, **overrides):
+    """
+    Returns the hybrid BM25 + vector retriever used by the RAG chain.
+    Keyword arguments override the settings, e.g. k=6 or mmr_lambda=None.
+    """
+    params = {
+        "k": settings.CHATBOT_RETRIEVAL_K,
+        "fetch_k": settings.CHATBOT_HYBRID_FETCH_K,
+        "rrf_k": settings.CHATBOT_HYBRID_RRF_K,
+        "lexical_skip_score": settings.CHATBOT_HYBRID_LEXICAL_SKIP_SCORE,
+        "lexical_skip_margin": settings.CHATBOT_HYBRID_LEXICAL_SKIP_MARGIN,
+        "mmr_lambda": settings.CHATBOT_MMR_LAMBDA,
+        "context_token_budget": settings.CHATBOT_CONTEXT_TOKEN_BUDGET,
+    }
+    params.update(overrides)
+    return HybridRetriever(
+        embeddings=vectorstores[0].embedding_function,
+        vectorstores=vectorstores,
+        lexical_index=lexical_index,
+        **params,
+    )
+
+def get_llm(api_key):
+    """
+    Returns the chat model used to generate answers.
+    The model keeps its HTTP client, so reusing one instance reuses pooled connections.
+    """
+    # Times generation and counts tokens for the metrics endpoint
+    callbacks = [metrics.LLMMetricsHandler()]
+    if settings.CHATBOT_LLM_BACKEND == 'echo':
+        return EchoChatModel(
+            latency=settings.CHATBOT_ECHO_LATENCY,
+            token_delay=settings.CHATBOT_ECHO_TOKEN_DELAY,
+            callbacks=callbacks
         )
 
-        retriever = vectorstore.as_retriever()
-        question_answer_chain = create_stuff_documents_chain(llm, prompt)
+    return ChatGoogleGenerativeAI(
+        model="gemini-2.0-flash",
+        temperature=0.3,
+        google_api_key=api_key,
+        convert_system_message_to_human=True,
+        callbacks=callbacks
+    )
+
+def get_prompt():
+    """
+    Returns the prompt that stuffs the retrieved context in front of the question.
+    """
+    system_prompt = (
+        "You are an AI assistant representing the person described in the context. "
+        "Answer questions as if you are that person, using the first person ('I', 'my', 'me'). "
+        "Use the following pieces of retrieved context to answer the question. "
+        "If the answer is not in the context, say you don't have information on that based on the biography. "
+        "Keep your answers concise and conversational. "
+        "\n\n"
+        "{context}"
+    )
+
+    return ChatPromptTemplate.from_messages(
+        [
+            ("system", system_prompt),
+            ("human", "{input}"),
+        ]
+    )
+
+def get_rag_chain(vectorstore, api_key, llm=None, retriever=None):
+    """
+    Creates the RAG chain for question answering.
+    """
+    try:
+        if llm is None:
+            llm = get_llm(api_key)
+        if retriever is None:
+            retriever = vectorstore.as_retriever(search_kwargs={"k": settings.CHATBOT_RETRIEVAL_K})
+
+        question_answer_chain = create_stuff_documents_chain(llm, get_prompt())
         rag_chain = create_retrieval_chain(retriever, question_answer_chain)
         return rag_chain
-    except Exception as e:
-        print(f"Error creating RAG chain: {e}")
+    except Exception:
+        logger.exception("Error creating RAG chain")
         return None
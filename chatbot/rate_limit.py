@@ -0,0 +1,201 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def refill(tokens, updated, rate, capacity, now):
+    """
+    Returns the tokens in a bucket at `now`, given its level at `updated`.
+    """
+    return min(capacity, tokens + max(0.0, now - updated) * rate)
+
+
+def take_tokens(levels, buckets, now):
+    """
+    Applies one request to some buckets, all or nothing.
+
+    `levels` maps each bucket key to its stored (tokens, updated), or None for a
+    bucket never used. Returns (new_levels, retry_after): retry_after is None when
+    the request is allowed, otherwise the seconds until every bucket has a token.
+    """
+    new_levels, wait = {}, 0.0
+    for key, rate, capacity in buckets:
+        tokens, updated = levels.get(key) or (capacity, now)
+        tokens = refill(tokens, updated, rate, capacity, now)
+        new_levels[key] = tokens
+        if tokens < 1:
+            wait = max(wait, (1 - tokens) / rate)
+    if wait:
+        return new_levels, wait
+    return {key: tokens - 1 for key, tokens in new_levels.items()}, None
+
+
+class MemoryBucketStore:
+    """
+    Token buckets in this process's memory. Limits apply per worker process.
+
+    Only the `max_entries` most recently used buckets are kept; a dropped bucket
+    would have refilled anyway unless its client is still busy.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, buckets):
+        """
+        Takes a token from each of the (key, rate, capacity) buckets if all have one.
+        Returns None if they did, otherwise the seconds to wait.
+        """
+        now = time.monotonic()
+        with self._lock:
+            levels = {key: self._buckets.get(key) for key, _, _ in buckets}
+            new_levels, retry_after = take_tokens(levels, buckets, now)
+            for key, tokens in new_levels.items():
+                self._buckets.pop(key, None)
+                self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_entries:
+                self._buckets.popitem(last=False)
+        return retry_after
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class SqliteBucketStore:
+    """
+    Token buckets in a SQLite file, shared by every worker process on the host.
+
+    Each request is one short IMMEDIATE transaction, so concurrent workers see
+    each other's takes. Buckets that have refilled completely carry no
+    information and are pruned every `prune_every` takes.
+    """
+    prune_every = 1000
+
+    def __init__(self, path=None):
+        self.path = str(path or settings.CHATBOT_RATE_LIMIT_PATH)
+        self._lock = threading.Lock()
+        self._takes = 0
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            " key TEXT PRIMARY KEY,"
+            " tokens REAL NOT NULL,"
+            " updated REAL NOT NULL,"
+            " full_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS buckets_full_at ON buckets (full_at)")
+
+    def take(self, buckets):
+        # Wall-clock time, since it's compared across processes
+        now = time.time()
+        keys = [key for key, _, _ in buckets]
+        placeholders = ",".join("?" * len(keys))
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    f"SELECT key, tokens, updated FROM buckets WHERE key IN ({placeholders})", keys
+                ).fetchall()
+                levels = {key: (tokens, updated) for key, tokens, updated in rows}
+                new_levels, retry_after = take_tokens(levels, buckets, now)
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO buckets (key, tokens, updated, full_at) VALUES (?, ?, ?, ?)",
+                    [
+                        (key, new_levels[key], now, now + (capacity - new_levels[key]) / rate)
+                        for key, rate, capacity in buckets
+                    ],
+                )
+                self._takes += 1
+                if self._takes % self.prune_every == 0:
+                    self._conn.execute("DELETE FROM buckets WHERE full_at < ?", (now,))
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return retry_after
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM buckets")
+
+
+class RateLimiter:
+    """
+    Per-client and global token buckets for the chatbot endpoints.
+
+    A request needs a token from its client's bucket and from the global one;
+    when either is empty neither is charged, so a throttled client doesn't eat
+    into everyone else's allowance.
+    """
+
+    def __init__(self, store, client_per_minute, client_burst, global_per_minute, global_burst):
+        self.store = store
+        self.client = (client_per_minute / 60, client_burst)
+        self.global_ = (global_per_minute / 60, global_burst)
+
+    def check(self, client_id):
+        """
+        Returns None if the client may ask a question now, otherwise the seconds to wait.
+        """
+        return self.store.take([
+            (f'client:{client_id}', *self.client),
+            ('global', *self.global_),
+        ])
+
+
+def client_id(request):
+    """
+    Identifies the client behind a request by IP address, taken from
+    CHATBOT_CLIENT_IP_HEADER when the site runs behind a proxy.
+
+    Each proxy appends the address it received the request from, so the entry
+    CHATBOT_TRUSTED_PROXY_HOPS from the right was written by our own outermost
+    proxy. Entries left of it come from the client and can't be trusted.
+    """
+    header = settings.CHATBOT_CLIENT_IP_HEADER
+    hops = settings.CHATBOT_TRUSTED_PROXY_HOPS
+    if header and hops > 0 and request.META.get(header):
+        entries = [entry.strip() for entry in request.META[header].split(',')]
+        if len(entries) >= hops and entries[-hops]:
+            return entries[-hops]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def retry_after_seconds(retry_after):
+    return max(1, math.ceil(retry_after))
+
+
+def get_rate_limiter():
+    """
+    Returns the process-wide rate limiter configured in settings, or None when rate limiting is off.
+    """
+    global _limiter
+    if not settings.CHATBOT_RATE_LIMIT_ENABLED:
+        return None
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter(
+                    import_string(settings.CHATBOT_RATE_LIMIT_STORE)(),
+                    settings.CHATBOT_RATE_LIMIT_CLIENT_PER_MINUTE,
+                    settings.CHATBOT_RATE_LIMIT_CLIENT_BURST,
+                    settings.CHATBOT_RATE_LIMIT_GLOBAL_PER_MINUTE,
+                    settings.CHATBOT_RATE_LIMIT_GLOBAL_BURST,
+                )
+    return _limiter
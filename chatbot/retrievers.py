@@ -0,0 +1,168 @@
+from typing import Any, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from . import metrics
+from .context import pack_documents
+
+
+def rrf_scores(rankings, rrf_k):
+    """
+    Scores ranked lists of doc ids: each list adds 1 / (rrf_k + rank) to a document's score.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (rrf_k + rank)
+    return scores
+
+
+def reciprocal_rank_fusion(rankings, rrf_k):
+    """
+    Merges ranked lists of doc ids into one, best first.
+    """
+    scores = rrf_scores(rankings, rrf_k)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+def maximal_marginal_relevance(relevance, vectors, k, mmr_lambda):
+    """
+    Picks k of the candidates, each time taking the one that best balances its own
+    relevance against its similarity to those already picked. Returns their positions.
+
+    `relevance` holds each candidate's score scaled to 0-1 and `vectors` their
+    embeddings. mmr_lambda = 1 ranks by relevance alone; lower values favour variety.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms == 0, 1, norms)
+    similarity = vectors @ vectors.T
+
+    picked = [int(np.argmax(relevance))]
+    while len(picked) < min(k, len(relevance)):
+        redundancy = similarity[:, picked].max(axis=1)
+        scores = mmr_lambda * np.asarray(relevance) - (1 - mmr_lambda) * redundancy
+        scores[picked] = -np.inf
+        picked.append(int(np.argmax(scores)))
+    return picked
+
+
+def stored_vectors(vectorstore, doc_ids):
+    """
+    Returns {doc_id: vector} for those of doc_ids a FAISS vector store holds,
+    reconstructed from its index instead of embedded again.
+    """
+    if hasattr(vectorstore, 'stored_vectors'):
+        return vectorstore.stored_vectors(doc_ids)
+    # The biography index is a few dozen chunks and never changes once loaded
+    positions = {doc_id: position for position, doc_id in vectorstore.index_to_docstore_id.items()}
+    return {
+        doc_id: vectorstore.index.reconstruct(positions[doc_id])
+        for doc_id in doc_ids if doc_id in positions
+    }
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Combines BM25 keyword search with FAISS vector search by reciprocal-rank fusion.
+
+    Exact terms such as company names or certification titles rank well lexically
+    even when their embeddings are unremarkable. When the best lexical match is
+    decisive on its own, the vector search (and its query embedding) is skipped.
+
+    The query is embedded once and searched against every vector store (the
+    biography index and the core records); their hits are merged by distance into
+    one vector ranking. The BM25 index covers the documents of all stores.
+
+    With `mmr_lambda` set, the k chunks are picked from the fused candidates by
+    maximal marginal relevance, so near-duplicates don't crowd out other facts.
+    With `context_token_budget` set, the chosen chunks are deduplicated and
+    trimmed to fit that many prompt tokens.
+    """
+
+    embeddings: Any
+    vectorstores: List[Any]
+    lexical_index: Any
+    k: int = 4
+    fetch_k: int = 10
+    rrf_k: int = 60
+    lexical_skip_score: float = 0.8
+    lexical_skip_margin: float = 0.3
+    mmr_lambda: Optional[float] = None
+    context_token_budget: Optional[int] = None
+
+    def lexical_hits(self, query):
+        with metrics.timer('lexical_search'):
+            return self.lexical_index.search(query, self.fetch_k)
+
+    def is_lexically_decisive(self, query, hits=None):
+        """
+        Whether the keyword match is strong enough to answer without a vector search:
+        the best chunk must cover the query's indexed terms well and clearly beat the runner-up.
+        """
+        if hits is None:
+            hits = self.lexical_hits(query)
+        if not hits or hits[0][2] < self.lexical_skip_score:
+            return False
+        return len(hits) == 1 or hits[0][2] - hits[1][2] >= self.lexical_skip_margin
+
+    def _get_relevant_documents(self, query, *, run_manager=None) -> List[Document]:
+        docs = self.ranked_documents(query)
+        if self.context_token_budget:
+            with metrics.timer('pack_context'):
+                docs = pack_documents(docs, self.context_token_budget)
+        return docs
+
+    def ranked_documents(self, query, embedding=None, hits=None):
+        """
+        Returns the k best chunks for the query, before any token budget is applied.
+        Pass the query's embedding and keyword hits if they're already known.
+        """
+        if hits is None:
+            hits = self.lexical_hits(query)
+        lexical_ranking = [doc_id for doc_id, _, _ in hits]
+        if self.is_lexically_decisive(query, hits):
+            return self._documents(lexical_ranking[:self.k])
+
+        if embedding is None:
+            embedding = self.embeddings.embed_query(query)
+        vector_hits = []
+        with metrics.timer('vector_search'):
+            for vectorstore in self.vectorstores:
+                vector_hits.extend(
+                    vectorstore.similarity_search_with_score_by_vector(embedding, k=self.fetch_k)
+                )
+        vector_hits.sort(key=lambda hit: hit[1])
+        vector_ranking = [doc.id for doc, _ in vector_hits[:self.fetch_k]]
+
+        scores = rrf_scores([vector_ranking, lexical_ranking], self.rrf_k)
+        fused = sorted(scores, key=scores.get, reverse=True)
+        if self.mmr_lambda is None or len(fused) <= self.k:
+            return self._documents(fused[:self.k])
+
+        # The candidates' vectors are read back from the FAISS indexes
+        with metrics.timer('mmr'):
+            vectors = {}
+            for vectorstore in self.vectorstores:
+                wanted = [doc_id for doc_id in fused[:self.fetch_k] if doc_id not in vectors]
+                vectors.update(stored_vectors(vectorstore, wanted))
+            # A record removed since the search has no vector left
+            candidates = [doc for doc in self._documents(fused[:self.fetch_k]) if doc.id in vectors]
+            best = scores[fused[0]]
+            relevance = [scores[doc.id] / best for doc in candidates]
+            picked = maximal_marginal_relevance(
+                relevance, [vectors[doc.id] for doc in candidates], self.k, self.mmr_lambda
+            )
+        return [candidates[i] for i in picked]
+
+    def _documents(self, doc_ids):
+        docs = []
+        for doc_id in doc_ids:
+            for vectorstore in self.vectorstores:
+                doc = vectorstore.docstore.search(doc_id)
+                if isinstance(doc, Document):
+                    docs.append(doc)
+                    break
+        return docs
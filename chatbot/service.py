@@ -0,0 +1,281 @@
+import os
+import threading
+from django.conf import settings
+from django.db import DatabaseError
+from . import index_store, ingest, metrics, rag_logic
+from .answer_cache import AnswerCache, normalize_question
+from .coalesce import Abandoned, AsyncSingleFlight, SingleFlight
+
+NO_ANSWER = "Sorry, I couldn't find an answer to that."
+
+_service = None
+_service_lock = threading.Lock()
+
+
+class RagServiceError(Exception):
+    """
+    Raised when the RAG pipeline cannot be initialised. The message is safe to show to visitors.
+    """
+
+
+class RagService:
+    """
+    Owns the loaded biography, its index, the core records index, the LLM client
+    and the composed chain.
+
+    Everything here is built once per process and shared by every request, so a
+    question only pays for retrieval and generation. Answers are cached per
+    service, so replacing the service on a knowledge-base change drops them too.
+    """
+
+    def __init__(self, api_key):
+        self.answer_cache = AnswerCache(
+            ttl=settings.CHATBOT_ANSWER_CACHE_TTL,
+            similarity_threshold=settings.CHATBOT_ANSWER_CACHE_SIMILARITY,
+            max_entries=settings.CHATBOT_ANSWER_CACHE_MAX_ENTRIES,
+        )
+        # Identical questions asked at the same time share one retrieval and LLM call
+        self.flights = SingleFlight()
+        self.async_flights = AsyncSingleFlight()
+
+        # 1. Load Text Content
+        self.source_mtime = _source_mtime()
+        with metrics.timer('read_text'):
+            self.text_content = rag_logic.get_text_content()
+        if not self.text_content:
+            raise RagServiceError('Could not load the biography knowledge base.')
+        self.version = index_store.artifact_version(self.text_content, rag_logic.get_build_params())
+
+        # 2. Load or Build Vector Store
+        with metrics.timer('build_index'):
+            self.vectorstore = rag_logic.build_vector_store(self.text_content, api_key)
+        if not self.vectorstore:
+            raise RagServiceError('Failed to build the vector store.')
+
+        # 3. Load the BM25 Index for Hybrid Retrieval
+        with metrics.timer('lexical_index'):
+            self.lexical_index = rag_logic.get_lexical_index(self.vectorstore, self.version)
+
+        # 4. Index the Structured Resume Records (Experience, Projects, ...)
+        self.records = ingest.RecordStore(
+            self.vectorstore.embedding_function, self.vectorstore.index.d, self.lexical_index
+        )
+        # How far into the records journal this index is up to date
+        self.records_position = None
+        with metrics.timer('records_sync'):
+            self.sync_records()
+        self.retriever = rag_logic.get_retriever([self.vectorstore, self.records], self.lexical_index)
+
+        # 5. Create LLM Client and RAG Chain
+        with metrics.timer('chain_build'):
+            self.llm = rag_logic.get_llm(api_key)
+            self.chain = rag_logic.get_rag_chain(
+                self.vectorstore, api_key, llm=self.llm, retriever=self.retriever
+            )
+        if not self.chain:
+            raise RagServiceError('Failed to create the RAG chain.')
+
+    def is_stale(self):
+        return _source_mtime() != self.source_mtime
+
+    def records_changed(self):
+        return ingest.journal_position() != self.records_position
+
+    def sync_records(self):
+        """
+        Brings the records index in line with the database, embedding only changed rows.
+        """
+        position = ingest.journal_position()
+        try:
+            changes = self.records.sync(ingest.record_documents())
+        except DatabaseError as e:
+            # e.g. before migrations have run; the biography alone still works
+            print(f"Could not load resume records for the chatbot: {e}")
+            return
+        self.records_position = position
+        if changes:
+            self.answer_cache.clear()
+
+    def catch_up_records(self):
+        """
+        Applies the record changes journaled by other processes since the last sync,
+        reading only the rows they name. Falls back to a full sync when asked to.
+        """
+        doc_ids, position = ingest.read_record_changes(self.records_position)
+        if doc_ids is None:
+            self.sync_records()
+            return
+        try:
+            docs, missing = ingest.record_documents_for(doc_ids)
+        except DatabaseError as e:
+            print(f"Could not load resume records for the chatbot: {e}")
+            return
+        # Rows this process changed itself come back unchanged, so cost no embedding
+        if self.records.upsert(docs) + self.records.remove(missing):
+            self.answer_cache.clear()
+        self.records_position = position
+
+    def records_logged(self, start, end):
+        """
+        Moves past a journal line for a change this process has already applied,
+        unless lines from other processes are still waiting to be read before it.
+        """
+        # (None, 0) means there was no journal yet, so this line opened it
+        if self.records_position == start or self.records_position == (None, 0) and start[1] == 0:
+            self.records_position = end
+
+    def update_record(self, instance):
+        if self.records.upsert([ingest.document_for_instance(instance)]):
+            self.answer_cache.clear()
+
+    def remove_record(self, label, pk):
+        if self.records.remove([ingest.record_id(label, pk)]):
+            self.answer_cache.clear()
+
+    def cached_answer(self, question):
+        """
+        Returns (answer, query_vector); the answer is None on a cache miss.
+        """
+        # 1. Exact repeat of a cached question
+        answer = self.answer_cache.get_exact(question)
+        if answer is not None:
+            metrics.count_cache('answer', 'exact_hit')
+            return answer, None
+
+        # 2. Questions with a decisive keyword match skip embedding altogether,
+        # so there is no vector to compare against cached questions.
+        # They're counted apart from misses, as the cache was never consulted.
+        if self.retriever.is_lexically_decisive(question):
+            metrics.count_cache('answer', 'lexical')
+            return None, None
+
+        # 3. Near-duplicate of a cached question. The query vector is cached on
+        # disk, so the retriever reuses it instead of embedding again.
+        vector = self.vectorstore.embedding_function.embed_query(question)
+        answer = self.answer_cache.get_similar(vector)
+        metrics.count_cache('answer', 'miss' if answer is None else 'similar_hit')
+        return answer, vector
+
+    def answer(self, question):
+        return self.flights.do(normalize_question(question), lambda: self._answer(question))
+
+    def _answer(self, question):
+        answer, vector = self.cached_answer(question)
+        if answer is not None:
+            return answer
+
+        # 4. Full retrieval and generation
+        response = self.chain.invoke({"input": question})
+        answer = response.get('answer', NO_ANSWER)
+        self.answer_cache.set(question, vector, answer)
+        return answer
+
+    async def acached_answer(self, question):
+        answer = self.answer_cache.get_exact(question)
+        if answer is not None:
+            metrics.count_cache('answer', 'exact_hit')
+            return answer, None
+
+        if self.retriever.is_lexically_decisive(question):
+            metrics.count_cache('answer', 'lexical')
+            return None, None
+
+        vector = await self.vectorstore.embedding_function.aembed_query(question)
+        answer = self.answer_cache.get_similar(vector)
+        metrics.count_cache('answer', 'miss' if answer is None else 'similar_hit')
+        return answer, vector
+
+    async def aanswer(self, question):
+        """
+        The async counterpart of `answer`, for the ASGI endpoint.
+        """
+        return await self.async_flights.do(normalize_question(question), lambda: self._aanswer(question))
+
+    async def _aanswer(self, question):
+        answer, vector = await self.acached_answer(question)
+        if answer is not None:
+            return answer
+
+        response = await self.chain.ainvoke({"input": question})
+        answer = response.get('answer', NO_ANSWER)
+        self.answer_cache.set(question, vector, answer)
+        return answer
+
+    def stream_answer(self, question):
+        """
+        Yields the answer in pieces as the LLM produces them.
+        A cached answer, or one shared with an identical question already
+        being answered, is yielded in one piece.
+        """
+        key = normalize_question(question)
+        call, leader = self.flights.join(key)
+        if not leader:
+            try:
+                answer = call.wait()
+            except Abandoned:
+                yield from self.stream_answer(question)
+                return
+            yield answer
+            return
+
+        pieces = []
+        try:
+            answer, vector = self.cached_answer(question)
+            if answer is None:
+                for chunk in self.chain.stream({"input": question}):
+                    token = chunk.get('answer')
+                    if token:
+                        pieces.append(token)
+                        yield token
+                if pieces:
+                    answer = "".join(pieces)
+                    self.answer_cache.set(question, vector, answer)
+                else:
+                    answer = NO_ANSWER
+                    yield answer
+            else:
+                yield answer
+        except GeneratorExit:
+            # The visitor went away mid-stream; anyone waiting asks again themselves
+            self.flights.finish(key, call, error=Abandoned())
+            raise
+        except BaseException as e:
+            self.flights.finish(key, call, error=e)
+            raise
+        self.flights.finish(key, call, result=answer)
+
+
+def _source_mtime():
+    try:
+        return os.stat(rag_logic.get_text_path()).st_mtime_ns
+    except OSError:
+        return None
+
+
+def get_current_service():
+    """
+    Returns the process-wide RAG service if it has been built, without building it.
+    """
+    return _service
+
+
+def get_rag_service(api_key):
+    """
+    Returns the process-wide RAG service, creating it on first use.
+
+    The service is rebuilt when biography.txt changes on disk, which also picks up
+    the matching index version and starts an empty answer cache. When another
+    process has changed resume records, only the records index is brought up to
+    date, from the rows named in the records journal. A failed initialisation is
+    not cached, so the next request tries again.
+    """
+    global _service
+    if _service is None or _service.is_stale():
+        with _service_lock:
+            if _service is None or _service.is_stale():
+                _service = RagService(api_key)
+    elif _service.records_changed():
+        with _service_lock:
+            if _service.records_changed():
+                _service.catch_up_records()
+    return _service
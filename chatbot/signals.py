@@ -0,0 +1,44 @@
+from django.apps import apps
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from . import ingest
+from .service import get_current_service
+
+
+def _apply(change, label=None, pk=None):
+    """
+    Runs a knowledge-base update once the surrounding transaction commits, and
+    journals the changed record so other processes update just that row.
+    """
+    def run():
+        start, end = ingest.log_record_change(label, pk)
+        service = get_current_service()
+        if service is not None:
+            change(service)
+            service.records_logged(start, end)
+    transaction.on_commit(run)
+
+
+def record_saved(sender, instance, **kwargs):
+    _apply(lambda service: service.update_record(instance), instance._meta.label_lower, instance.pk)
+
+
+def record_deleted(sender, instance, **kwargs):
+    label, pk = instance._meta.label_lower, instance.pk
+    _apply(lambda service: service.remove_record(label, pk), label, pk)
+
+
+def related_changed(sender, instance, **kwargs):
+    # A renamed category changes the text of every record in it, so every process re-syncs
+    _apply(lambda service: service.sync_records())
+
+
+def connect_signals():
+    for label in ingest.RECORD_MODELS:
+        model = apps.get_model(label)
+        post_save.connect(record_saved, sender=model, dispatch_uid=f'chatbot-save-{label}')
+        post_delete.connect(record_deleted, sender=model, dispatch_uid=f'chatbot-delete-{label}')
+    for label in ingest.RELATED_MODELS:
+        model = apps.get_model(label)
+        post_save.connect(related_changed, sender=model, dispatch_uid=f'chatbot-save-{label}')
+        post_delete.connect(related_changed, sender=model, dispatch_uid=f'chatbot-delete-{label}')
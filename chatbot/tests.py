@@ -1,3 +1,624 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from core.models import Experience
+
+from . import coalesce, embedding_cache, evaluation, index_store, ingest, metrics, rag_logic, rate_limit, service, views
+from .answer_cache import AnswerCache
+from .backends import HashingEmbeddings
+from .context import estimate_tokens, pack_documents, trim_to_tokens
+from .lexical import BM25Index
+from .retrievers import HybridRetriever
+
+CHUNKS = [
+    "I studied Computer Science at the University of Lagos.",
+    "I build web applications with Django, Python and PostgreSQL.",
+    "My projects include a portfolio site with a RAG chatbot.",
+    "I enjoy chess, long-distance running and photography.",
+]
+
+
+def make_vectorstore(chunks=CHUNKS, embeddings=None):
+    docs = [Document(id=f"chunk-{i}", page_content=text) for i, text in enumerate(chunks)]
+    return FAISS.from_documents(docs, embeddings or HashingEmbeddings(dimension=64))
+
+
+def make_lexical_index(vectorstore):
+    lexical_index = BM25Index()
+    for doc_id in vectorstore.index_to_docstore_id.values():
+        lexical_index.add(doc_id, vectorstore.docstore.search(doc_id).page_content)
+    return lexical_index
+
+
+class LocalPipelineMixin:
+    """
+    Runs the RAG pipeline on the offline backends with its files in a temporary
+    directory, starting each test without the process-wide singletons.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        settings_override = override_settings(
+            CHATBOT_EMBEDDING_BACKEND='local',
+            CHATBOT_LLM_BACKEND='echo',
+            CHATBOT_ECHO_LATENCY=0,
+            CHATBOT_ECHO_TOKEN_DELAY=0,
+            CHATBOT_INDEX_DIR=os.path.join(self.tmp.name, 'index'),
+            CHATBOT_RECORDS_JOURNAL_PATH=os.path.join(self.tmp.name, 'index', 'records.journal'),
+            CHATBOT_EMBEDDING_CACHE_PATH=os.path.join(self.tmp.name, 'embeddings.sqlite3'),
+            CHATBOT_RATE_LIMIT_ENABLED=False,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.reset_singletons()
+        self.addCleanup(self.reset_singletons)
+
+    @staticmethod
+    def reset_singletons():
+        service._service = None
+        rag_logic._vector_store_cache = None
+        embedding_cache._cache = None
+
+
+class RagServiceTests(LocalPipelineMixin, TestCase):
+    def test_pipeline_built_once(self):
+        with mock.patch('chatbot.service.RagService', wraps=service.RagService) as constructor:
+            services = []
+            threads = [
+                threading.Thread(target=lambda: services.append(service.get_rag_service(None)))
+                for _ in range(8)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            services.append(service.get_rag_service(None))
+
+        self.assertEqual(constructor.call_count, 1)
+        self.assertEqual(len(services), 9)
+        self.assertTrue(all(built is services[0] for built in services))
+
+    def test_rebuilt_when_biography_changes(self):
+        first = service.get_rag_service(None)
+        with mock.patch('chatbot.service._source_mtime', return_value=-1):
+            second = service.get_rag_service(None)
+        self.assertIsNot(first, second)
+
+
+class AnswerCacheLookupTests(SimpleTestCase):
+    def make_cache(self):
+        cache = AnswerCache(ttl=60, similarity_threshold=0.9, max_entries=10)
+        cache.set("Where did you study?", [1.0, 0.0, 0.0], "At the University of Lagos.")
+        return cache
+
+    def test_near_duplicate_question_hits(self):
+        self.assertEqual(self.make_cache().get_similar([1.0, 0.1, 0.0]), "At the University of Lagos.")
+
+    def test_question_below_threshold_misses(self):
+        cache = self.make_cache()
+        self.assertIsNone(cache.get_similar([1.0, 1.0, 0.0]))
+        self.assertIsNone(cache.get_similar([0.0, 1.0, 0.0]))
+
+    def test_expired_entry_misses(self):
+        cache = self.make_cache()
+        later = mock.patch('chatbot.answer_cache.time.monotonic', return_value=time.monotonic() + 61)
+        with later:
+            self.assertIsNone(cache.get_similar([1.0, 0.0, 0.0]))
+            self.assertIsNone(cache.get_exact("Where did you study?"))
+        self.assertEqual(len(cache), 0)
+
+
+class AnswerCacheTests(LocalPipelineMixin, TestCase):
+    QUESTION = "Which university did you attend?"
+
+    def test_record_change_clears_cached_answers(self):
+        rag = service.get_rag_service(None)
+        with mock.patch.object(rag, 'chain', wraps=rag.chain) as chain:
+            first = rag.answer(self.QUESTION)
+            self.assertEqual(rag.answer(self.QUESTION), first)
+            self.assertEqual(chain.invoke.call_count, 1)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                Experience.objects.create(
+                    company='Acme Analytics', role='Backend Engineer', start_date=datetime.date(2021, 1, 1),
+                    description='Built data pipelines.',
+                )
+            rag.answer(self.QUESTION)
+            self.assertEqual(chain.invoke.call_count, 2)
+
+    def test_keyword_answers_are_not_counted_as_misses(self):
+        rag = service.get_rag_service(None)
+        misses = metrics.CACHE_LOOKUPS.value(cache='answer', result='miss')
+        lexical = metrics.CACHE_LOOKUPS.value(cache='answer', result='lexical')
+        with mock.patch.object(HybridRetriever, 'is_lexically_decisive', return_value=True):
+            rag.cached_answer(self.QUESTION)
+            asyncio.run(rag.acached_answer(self.QUESTION))
+
+        self.assertEqual(metrics.CACHE_LOOKUPS.value(cache='answer', result='miss'), misses)
+        self.assertEqual(metrics.CACHE_LOOKUPS.value(cache='answer', result='lexical'), lexical + 2)
+
+
+@override_settings(CHATBOT_METRICS_ENABLED=True, CHATBOT_METRICS_TOKEN='scrape-token')
+class MetricsViewTests(TestCase):
+    def get(self, **headers):
+        return self.client.get('/chatbot/metrics/', **headers)
+
+    def test_anonymous_request_is_forbidden(self):
+        self.assertEqual(self.get().status_code, 403)
+        self.assertEqual(self.get(HTTP_AUTHORIZATION='Bearer wrong-token').status_code, 403)
+
+    def test_token_or_staff_user_is_allowed(self):
+        response = self.get(HTTP_AUTHORIZATION='Bearer scrape-token')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('chatbot_requests_total', response.content.decode())
+
+        user = User.objects.create_user('visitor', password='pw')
+        self.client.force_login(user)
+        self.assertEqual(self.get().status_code, 403)
+        user.is_staff = True
+        user.save()
+        self.assertEqual(self.get().status_code, 200)
+
+    @override_settings(CHATBOT_METRICS_TOKEN=None)
+    def test_unset_token_matches_nothing(self):
+        self.assertEqual(self.get(HTTP_AUTHORIZATION='Bearer None').status_code, 403)
+        self.assertEqual(self.get(HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+    @override_settings(CHATBOT_METRICS_ENABLED=False)
+    def test_disabled_metrics_are_not_found(self):
+        self.assertEqual(self.get(HTTP_AUTHORIZATION='Bearer scrape-token').status_code, 404)
+
+
+class StreamAnswerTests(LocalPipelineMixin, TestCase):
+    QUESTION = "Which university did you attend?"
+
+    def stream(self):
+        response = self.client.post(
+            '/chatbot/ask/', json.dumps({'question': self.QUESTION, 'stream': True}), content_type='application/json'
+        )
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    def test_tokens_then_done(self):
+        lines = self.stream()
+        self.assertEqual(lines[-1], {'done': True})
+        self.assertGreater(len(lines), 2)
+        self.assertTrue(all(set(line) == {'token'} for line in lines[:-1]))
+
+        answer = "".join(line['token'] for line in lines[:-1])
+        self.assertEqual(service.get_rag_service(None).answer_cache.get_exact(self.QUESTION), answer)
+
+    def test_failure_part_way_ends_with_an_error_line(self):
+        def broken_stream(rag, question):
+            yield "Partial"
+            raise RuntimeError("model went away")
+
+        with mock.patch.object(service.RagService, 'stream_answer', broken_stream):
+            lines = self.stream()
+        self.assertEqual(lines, [{'token': "Partial"}, {'error': 'An internal server error occurred.'}])
+
+
+class AsyncAskTests(LocalPipelineMixin, TestCase):
+    def ask(self, body):
+        return self.async_client.post('/chatbot/ask/async/', body, content_type='application/json')
+
+    async def test_answers(self):
+        response = await self.ask(json.dumps({'question': "Which university did you attend?"}))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['answer'])
+
+    async def test_bad_method_or_body(self):
+        self.assertEqual((await self.async_client.get('/chatbot/ask/async/')).status_code, 405)
+        self.assertEqual((await self.ask('{not json')).status_code, 400)
+        self.assertEqual((await self.ask(json.dumps({'question': ''}))).status_code, 400)
+
+    @override_settings(CHATBOT_ECHO_LATENCY=5, CHATBOT_REQUEST_TIMEOUT=0.2)
+    async def test_slow_answer_times_out(self):
+        response = await self.ask(json.dumps({'question': "Which university did you attend?"}))
+        self.assertEqual(response.status_code, 504)
+
+    @override_settings(CHATBOT_MAX_CONCURRENT_REQUESTS=1, CHATBOT_REQUEST_TIMEOUT=0.5)
+    async def test_waits_for_a_free_slot(self):
+        body = json.dumps({'question': "Which university did you attend?"})
+        async with views.get_ask_semaphore():
+            self.assertEqual((await self.ask(body)).status_code, 504)
+
+            # A question queued behind a busy slot is answered once it frees up
+            queued = asyncio.ensure_future(self.ask(body))
+            await asyncio.sleep(0.1)
+            self.assertFalse(queued.done())
+        self.assertEqual((await queued).status_code, 200)
+
+
+class BenchmarkTests(LocalPipelineMixin, TestCase):
+    def test_keyword_search_runs_once(self):
+        rag_service = service.get_rag_service(None)
+        question = {
+            'id': 'school', 'question': "Which university did you attend?", 'expected': ["University of Lagos"],
+        }
+        lexical_hits = HybridRetriever.lexical_hits
+        with mock.patch.object(
+            HybridRetriever, 'lexical_hits', autospec=True, side_effect=lexical_hits
+        ) as search:
+            result = evaluation.benchmark_question(rag_service, question)
+
+        self.assertEqual(search.call_count, 1)
+        self.assertEqual(set(result['timings_ms']), set(evaluation.STAGES))
+
+
+class RecordSyncTests(LocalPipelineMixin, TestCase):
+    def create_experience(self, company='Acme Analytics'):
+        return Experience.objects.create(
+            company=company, role='Backend Engineer', start_date=datetime.date(2021, 1, 1), description='Built data pipelines.'
+        )
+
+    def test_own_change_needs_no_resync(self):
+        rag = service.get_rag_service(None)
+        with self.captureOnCommitCallbacks(execute=True):
+            experience = self.create_experience()
+
+        self.assertIn(ingest.record_id('core.experience', experience.pk), rag.records.fingerprints)
+        self.assertFalse(rag.records_changed())
+        with mock.patch.object(rag, 'sync_records') as sync_records, \
+                mock.patch.object(rag, 'catch_up_records') as catch_up_records:
+            self.assertIs(service.get_rag_service(None), rag)
+        sync_records.assert_not_called()
+        catch_up_records.assert_not_called()
+
+    def test_other_process_change_is_applied_incrementally(self):
+        rag = service.get_rag_service(None)
+        # Saved without this process's signal handlers running, then journaled as another process would
+        with self.captureOnCommitCallbacks(execute=False):
+            experience = self.create_experience('Globex')
+        doc_id = ingest.record_id('core.experience', experience.pk)
+        rag.answer_cache.set('Where did you work?', None, 'Somewhere.')
+        ingest.log_record_change('core.experience', experience.pk)
+
+        self.assertTrue(rag.records_changed())
+        with mock.patch.object(rag, 'sync_records') as sync_records:
+            service.get_rag_service(None)
+        sync_records.assert_not_called()
+        self.assertIn(doc_id, rag.records.fingerprints)
+        self.assertIsNone(rag.answer_cache.get_exact('Where did you work?'))
+        self.assertFalse(rag.records_changed())
+
+        with self.captureOnCommitCallbacks(execute=False):
+            experience.delete()
+        ingest.log_record_change('core.experience', doc_id.rsplit(':', 1)[1])
+        service.get_rag_service(None)
+        self.assertNotIn(doc_id, rag.records.fingerprints)
+
+    def test_full_sync_request(self):
+        rag = service.get_rag_service(None)
+        ingest.log_record_change()
+        with mock.patch.object(rag, 'sync_records', wraps=rag.sync_records) as sync_records:
+            service.get_rag_service(None)
+        sync_records.assert_called_once()
+        self.assertFalse(rag.records_changed())
+
+    def test_new_journal_forces_full_sync(self):
+        rag = service.get_rag_service(None)
+        with override_settings(CHATBOT_RECORDS_JOURNAL_MAX_BYTES=1):
+            ingest.log_record_change('core.experience', 1)
+            ingest.log_record_change('core.experience', 2)
+        self.assertEqual(ingest.read_record_changes(rag.records_position)[0], None)
+
+
+class IndexArtifactTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        settings_override = override_settings(CHATBOT_INDEX_DIR=self.tmp.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def write(self):
+        vectorstore = make_vectorstore()
+        index_store.write_artifact(vectorstore, make_lexical_index(vectorstore), 'v1', {'test': True})
+        return vectorstore
+
+    def test_round_trip(self):
+        built = self.write()
+        loaded = index_store.load_artifact('v1', HashingEmbeddings(dimension=64))
+
+        self.assertEqual(loaded.index.ntotal, len(CHUNKS))
+        query = HashingEmbeddings(dimension=64).embed_query("Which university did you attend?")
+        self.assertEqual(
+            [doc.id for doc, _ in loaded.similarity_search_with_score_by_vector(query, k=2)],
+            [doc.id for doc, _ in built.similarity_search_with_score_by_vector(query, k=2)],
+        )
+        self.assertEqual(index_store.load_lexical_index('v1').search("Django", 1)[0][0], "chunk-1")
+
+    def test_missing_artifact(self):
+        self.assertIsNone(index_store.load_artifact('missing', HashingEmbeddings(dimension=64)))
+
+    @unittest.skipUnless(sys.platform.startswith('linux'), 'reads /proc/self/maps')
+    def test_index_is_shared_mapping(self):
+        self.write()
+        loaded = index_store.load_artifact('v1', HashingEmbeddings(dimension=64))
+
+        # The vectors stay in a read-only, shared mapping of the file rather than a heap copy
+        index_file = os.path.realpath(os.path.join(index_store.artifact_path('v1'), index_store.INDEX_FILENAME))
+        with open('/proc/self/maps') as f:
+            mappings = [line.split() for line in f if line.rstrip().endswith(index_file)]
+        self.assertTrue(mappings)
+        self.assertTrue(all(fields[1] == 'r--s' for fields in mappings))
+        self.assertEqual(loaded.index.ntotal, len(CHUNKS))
+
+
+class BM25IndexTests(SimpleTestCase):
+    def make_index(self):
+        index = BM25Index()
+        for i, text in enumerate(CHUNKS):
+            index.add(f"chunk-{i}", text)
+        return index
+
+    def test_search_ranks_matching_document_first(self):
+        hits = self.make_index().search("Which university did you study at?", 2)
+        self.assertEqual(hits[0][0], "chunk-0")
+        self.assertLessEqual(hits[0][2], 1.0)
+
+    def test_remove_only_touches_document_postings(self):
+        index = self.make_index()
+        expected = BM25Index()
+        for i, text in enumerate(CHUNKS[1:], start=1):
+            expected.add(f"chunk-{i}", text)
+
+        index.remove("chunk-0")
+        index.remove("chunk-0")
+
+        self.assertEqual(index.to_dict(), expected.to_dict())
+        self.assertNotIn("university", index.postings)
+        self.assertEqual(index.total_length, expected.total_length)
+
+    def test_round_trip_keeps_document_terms(self):
+        index = BM25Index.from_dict(self.make_index().to_dict())
+        self.assertEqual(set(index.doc_terms["chunk-1"]), {"i", "build", "web", "applications", "with",
+                                                           "django", "python", "and", "postgresql"})
+        index.remove("chunk-1")
+        self.assertEqual(index.search("Django", 1), [])
+
+
+class ContextPackingTests(SimpleTestCase):
+    TEXT = " ".join(f"word{i}" for i in range(400))
+
+    def test_trimmed_text_fits_budget(self):
+        for tokens in range(30, 300, 7):
+            trimmed = trim_to_tokens(self.TEXT, tokens)
+            self.assertLessEqual(estimate_tokens(trimmed), tokens)
+
+    def test_packed_documents_fit_budget(self):
+        docs = [Document(id=f"doc-{i}", page_content=self.TEXT[i * 500:]) for i in range(3)]
+        for budget in (100, 150, 333, 1000):
+            packed = pack_documents(docs, budget)
+            self.assertLessEqual(sum(estimate_tokens(doc.page_content) for doc in packed), budget)
+
+
+class HybridRetrieverTests(SimpleTestCase):
+    def test_mmr_reads_vectors_from_the_indexes(self):
+        embeddings = HashingEmbeddings(dimension=64)
+        biography = make_vectorstore(CHUNKS[:2], embeddings)
+        lexical_index = make_lexical_index(biography)
+        records = ingest.RecordStore(embeddings, 64, lexical_index)
+        records.upsert([Document(id=f"record-{i}", page_content=text) for i, text in enumerate(CHUNKS[2:])])
+        retriever = HybridRetriever(
+            embeddings=embeddings, vectorstores=[biography, records], lexical_index=lexical_index,
+            k=2, fetch_k=4, mmr_lambda=0.5, lexical_skip_score=2.0,
+        )
+
+        with mock.patch.object(HashingEmbeddings, 'embed_documents') as embed_documents:
+            docs = retriever.invoke("What do you build and study?")
+
+        embed_documents.assert_not_called()
+        self.assertEqual(len(docs), 2)
+        self.assertEqual(len({doc.id for doc in docs}), 2)
+
+    def test_record_vectors_follow_changes(self):
+        embeddings = HashingEmbeddings(dimension=64)
+        records = ingest.RecordStore(embeddings, 64, BM25Index())
+        records.upsert([Document(id=f"record-{i}", page_content=text) for i, text in enumerate(CHUNKS)])
+        records.stored_vectors(["record-3"])
+        records.remove(["record-0"])
+
+        vector = records.stored_vectors(["record-3", "record-0"])
+        self.assertEqual(list(vector), ["record-3"])
+        self.assertEqual(
+            [round(x, 5) for x in vector["record-3"]],
+            [round(x, 5) for x in embeddings.embed_documents([CHUNKS[3]])[0]],
+        )
+
+
+class EmbeddingCacheTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache = embedding_cache.EmbeddingCache(os.path.join(tmp.name, 'embeddings.sqlite3'), 100)
+        self.addCleanup(self.cache._conn.close)
+
+    def test_fresh_hit_does_not_write(self):
+        self.cache.set_many({'key': [1.0, 2.0]})
+        changes = self.cache._conn.total_changes
+        self.assertEqual(self.cache.get_many(['key']), {'key': [1.0, 2.0]})
+        self.assertEqual(self.cache._conn.total_changes, changes)
+
+        self.cache._conn.execute("UPDATE embeddings SET last_used = 0")
+        self.cache.get_many(['key'])
+        (last_used,) = self.cache._conn.execute("SELECT last_used FROM embeddings").fetchone()
+        self.assertGreater(last_used, 0)
+
+    @override_settings(CHATBOT_METRICS_ENABLED=True)
+    def test_cached_query_lookup_is_timed(self):
+        embeddings = embedding_cache.CachedEmbeddings(HashingEmbeddings(dimension=16), 'hashing', self.cache)
+        embeddings.embed_query("Where did you study?")
+        with mock.patch.object(metrics, 'timer', wraps=metrics.timer) as timer, \
+                mock.patch.object(HashingEmbeddings, 'embed_query') as embed_query:
+            embeddings.embed_query("Where did you study?")
+
+        embed_query.assert_not_called()
+        timer.assert_called_once_with('embed_query')
+
+
+class RateLimiterTests(SimpleTestCase):
+    def make_limiter(self, store=None):
+        return rate_limit.RateLimiter(store or rate_limit.MemoryBucketStore(), 60, 2, 600, 3)
+
+    def test_client_bucket_empties_then_refills(self):
+        limiter = self.make_limiter()
+        self.assertIsNone(limiter.check('a'))
+        self.assertIsNone(limiter.check('a'))
+        retry_after = limiter.check('a')
+        self.assertGreater(retry_after, 0)
+        self.assertLessEqual(retry_after, 1)
+
+    def test_throttled_client_does_not_spend_global_tokens(self):
+        limiter = self.make_limiter()
+        limiter.check('a')
+        limiter.check('a')
+        for _ in range(5):
+            self.assertIsNotNone(limiter.check('a'))
+        # One global token is left for someone else
+        self.assertIsNone(limiter.check('b'))
+        self.assertIsNotNone(limiter.check('c'))
+
+    def test_sqlite_store_is_shared(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'buckets.sqlite3')
+            first, second = rate_limit.SqliteBucketStore(path), rate_limit.SqliteBucketStore(path)
+            self.assertIsNone(self.make_limiter(first).check('a'))
+            self.assertIsNone(self.make_limiter(second).check('a'))
+            self.assertIsNotNone(self.make_limiter(first).check('a'))
+            first._conn.close()
+            second._conn.close()
+
+
+class ClientIdTests(SimpleTestCase):
+    def client_id(self, forwarded=None, **settings_overrides):
+        request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.1')
+        if forwarded is not None:
+            request.META['HTTP_X_FORWARDED_FOR'] = forwarded
+        with override_settings(CHATBOT_CLIENT_IP_HEADER='HTTP_X_FORWARDED_FOR', **settings_overrides):
+            return rate_limit.client_id(request)
+
+    def test_entry_added_by_our_proxy_is_used(self):
+        # The client can put anything on the left; our proxy appends the address it saw
+        self.assertEqual(self.client_id('6.6.6.6, 203.0.113.7'), '203.0.113.7')
+        self.assertEqual(self.client_id('6.6.6.6, 203.0.113.7, 10.0.0.2', CHATBOT_TRUSTED_PROXY_HOPS=2), '203.0.113.7')
+
+    def test_falls_back_to_remote_addr(self):
+        self.assertEqual(self.client_id(), '10.0.0.1')
+        self.assertEqual(self.client_id('203.0.113.7', CHATBOT_TRUSTED_PROXY_HOPS=2), '10.0.0.1')
+        with override_settings(CHATBOT_CLIENT_IP_HEADER=None):
+            request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='203.0.113.7')
+            self.assertEqual(rate_limit.client_id(request), '10.0.0.1')
+
+
+class SingleFlightTests(SimpleTestCase):
+    def test_concurrent_callers_share_one_call(self):
+        flights = coalesce.SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        calls, results = [], []
+
+        def work():
+            calls.append(1)
+            started.set()
+            release.wait()
+            return 'answer'
+
+        # Counts the callers waiting on the leader, so it only finishes once all of them are
+        waiting = threading.Semaphore(0)
+        wait = coalesce._Call.wait
+
+        def counting_wait(call):
+            waiting.release()
+            return wait(call)
+
+        with mock.patch.object(coalesce._Call, 'wait', counting_wait):
+            leader = threading.Thread(target=lambda: results.append(flights.do('q', work)))
+            leader.start()
+            started.wait()
+            followers = [threading.Thread(target=lambda: results.append(flights.do('q', work))) for _ in range(5)]
+            for thread in followers:
+                thread.start()
+            for _ in followers:
+                self.assertTrue(waiting.acquire(timeout=5))
+            release.set()
+            for thread in [leader, *followers]:
+                thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['answer'] * 6)
+        self.assertEqual(len(flights), 0)
+
+    def test_errors_are_shared_and_not_remembered(self):
+        flights = coalesce.SingleFlight()
+        with self.assertRaises(KeyError):
+            flights.do('q', lambda: {}['missing'])
+        self.assertEqual(flights.do('q', lambda: 'retried'), 'retried')
+
+    def test_abandoned_call_is_retried_by_waiters(self):
+        flights = coalesce.SingleFlight()
+        call, leader = flights.join('q')
+        self.assertTrue(leader)
+        result = []
+        waiter = threading.Thread(target=lambda: result.append(flights.do('q', lambda: 'own answer')))
+        waiter.start()
+        flights.finish('q', call, error=coalesce.Abandoned())
+        waiter.join()
+        self.assertEqual(result, ['own answer'])
+
+    def test_async_callers_share_one_task(self):
+        flights = coalesce.AsyncSingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return 'answer'
+
+        async def ask_all():
+            return await asyncio.gather(*[flights.do('q', work) for _ in range(5)])
+
+        self.assertEqual(asyncio.run(ask_all()), ['answer'] * 5)
+        self.assertEqual(len(calls), 1)
+
+
+class AskRateLimitTests(LocalPipelineMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        settings_override = override_settings(
+            CHATBOT_RATE_LIMIT_ENABLED=True,
+            CHATBOT_RATE_LIMIT_STORE='chatbot.rate_limit.MemoryBucketStore',
+            CHATBOT_RATE_LIMIT_CLIENT_BURST=1,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        rate_limit._limiter = None
+        self.addCleanup(setattr, rate_limit, '_limiter', None)
+
+    def ask(self, body):
+        return self.client.post('/chatbot/ask/', body, content_type='application/json')
+
+    def test_malformed_requests_are_not_charged(self):
+        self.assertEqual(self.ask('{not json').status_code, 400)
+        self.assertEqual(self.ask('[]').status_code, 400)
+        self.assertEqual(self.ask(json.dumps({'question': ''})).status_code, 400)
+
+        self.assertEqual(self.ask(json.dumps({'question': 'Where did you study?'})).status_code, 200)
+        response = self.ask(json.dumps({'question': 'What do you build?'}))
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
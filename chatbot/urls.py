@@ -6,4 +6,6 @@ app_name = 'chatbot'
 urlpatterns = [
     path('', views.chat_view, name='chat'),
     path('ask/', views.ask_question, name='ask_question'),
+    path('ask/async/', views.ask_question_async, name='ask_question_async'),
+    path('metrics/', views.metrics_view, name='metrics'),
 ]
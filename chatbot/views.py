@@ -1,62 +1,213 @@
+import asyncio
+import hmac
 import os
+import weakref
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from dotenv import load_dotenv
 import json
-from . import rag_logic
+from . import metrics, rag_logic
+from .rate_limit import client_id, get_rate_limiter, retry_after_seconds
+from .service import RagServiceError, get_rag_service
 
 # Load environment variables
 load_dotenv()
 
+# One semaphore per event loop: asyncio primitives can't be shared across loops,
+# and under WSGI each async request may run on its own loop.
+_ask_semaphores = weakref.WeakKeyDictionary()
+
+def get_ask_semaphore():
+    loop = asyncio.get_running_loop()
+    semaphore = _ask_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(settings.CHATBOT_MAX_CONCURRENT_REQUESTS)
+        _ask_semaphores[loop] = semaphore
+    return semaphore
+
+def rate_limited_response(retry_after):
+    response = JsonResponse(
+        {'error': 'Too many questions. Please wait a moment and try again.'}, status=429
+    )
+    response['Retry-After'] = str(retry_after_seconds(retry_after))
+    return response
+
+def read_question(request):
+    """
+    Returns (data, None) for a request body holding a question, or (None, an error response).
+    """
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        # Invalid JSON, or a body that isn't UTF-8
+        return None, JsonResponse({'error': 'Invalid JSON in request body'}, status=400)
+    if not isinstance(data, dict) or not data.get('question'):
+        return None, JsonResponse({'error': 'No question provided'}, status=400)
+    return data, None
+
 def chat_view(request):
     """
     Renders the main chat interface page.
     """
     return render(request, 'chatbot/chat.html')
 
+def stream_answer_lines(service, question):
+    """
+    Yields the answer as newline-delimited JSON: one {"token": ...} line per piece,
+    then {"done": true}, or {"error": ...} if generation fails part-way.
+    """
+    try:
+        for token in service.stream_answer(question):
+            yield json.dumps({'token': token}) + "\n"
+        yield json.dumps({'done': True}) + "\n"
+    except Exception as e:
+        metrics.count_error('stream', e)
+        print(f"An error occurred while streaming an answer: {e}")
+        yield json.dumps({'error': 'An internal server error occurred.'}) + "\n"
+
 @csrf_exempt
 def ask_question(request):
     """
     An API endpoint to handle user questions and return the chatbot's answer.
+    Send {"stream": true} to receive the answer as NDJSON tokens while it is generated.
     """
+    with metrics.track_request('ask') as tracked:
+        response = _ask_question(request)
+        tracked.status = response.status_code
+        if response.streaming:
+            # Recorded once the last token is sent, not when the view returns
+            response.streaming_content = tracked.wrap_stream(response.streaming_content)
+    return response
+
+def _ask_question(request):
     if request.method != 'POST':
         return JsonResponse({'error': 'Invalid request method'}, status=405)
 
-    try:
-        data = json.loads(request.body)
-        question = data.get('question')
-        if not question:
-            return JsonResponse({'error': 'No question provided'}, status=400)
+    # Malformed requests are turned away before they cost the client a token
+    data, error = read_question(request)
+    if error is not None:
+        return error
+    question = data['question']
+
+    # Every question may cost an LLM call, so each client and the site as a whole get a budget
+    limiter = get_rate_limiter()
+    if limiter is not None:
+        retry_after = limiter.check(client_id(request))
+        if retry_after is not None:
+            return rate_limited_response(retry_after)
 
+    try:
         # --- RAG Logic Integration ---
         api_key = os.getenv("GOOGLE_API_KEY")
-        if not api_key:
+        if not api_key and rag_logic.requires_api_key():
             return JsonResponse({'error': 'Google API Key not configured on the server.'}, status=500)
 
-        # 1. Get Text Content
-        text_content = rag_logic.get_text_content()
-        if not text_content:
-            return JsonResponse({'error': 'Could not load the biography knowledge base.'}, status=500)
+        # The service (text, index, LLM client and chain) is built once per process
+        try:
+            service = get_rag_service(api_key)
+        except RagServiceError as e:
+            metrics.count_error('service', e)
+            return JsonResponse({'error': str(e)}, status=500)
 
-        # 2. Build Vector Store (uses cache)
-        vector_store = rag_logic.build_vector_store(text_content, api_key)
-        if not vector_store:
-            return JsonResponse({'error': 'Failed to build the vector store.'}, status=500)
+        if data.get('stream'):
+            response = StreamingHttpResponse(
+                stream_answer_lines(service, question),
+                content_type='application/x-ndjson'
+            )
+            # Keep proxies from buffering the stream
+            response['Cache-Control'] = 'no-cache'
+            response['X-Accel-Buffering'] = 'no'
+            return response
 
-        # 3. Create RAG Chain and Invoke
-        rag_chain = rag_logic.get_rag_chain(vector_store, api_key)
-        if not rag_chain:
-            return JsonResponse({'error': 'Failed to create the RAG chain.'}, status=500)
-
-        response = rag_chain.invoke({"input": question})
-        answer = response.get('answer', "Sorry, I couldn't find an answer to that.")
+        answer = service.answer(question)
 
         return JsonResponse({'answer': answer})
 
-    except json.JSONDecodeError:
-        return JsonResponse({'error': 'Invalid JSON in request body'}, status=400)
     except Exception as e:
+        metrics.count_error('ask', e)
         # Log the error for debugging
         print(f"An error occurred in ask_question view: {e}")
         return JsonResponse({'error': 'An internal server error occurred.'}, status=500)
+
+
+async def ask_question_async(request):
+    """
+    The async version of `ask_question`, for serving under ASGI.
+
+    LLM calls await the chain's async path instead of holding a worker thread, so one
+    worker can hold many questions in flight. At most CHATBOT_MAX_CONCURRENT_REQUESTS
+    run at once per event loop, and each question (including time spent waiting for a
+    slot) is cut off after CHATBOT_REQUEST_TIMEOUT seconds.
+    """
+    with metrics.track_request('ask_async') as tracked:
+        response = await _ask_question_async(request)
+        tracked.status = response.status_code
+    return response
+
+async def _ask_question_async(request):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request method'}, status=405)
+
+    data, error = read_question(request)
+    if error is not None:
+        return error
+    question = data['question']
+
+    limiter = get_rate_limiter()
+    if limiter is not None:
+        # The shared store may wait on a file lock, so keep it off the event loop
+        retry_after = await sync_to_async(limiter.check, thread_sensitive=False)(client_id(request))
+        if retry_after is not None:
+            return rate_limited_response(retry_after)
+
+    try:
+        api_key = os.getenv("GOOGLE_API_KEY")
+        if not api_key and rag_logic.requires_api_key():
+            return JsonResponse({'error': 'Google API Key not configured on the server.'}, status=500)
+
+        # Building the service is blocking work, so it runs off the event loop
+        try:
+            service = await sync_to_async(get_rag_service, thread_sensitive=False)(api_key)
+        except RagServiceError as e:
+            metrics.count_error('service', e)
+            return JsonResponse({'error': str(e)}, status=500)
+
+        async def answer_with_slot():
+            async with get_ask_semaphore():
+                return await service.aanswer(question)
+
+        try:
+            answer = await asyncio.wait_for(answer_with_slot(), timeout=settings.CHATBOT_REQUEST_TIMEOUT)
+        except asyncio.TimeoutError as e:
+            metrics.count_error('ask_async', e)
+            return JsonResponse({'error': 'The assistant took too long to answer. Please try again.'}, status=504)
+
+        return JsonResponse({'answer': answer})
+
+    except Exception as e:
+        metrics.count_error('ask_async', e)
+        print(f"An error occurred in ask_question_async view: {e}")
+        return JsonResponse({'error': 'An internal server error occurred.'}, status=500)
+
+# csrf_exempt wraps views in a sync function on Django 4.1, which would hide that
+# this view is async, so mark it directly.
+ask_question_async.csrf_exempt = True
+
+def metrics_view(request):
+    """
+    Serves the chatbot's metrics in the Prometheus text format, for staff users or
+    a scraper sending `Authorization: Bearer <CHATBOT_METRICS_TOKEN>`.
+    """
+    if not settings.CHATBOT_METRICS_ENABLED:
+        raise Http404
+
+    token = settings.CHATBOT_METRICS_TOKEN
+    authorization = request.headers.get('Authorization', '')
+    has_token = bool(token) and hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode())
+    if not (has_token or request.user.is_staff):
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,8 +1,9 @@
 from django.contrib import admin
 from ordered_model.admin import OrderedModelAdmin
+from .search import SEARCH_MODELS, matching
 from .models import (
     Profile, SocialLink, SkillCategory, Skill, Project, ProjectCategory,
-    Experience, Education, Certification, Award, Service, Stat, ContactMessage
+    Experience, Education, Certification, Award, Service, Stat, ContactMessage, Tag
 )
 
 # Unregister default admin classes if they are already registered
@@ -14,6 +15,19 @@ try:
 except admin.sites.NotRegistered:
     pass
 
+# --- Search ---
+
+class FullTextSearchMixin:
+    """
+    Answers the changelist search box from the site search index instead of
+    LIKE '%term%' scans over search_fields.
+    """
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip() or self.model._meta.label_lower not in SEARCH_MODELS:
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(matching(self.model, search_term)), False
+
 # --- Inlines ---
 
 class SkillInline(admin.TabularInline):
@@ -64,10 +78,24 @@ class ProjectCategoryAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('name',)}
     search_fields = ('name',)
 
+@admin.register(Tag)
+class TagAdmin(admin.ModelAdmin):
+    list_display = ('name', 'slug', 'project_count')
+    search_fields = ('name',)
+    readonly_fields = ('name', 'slug', 'project_count', 'created_at', 'updated_at')
+
+    # Tags are created from each project's tech stack when it's saved, and
+    # deleted once no project lists them
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 @admin.register(Project)
-class ProjectAdmin(OrderedModelAdmin):
+class ProjectAdmin(FullTextSearchMixin, OrderedModelAdmin):
     list_display = ('title', 'category', 'featured', 'move_up_down_links')
-    list_filter = ('category', 'featured')
+    list_filter = ('category', 'featured', 'tags')
     search_fields = ('title', 'description', 'tech_stack')
     prepopulated_fields = {'slug': ('title',)}
     fieldsets = (
@@ -84,25 +112,25 @@ class ProjectAdmin(OrderedModelAdmin):
     )
 
 @admin.register(Experience)
-class ExperienceAdmin(OrderedModelAdmin):
+class ExperienceAdmin(FullTextSearchMixin, OrderedModelAdmin):
     list_display = ('role', 'company', 'start_date', 'end_date', 'move_up_down_links')
     search_fields = ('role', 'company')
     ordering = ('order',)
 
 @admin.register(Education)
-class EducationAdmin(OrderedModelAdmin):
+class EducationAdmin(FullTextSearchMixin, OrderedModelAdmin):
     list_display = ('school', 'program', 'start_date', 'end_date', 'move_up_down_links')
     search_fields = ('school', 'program')
     ordering = ('order',)
 
 @admin.register(Certification)
-class CertificationAdmin(OrderedModelAdmin):
+class CertificationAdmin(FullTextSearchMixin, OrderedModelAdmin):
     list_display = ('name', 'issuer', 'issue_date', 'move_up_down_links')
     search_fields = ('name', 'issuer')
     ordering = ('order',)
 
 @admin.register(Service)
-class ServiceAdmin(OrderedModelAdmin):
+class ServiceAdmin(FullTextSearchMixin, OrderedModelAdmin):
     list_display = ('title', 'featured', 'move_up_down_links')
     search_fields = ('title', 'short_description')
     prepopulated_fields = {'slug': ('title',)}
@@ -123,13 +151,13 @@ class StatAdmin(OrderedModelAdmin):
     ordering = ('order',)
 
 @admin.register(Award)
-class AwardAdmin(OrderedModelAdmin):
+class AwardAdmin(FullTextSearchMixin, OrderedModelAdmin):
     list_display = ('title', 'issuer', 'year', 'move_up_down_links')
     search_fields = ('title', 'issuer')
     ordering = ('order',)
 
 @admin.register(ContactMessage)
-class ContactMessageAdmin(admin.ModelAdmin):
+class ContactMessageAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('subject', 'name', 'email', 'read', 'created_at')
     list_filter = ('read',)
     search_fields = ('name', 'email', 'subject', 'message')
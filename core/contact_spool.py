@@ -0,0 +1,254 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import ContactMessage
+from .search import get_search_backend
+
+_spool = None
+_spool_lock = threading.Lock()
+
+
+class SpoolFull(Exception):
+    """Raised when the spool already holds as many messages as it's allowed to."""
+
+
+class ContactSpool:
+    """
+    A durable first-in, first-out queue of contact form submissions in a SQLite file.
+
+    Accepting a submission is a single small insert into a file of its own, so
+    the page request never waits on the site database's write lock. A worker
+    (`manage.py process_contact_spool`) moves batches into ContactMessage and
+    removes them from the spool once they're committed there; a crash between
+    the two can deliver a batch twice, never lose it.
+
+    The queue depth is kept in a counter updated with each insert and removal,
+    so checking it (for backpressure or monitoring) is O(1).
+
+    A submission that keeps failing to store is moved to a dead-letter table
+    after `max_attempts`, so it can't hold up the ones behind it. Dead letters
+    stay in the file until they're requeued.
+    """
+
+    def __init__(self, path, max_depth, max_attempts):
+        self.path = str(path)
+        self.max_depth = max_depth
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # Transactions are opened explicitly, with BEGIN IMMEDIATE, so that the
+        # depth check and the insert can't interleave with another process
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS spool ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " payload TEXT NOT NULL,"
+            " received_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS attempts (id INTEGER PRIMARY KEY, count INTEGER NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS dead_letters ("
+            " id INTEGER PRIMARY KEY,"
+            " payload TEXT NOT NULL,"
+            " received_at REAL NOT NULL,"
+            " error TEXT NOT NULL,"
+            " failed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._conn.execute("INSERT OR IGNORE INTO state (key, value) VALUES ('depth', 0)")
+
+    def enqueue(self, data):
+        """
+        Adds a validated submission (a dict of form fields) to the queue.
+
+        Raises SpoolFull once max_depth submissions are waiting.
+        """
+        payload = json.dumps(data)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                depth = self._depth()
+                if depth >= self.max_depth:
+                    raise SpoolFull(f"{depth} contact messages are waiting to be processed.")
+                self._conn.execute(
+                    "INSERT INTO spool (payload, received_at) VALUES (?, ?)", (payload, time.time())
+                )
+                self._conn.execute("UPDATE state SET value = value + 1 WHERE key = 'depth'")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def peek(self, limit):
+        """
+        Returns up to `limit` of the oldest submissions as (id, data, received_at) tuples,
+        without removing them.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, payload, received_at FROM spool ORDER BY id LIMIT ?", (limit,)
+            ).fetchall()
+        return [(spool_id, json.loads(payload), received_at) for spool_id, payload, received_at in rows]
+
+    def ack(self, ids):
+        """
+        Removes submissions that have been stored for good.
+        """
+        if not ids:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                removed = 0
+                for start in range(0, len(ids), 500):
+                    batch = ids[start:start + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    removed += self._conn.execute(f"DELETE FROM spool WHERE id IN ({placeholders})", batch).rowcount
+                    self._conn.execute(f"DELETE FROM attempts WHERE id IN ({placeholders})", batch)
+                self._conn.execute("UPDATE state SET value = value - ? WHERE key = 'depth'", (removed,))
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def record_failure(self, spool_id, error):
+        """
+        Counts a failed attempt to store a submission. Returns True if that was its
+        last attempt and it has been moved to the dead letters.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("INSERT OR IGNORE INTO attempts (id, count) VALUES (?, 0)", (spool_id,))
+                self._conn.execute("UPDATE attempts SET count = count + 1 WHERE id = ?", (spool_id,))
+                (attempts,) = self._conn.execute("SELECT count FROM attempts WHERE id = ?", (spool_id,)).fetchone()
+                dead = attempts >= self.max_attempts
+                if dead:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO dead_letters (id, payload, received_at, error, failed_at)"
+                        " SELECT id, payload, received_at, ?, ? FROM spool WHERE id = ?",
+                        (str(error), time.time(), spool_id),
+                    )
+                    removed = self._conn.execute("DELETE FROM spool WHERE id = ?", (spool_id,)).rowcount
+                    self._conn.execute("DELETE FROM attempts WHERE id = ?", (spool_id,))
+                    self._conn.execute("UPDATE state SET value = value - ? WHERE key = 'depth'", (removed,))
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return dead
+
+    def dead_letter_count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM dead_letters").fetchone()[0]
+
+    def requeue_dead_letters(self):
+        """
+        Puts every dead letter back in the queue, in its original place, with fresh attempts.
+        Returns how many were requeued.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                requeued = self._conn.execute(
+                    "INSERT INTO spool (id, payload, received_at) SELECT id, payload, received_at FROM dead_letters"
+                ).rowcount
+                self._conn.execute("DELETE FROM dead_letters")
+                self._conn.execute("UPDATE state SET value = value + ? WHERE key = 'depth'", (requeued,))
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return requeued
+
+    def _depth(self):
+        return self._conn.execute("SELECT value FROM state WHERE key = 'depth'").fetchone()[0]
+
+    def depth(self):
+        """
+        Returns the number of submissions waiting to be processed.
+        """
+        with self._lock:
+            return self._depth()
+
+    def oldest_age(self):
+        """
+        Returns how many seconds the oldest waiting submission has waited, or 0 if none are.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT received_at FROM spool ORDER BY id LIMIT 1").fetchone()
+        return max(0.0, time.time() - row[0]) if row else 0.0
+
+
+def _store(spool, batch):
+    messages = [ContactMessage(**data) for _, data, _ in batch]
+    with transaction.atomic():
+        ContactMessage.objects.bulk_create(messages)
+        # auto_now_add stamps the insert time; keep the time the visitor sent the message
+        for message, (_, _, received_at) in zip(messages, batch):
+            message.created_at = datetime.fromtimestamp(received_at, tz=timezone.utc)
+        ContactMessage.objects.bulk_update(messages, ['created_at'])
+        # bulk_create sends no post_save signals for the search index
+        get_search_backend().index(messages)
+    spool.ack([spool_id for spool_id, _, _ in batch])
+
+
+def process_batch(spool, batch_size):
+    """
+    Moves up to batch_size of the oldest submissions into ContactMessage in one transaction.
+    Returns how many were moved.
+
+    If the batch fails, its submissions are stored one at a time instead. One that
+    fails while others are stored has bad data rather than hitting an outage, so
+    the failure counts towards its attempts. If none can be stored, the error is raised.
+    """
+    batch = spool.peek(batch_size)
+    if not batch:
+        return 0
+
+    try:
+        _store(spool, batch)
+        return len(batch)
+    except Exception:
+        if len(batch) == 1:
+            raise
+
+    stored, failures = 0, []
+    for item in batch:
+        try:
+            _store(spool, [item])
+            stored += 1
+        except Exception as e:
+            failures.append((item[0], e))
+    if not stored:
+        raise failures[0][1]
+    for spool_id, error in failures:
+        dead = spool.record_failure(spool_id, error)
+        print(f"Error storing contact submission {spool_id}{' (moved to dead letters)' if dead else ''}: {error}")
+    return stored
+
+
+def get_contact_spool():
+    """
+    Returns the process-wide contact spool configured in settings.
+    """
+    global _spool
+    if _spool is None:
+        with _spool_lock:
+            if _spool is None:
+                _spool = ContactSpool(
+                    settings.CONTACT_SPOOL_PATH,
+                    settings.CONTACT_SPOOL_MAX_DEPTH,
+                    settings.CONTACT_SPOOL_MAX_ATTEMPTS,
+                )
+    return _spool
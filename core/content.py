@@ -0,0 +1,157 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.template.loader import render_to_string
+
+from . import page_cache
+from .models import (
+    Profile, SocialLink, SkillCategory, Project, ProjectCategory,
+    Experience, Education, Certification, Service, Stat, Award, Tag
+)
+from .portfolio import project_page, serialize_project
+from .search import search_site
+
+# Kept apart from the pages and snapshots, whose cache culls entries when it fills up
+CONTENT_VERSION_CACHE = 'content_version'
+CONTENT_VERSION_KEY = 'core:content-version'
+HOMEPAGE_SNAPSHOT_KEY = 'core:homepage:{version}'
+PROJECT_PAGE_KEY = 'core:projects:{version}:{query}'
+SEARCH_RESULTS_KEY = 'core:search:{version}:{query}'
+
+# Snapshots are keyed by version, so they never go stale; the timeout only reclaims old ones.
+SNAPSHOT_TIMEOUT = 60 * 60 * 24 * 7
+
+
+def get_content_version():
+    """
+    Returns the current content version, starting a new one if the cache has none.
+    """
+    version_cache = caches[CONTENT_VERSION_CACHE]
+    version = version_cache.get(CONTENT_VERSION_KEY)
+    if version is None:
+        version_cache.add(CONTENT_VERSION_KEY, str(time.time_ns()), timeout=None)
+        version = version_cache.get(CONTENT_VERSION_KEY)
+    return version
+
+
+def get_content_last_modified():
+    """
+    Returns when the site content last changed, read from the content version.
+
+    The version is the time of the last save or delete on any core model, so it
+    covers the OrderedModel-only tables that have no updated_at column.
+    """
+    return datetime.fromtimestamp(int(get_content_version()) / 1e9, tz=timezone.utc)
+
+
+def bump_content_version():
+    """
+    Marks the site content as changed, so every cached snapshot is rebuilt on next use.
+    """
+    caches[CONTENT_VERSION_CACHE].set(CONTENT_VERSION_KEY, str(time.time_ns()), timeout=None)
+
+
+def build_homepage_context():
+    """
+    Runs the homepage queries and materializes the results so they can be cached.
+    """
+    first_page, next_cursor = project_page()
+    return {
+        # Get the most recently updated profile
+        'profile': Profile.objects.order_by('-updated_at').first(),
+        'socials': list(SocialLink.objects.all()),
+        'skill_categories': list(SkillCategory.objects.prefetch_related('skills').all()),
+
+        # Portfolio Section
+        # Only the first page is rendered; the rest is loaded by the grid as it scrolls
+        'projects': first_page,
+        'projects_next': next_cursor,
+        'project_categories': list(ProjectCategory.objects.all()),  # For the filter buttons
+        'tags': list(Tag.objects.all()[:settings.PORTFOLIO_TAG_LIMIT]),  # Most used first, with counts
+
+        # Resume Section
+        'experiences': list(Experience.objects.all()),
+        'education_list': list(Education.objects.all()),
+        'certifications': list(Certification.objects.all()),
+        'awards': list(Award.objects.all()),
+
+        # Other Sections
+        'stats': list(Stat.objects.all()),
+        'services': list(Service.objects.all()),
+    }
+
+
+def get_homepage_context():
+    """
+    Returns the homepage context for the current content version from the cache,
+    building it on the first request after a change.
+    """
+    key = HOMEPAGE_SNAPSHOT_KEY.format(version=get_content_version())
+    context = cache.get(key)
+    if context is None:
+        context = build_homepage_context()
+        cache.set(key, context, timeout=SNAPSHOT_TIMEOUT)
+    return dict(context)
+
+
+def get_project_page(category=None, cursor=None, tag=None):
+    """
+    Returns one page of the portfolio grid as {'projects', 'html', 'next'}, cached per content version.
+
+    Raises ValueError for a malformed cursor.
+    """
+    query = hashlib.sha256(f"{category or ''}\0{tag or ''}\0{cursor or ''}".encode('utf-8')).hexdigest()[:32]
+    key = PROJECT_PAGE_KEY.format(version=get_content_version(), query=query)
+    page = cache.get(key)
+    if page is None:
+        projects, next_cursor = project_page(category, cursor, tag=tag)
+        page = {
+            'projects': [serialize_project(project) for project in projects],
+            'html': render_to_string('portfolio_items.html', {'projects': projects}),
+            'next': next_cursor,
+        }
+        cache.set(key, page, timeout=SNAPSHOT_TIMEOUT)
+    return page
+
+
+def get_search_results(query, types=None):
+    """
+    Returns the public search results for a query, cached per content version.
+    """
+    types = sorted(types or [])
+    normalized = ' '.join(query.lower().split())
+    key = SEARCH_RESULTS_KEY.format(
+        version=get_content_version(),
+        query=hashlib.sha256(f"{normalized}\0{','.join(types)}".encode('utf-8')).hexdigest()[:32],
+    )
+    results = cache.get(key)
+    if results is None:
+        results = search_site(normalized, types, limit=settings.SEARCH_RESULT_LIMIT)
+        cache.set(key, results, timeout=SNAPSHOT_TIMEOUT)
+    return results
+
+
+def detail_page_paths():
+    """
+    Returns the path of every project and service page.
+    """
+    paths = [page_cache.project_path(slug) for slug in Project.objects.values_list('slug', flat=True)]
+    paths += [page_cache.service_path(slug) for slug in Service.objects.values_list('slug', flat=True)]
+    return paths
+
+
+def refresh_all_pages(stale_paths=()):
+    """
+    Starts a new content version and drops every cached page.
+
+    For changes that don't go through model signals (bulk inserts, files
+    mirrored in the background) and may show up on any page. Pass the paths of
+    pages whose rows were removed as `stale_paths`, since they can't be found
+    from the current rows.
+    """
+    paths = [page_cache.homepage_path(), *detail_page_paths(), *stale_paths]
+    bump_content_version()
+    page_cache.purge_paths(paths)
@@ -0,0 +1,188 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+
+# Derivative formats: (extension, Pillow format). WebP is written last, so once it
+# exists the JPEG fallback for the same width does too.
+DERIVATIVE_FORMATS = (('jpg', 'JPEG'), ('webp', 'WEBP'))
+
+# EXIF orientations that turn the image on its side
+EXIF_ORIENTATION = 0x0112
+ROTATED = (5, 6, 7, 8)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def derivative_name(name, width, extension):
+    """
+    Returns the name of a derivative, stored next to the original: projects/app.jpg -> projects/app.w640.webp
+    """
+    root, _ = os.path.splitext(name)
+    return f"{root}.w{width}.{extension}"
+
+
+def target_widths(original_width, widths):
+    """
+    Returns the width buckets to generate for an image, never upscaling it.
+
+    Buckets narrower than the original are generated at their own width; the first
+    bucket at or above it is generated at the original width, so the largest
+    derivative still covers the full image.
+    """
+    targets = []
+    for width in sorted(widths):
+        targets.append((width, min(width, original_width)))
+        if width >= original_width:
+            break
+    return targets
+
+
+def generate_derivatives(path, widths, force=False):
+    """
+    Writes the WebP and JPEG derivatives of the image file at path.
+
+    Returns (files written, [[bucket, actual width], ...]); the actual widths are
+    what srcset advertises. This runs in a worker process, so it only touches the
+    filesystem and Pillow.
+    """
+    written = 0
+    with Image.open(path) as original:
+        # Opening only reads the header, so re-saving an unchanged image costs no decoding
+        width = original.height if original.getexif().get(EXIF_ORIENTATION) in ROTATED else original.width
+        targets = target_widths(width, widths)
+        generated = [[bucket, bucket_width] for bucket, bucket_width in targets]
+        if not force and all(
+            os.path.exists(derivative_name(path, bucket, extension))
+            for bucket, _ in targets for extension, _ in DERIVATIVE_FORMATS
+        ):
+            return 0, generated
+
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+
+        for bucket, width in targets:
+            resized = image
+            if width < image.width:
+                height = max(1, round(image.height * width / image.width))
+                resized = image.resize((width, height), Image.LANCZOS)
+
+            for extension, image_format in DERIVATIVE_FORMATS:
+                target = derivative_name(path, bucket, extension)
+                if not force and os.path.exists(target):
+                    continue
+                frame = resized
+                if image_format == 'JPEG' and frame.mode == 'RGBA':
+                    # JPEG has no alpha channel, so transparent areas go white
+                    frame = Image.new('RGB', frame.size, (255, 255, 255))
+                    frame.paste(resized, mask=resized.getchannel('A'))
+
+                # Write to a temporary name so a page never links a half-written file
+                tmp = f"{target}.tmp"
+                if image_format == 'JPEG':
+                    frame.save(tmp, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+                else:
+                    frame.save(tmp, 'WEBP', quality=WEBP_QUALITY, method=6)
+                os.replace(tmp, target)
+                written += 1
+    return written, generated
+
+
+def is_local_image(fieldfile):
+    # Remote URLs stored in the field (as the populated data uses) have no file to resize
+    return bool(fieldfile) and not str(fieldfile.name).startswith('http')
+
+
+def srcset(fieldfile, derivatives, extension):
+    """
+    Returns a srcset of the image's generated derivatives in the given format, or "" if there are none yet.
+
+    `derivatives` is the record saved by `record_derivatives`, so rendering needs no
+    filesystem access, and each file is labelled with the width it was generated at.
+    """
+    if not is_local_image(fieldfile) or not derivatives or derivatives.get('name') != fieldfile.name:
+        return ""
+    return ", ".join(
+        f"{default_storage.url(derivative_name(fieldfile.name, bucket, extension))} {width}w"
+        for bucket, width in derivatives['widths']
+    )
+
+
+def record_derivatives(instance, field, name, widths):
+    """
+    Saves which derivatives exist for the image `name` in `instance.<field>`, and their
+    real widths, unless the record already says so. Returns whether it changed.
+
+    The row is only updated if it still holds the same image, so a late worker
+    can't overwrite the record of a newer upload. No signals are sent.
+    """
+    record = {'name': name, 'widths': widths}
+    if instance.image_derivatives == record:
+        return False
+    updated = type(instance).objects.filter(pk=instance.pk, **{field: name}).update(image_derivatives=record)
+    if updated:
+        instance.image_derivatives = record
+    return bool(updated)
+
+
+def get_executor():
+    """
+    Returns the process pool that resizes uploaded images, starting it on first use.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Workers are spawned rather than forked from the (threaded) server process
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_DERIVATIVE_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _executor
+
+
+def _derivatives_done(instance, field, name, on_generated, future):
+    try:
+        written, widths = future.result()
+    except Exception as e:
+        print(f"Error generating image derivatives for {name}: {e}")
+        return
+    try:
+        changed = record_derivatives(instance, field, name, widths)
+    finally:
+        # This runs on the pool's callback thread, which keeps no connection between calls
+        connections.close_all()
+    if (written or changed) and on_generated:
+        on_generated()
+
+
+def schedule_derivatives(instance, field, on_generated=None):
+    """
+    Generates the derivatives of the image in `instance.<field>` in the background
+    once the current transaction commits, and records their widths on the row.
+    on_generated is called when new files were written or the record changed.
+    """
+    fieldfile = getattr(instance, field)
+    if not is_local_image(fieldfile):
+        return
+    try:
+        path = fieldfile.path
+    except NotImplementedError:
+        # Storage without local paths (e.g. a remote bucket)
+        return
+    name = fieldfile.name
+
+    def submit():
+        future = get_executor().submit(generate_derivatives, path, list(settings.IMAGE_DERIVATIVE_WIDTHS))
+        future.add_done_callback(lambda f: _derivatives_done(instance, field, name, on_generated, f))
+
+    transaction.on_commit(submit)
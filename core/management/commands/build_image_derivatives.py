@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from core.content import bump_content_version
+from core.images import generate_derivatives, get_executor, is_local_image, record_derivatives
+from core.page_cache import homepage_path, purge_paths
+from core.signals import DETAIL_PAGES, IMAGE_FIELDS
+
+
+class Command(BaseCommand):
+    help = 'Generates the responsive WebP/JPEG derivatives of every uploaded Project, Service and Profile image'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Regenerate derivatives that already exist.',
+        )
+
+    def handle(self, *args, **options):
+        jobs = []
+        for model, field in IMAGE_FIELDS.items():
+            for instance in model.objects.all():
+                fieldfile = getattr(instance, field)
+                if is_local_image(fieldfile):
+                    jobs.append((instance, field, fieldfile.name, fieldfile.path))
+
+        self.stdout.write(f'Generating derivatives for {len(jobs)} images...')
+        widths = list(settings.IMAGE_DERIVATIVE_WIDTHS)
+        futures = [
+            (instance, field, name, path, get_executor().submit(generate_derivatives, path, widths, options['force']))
+            for instance, field, name, path in jobs
+        ]
+
+        written, changed, paths = 0, False, {homepage_path()}
+        for instance, field, name, path, future in futures:
+            try:
+                count, generated = future.result()
+            except Exception as e:
+                self.stderr.write(f'Error generating derivatives for {path}: {e}')
+                continue
+            written += count
+            # Also records the widths of derivatives generated before they were tracked
+            recorded = record_derivatives(instance, field, name, generated)
+            changed = changed or recorded
+            if (count or recorded) and type(instance) in DETAIL_PAGES:
+                paths.add(DETAIL_PAGES[type(instance)](instance.slug))
+
+        if written or changed:
+            bump_content_version()
+            purge_paths(paths)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} derivative files.'))
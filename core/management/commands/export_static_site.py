@@ -0,0 +1,169 @@
+import hashlib
+import json
+import multiprocessing
+import os
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from core.models import ContactMessage, Project, Service
+from core.page_cache import STATIC_EXPORT_ENVIRON, homepage_path, project_path, service_path
+from core.remote_media import REMOTE_FIELDS, close_remote_media, get_remote_media, is_remote
+
+MANIFEST_NAME = '.export-manifest.json'
+
+
+def _mirrored_names(queryset):
+    # The local copies the rows' remote file URLs are served from, which come and go with the mirror
+    fields = REMOTE_FIELDS.get(queryset.model._meta.label_lower)
+    if not settings.REMOTE_MEDIA_ENABLED or not fields:
+        return []
+    mirror = get_remote_media()
+    return [
+        mirror.lookup(value) if value and is_remote(value) else None
+        for values in queryset.order_by('pk').values_list(*fields)
+        for value in values
+    ]
+
+
+def _rows_fingerprint(queryset):
+    # The image derivative widths the srcsets are built from are part of each row
+    state = [list(queryset.order_by('pk').values()), _mirrored_names(queryset)]
+    return hashlib.sha256(json.dumps(state, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def _static_fingerprint():
+    # Every page links the hashed static file names, which change when collectstatic finds new contents
+    read_manifest = getattr(staticfiles_storage, 'read_manifest', None)
+    manifest = (read_manifest() if read_manifest else None) or ''
+    return hashlib.sha256(manifest.encode('utf-8')).hexdigest()
+
+
+def page_fingerprints():
+    """
+    Returns {path: fingerprint} for every page, where the fingerprint hashes the rows the page
+    shows, the mirrored copies of their remote files and the static files manifest.
+    """
+    # The homepage shows every model except contact messages
+    homepage = hashlib.sha256()
+    for model in apps.get_app_config('core').get_models():
+        if model is not ContactMessage:
+            homepage.update(_rows_fingerprint(model.objects.all()).encode('utf-8'))
+    pages = {homepage_path(): homepage.hexdigest()}
+
+    # Detail pages show their own row, and a project page its category's name too
+    for project in Project.objects.select_related('category'):
+        fingerprint = _rows_fingerprint(Project.objects.filter(pk=project.pk))
+        if project.category:
+            fingerprint += project.category.name
+        pages[project_path(project.slug)] = hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()
+
+    for service in Service.objects.all():
+        pages[service_path(service.slug)] = _rows_fingerprint(Service.objects.filter(pk=service.pk))
+
+    static = _static_fingerprint()
+    return {
+        path: hashlib.sha256(f'{fingerprint}-{static}'.encode('utf-8')).hexdigest()
+        for path, fingerprint in pages.items()
+    }
+
+
+def output_file(output_dir, path):
+    return os.path.join(output_dir, path.strip('/'), 'index.html')
+
+
+def _init_worker():
+    # Each worker opens its own database connection
+    import django
+    django.setup()
+
+
+def render_page(job):
+    """
+    Renders one path through the full Django stack and writes it to the output directory.
+
+    The request is marked as an export, so it bypasses the page cache and the
+    homepage leaves out the contact form and its CSRF token.
+    """
+    output_dir, path = job
+    response = Client(SERVER_NAME='localhost', **{STATIC_EXPORT_ENVIRON: True}).get(path)
+    if response.status_code != 200:
+        return path, response.status_code
+
+    target = output_file(output_dir, path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open(target, 'wb') as f:
+        f.write(response.content)
+    return path, response.status_code
+
+
+class Command(BaseCommand):
+    help = 'Pre-renders the homepage and every project and service page to a static directory'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            default=str(settings.STATIC_EXPORT_DIR),
+            help='Directory to write the rendered pages to.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Number of worker processes rendering pages in parallel.',
+        )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Only re-render pages whose underlying rows changed since the last export.',
+        )
+
+    def handle(self, *args, **options):
+        output_dir = options['output']
+        manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+        os.makedirs(output_dir, exist_ok=True)
+
+        previous = {}
+        if options['incremental'] and os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                previous = json.load(f)
+
+        pages = page_fingerprints()
+        to_render = [
+            path for path, fingerprint in pages.items()
+            if previous.get(path) != fingerprint or not os.path.exists(output_file(output_dir, path))
+        ]
+
+        # Pages for deleted or renamed rows
+        for path in set(previous) - set(pages):
+            target = output_file(output_dir, path)
+            if os.path.exists(target):
+                os.remove(target)
+            self.stdout.write(f'Removed {path}')
+
+        self.stdout.write(f'Rendering {len(to_render)} of {len(pages)} pages...')
+
+        # Forked workers must not share the parent's database or mirror index connections
+        connections.close_all()
+        close_remote_media()
+        failed = []
+        with multiprocessing.Pool(max(1, options['workers']), initializer=_init_worker) as pool:
+            for path, status in pool.imap_unordered(render_page, [(output_dir, path) for path in to_render]):
+                if status != 200:
+                    failed.append(path)
+                    self.stderr.write(f'{path} returned {status}')
+
+        # Failed pages are left out of the manifest so the next run retries them
+        manifest = {path: fingerprint for path, fingerprint in pages.items() if path not in failed}
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+
+        if failed:
+            raise CommandError(f'{len(failed)} pages failed to render.')
+        self.stdout.write(self.style.SUCCESS(
+            f'Exported {len(to_render)} pages to {output_dir}. '
+            'Run collectstatic and serve STATIC_ROOT alongside it for the assets.'
+        ))
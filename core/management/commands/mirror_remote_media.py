@@ -0,0 +1,42 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from core.content import refresh_all_pages
+from core.remote_media import REMOTE_FIELDS, get_remote_media, is_remote
+
+
+class Command(BaseCommand):
+    help = 'Copies the remote image and resume URLs stored in file fields into the local media mirror'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Delete every mirrored file first and fetch them all again.',
+        )
+
+    def handle(self, *args, **options):
+        mirror = get_remote_media()
+        if options['clear']:
+            mirror.clear()
+
+        urls = set()
+        for label, fields in REMOTE_FIELDS.items():
+            for values in apps.get_model(label).objects.values_list(*fields):
+                urls.update(value for value in values if value and is_remote(value))
+
+        fetched = 0
+        for url in sorted(urls):
+            if mirror.lookup(url) is not None:
+                continue
+            try:
+                name = mirror.fetch(url)
+            except Exception as e:
+                self.stderr.write(f'Error mirroring {url}: {e}')
+                continue
+            fetched += 1
+            self.stdout.write(f'{url} -> {name}')
+
+        # Cached pages may link files that were just fetched, evicted or cleared
+        if fetched or options['clear']:
+            refresh_all_pages()
+        self.stdout.write(self.style.SUCCESS(f'Mirrored {fetched} of {len(urls)} remote files.'))
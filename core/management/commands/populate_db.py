@@ -1,33 +1,95 @@
 import random
+import time
 from django.core.management.base import BaseCommand
+from django.db import connections, transaction
 from django.utils.text import slugify
 from faker import Faker
+from chatbot.ingest import log_record_change
+from core.content import detail_page_paths, refresh_all_pages
+from core.search import get_search_backend
 from core.models import (
     Profile, SocialLink, SkillCategory, Skill, ProjectCategory, Project,
-    Experience, Education, Certification, Service, Stat, Award
+    Experience, Education, Certification, Service, Stat, Award, ContactMessage, Tag
 )
+from core.tags import sync_project_tags
+
+
+def unique_slug(text, used):
+    """
+    Returns slugify(text), suffixed with a counter if it's already in `used`.
+    """
+    base = slug = slugify(text)
+    n = 2
+    while slug in used:
+        slug = f"{base}-{n}"
+        n += 1
+    used.add(slug)
+    return slug
 
 
 class Command(BaseCommand):
     help = 'Populates the database with a rich set of dummy data using direct image URLs'
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale',
+            type=int,
+            default=1,
+            help='Multiplies the number of generated rows (1 gives the small demo dataset).',
+        )
+        parser.add_argument(
+            '--messages',
+            type=int,
+            default=0,
+            help='Number of contact messages to add. Existing messages are kept.',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=None,
+            help='Random seed; pass one to generate the same data every run.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows per INSERT when bulk creating.',
+        )
+
+    def handle(self, *args, **options):
         self.stdout.write('Starting to populate the database with comprehensive dummy data...')
+        started = time.monotonic()
+        scale = max(1, options['scale'])
+        batch_size = options['batch_size']
+        random.seed(options['seed'])
+        Faker.seed(options['seed'])
         fake = Faker()
 
+        # Everything runs in one transaction: the inserts share a single commit, and a
+        # failure leaves the old data in place. OrderedModel's bulk_create numbers
+        # `order` itself (per category for skills), so rows keep their admin ordering.
+        with transaction.atomic():
+            self.populate(fake, scale, options['messages'], batch_size)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully populated the database with a rich set of dummy data '
+            f'in {time.monotonic() - started:.1f}s.'
+        ))
+
+    def populate(self, fake, scale, messages, batch_size):
         # --- 0. CLEAN UP EXISTING DATA ---
         self.stdout.write('Clearing old data...')
-        Profile.objects.all().delete()
-        SocialLink.objects.all().delete()
-        SkillCategory.objects.all().delete()
-        Project.objects.all().delete()
-        ProjectCategory.objects.all().delete()
-        Experience.objects.all().delete()
-        Education.objects.all().delete()
-        Certification.objects.all().delete()
-        Service.objects.all().delete()
-        Stat.objects.all().delete()
-        Award.objects.all().delete()
+        # The pages of the old rows are purged too, once the new data commits
+        old_paths = detail_page_paths()
+        # One DELETE statement per table. QuerySet.delete() would load every row to send
+        # its signals (a page purge, a search and chatbot update and an OrderedModel
+        # renumbering each), and everything they'd update is rebuilt below anyway.
+        # Children go before their parents so no foreign key is left dangling.
+        for model in (Profile, SocialLink, Skill, SkillCategory, Project.tags.through, Tag, Project,
+                      ProjectCategory, Experience, Education, Certification, Service, Stat, Award):
+            connection = connections[model.objects.db]
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {connection.ops.quote_name(model._meta.db_table)}')
 
         # --- Image URLs ---
         # Using a predefined list of reliable URLs to avoid placeholder service issues
@@ -61,53 +123,57 @@ class Command(BaseCommand):
             ('Twitter', 'bi bi-twitter'), ('Facebook', 'bi bi-facebook'),
             ('Instagram', 'bi bi-instagram'), ('Stack Overflow', 'bi bi-stack-overflow')
         ]
-        for label, icon in random.sample(socials, 5):
-            SocialLink.objects.create(
+        SocialLink.objects.bulk_create([
+            SocialLink(
                 label=label,
                 url=f"https://{label.lower().replace(' ', '')}.com/{fake.user_name()}",
                 icon_class=icon
             )
+            for label, icon in random.sample(socials, 5)
+        ])
 
         # --- 3. SKILL CATEGORIES & SKILLS (Multiple Categories, >=5 Skills each) ---
         self.stdout.write('Creating Skills...')
         skill_categories = ['Frontend', 'Backend', 'Databases', 'DevOps', 'Cloud Platforms']
-        for cat_name in skill_categories:
-            category = SkillCategory.objects.create(name=cat_name)
-            for _ in range(random.randint(5, 8)):
-                Skill.objects.create(
-                    category=category,
-                    name=fake.word().capitalize(),
-                    level=random.randint(70, 98)
-                )
+        categories = SkillCategory.objects.bulk_create([SkillCategory(name=name) for name in skill_categories])
+        Skill.objects.bulk_create([
+            Skill(
+                category=category,
+                name=fake.word().capitalize(),
+                level=random.randint(70, 98)
+            )
+            for category in categories
+            for _ in range(random.randint(5, 8) * scale)
+        ], batch_size=batch_size)
 
         # --- 4. PROJECT CATEGORIES & PROJECTS (Multiple Categories, >=5 Projects total) ---
         self.stdout.write('Creating Projects...')
         project_categories = ['Web Development', 'Mobile App', 'Data Science', 'Automation', 'Cloud Infrastructure']
-        created_projects = 0
-        for cat_name in project_categories:
-            if created_projects >= 5: break
-            slug = slugify(cat_name)
-            category, _ = ProjectCategory.objects.get_or_create(name=cat_name, slug=slug)
-            for i in range(random.randint(1, 2)):
-                if created_projects >= 5: break
-                title = f"{fake.bs().title()} {cat_name} Project"
-                Project.objects.create(
-                    category=category,
-                    title=title,
-                    slug=slugify(title),
-                    description=fake.paragraph(nb_sentences=8),
-                    tech_stack=", ".join(fake.words(nb=random.randint(4, 7))),
-                    repo_url=f"https://github.com/{fake.user_name()}/{slugify(title)}",
-                    live_url=fake.url(),
-                    featured=random.choice([True, False, False]),
-                    image=project_image_urls[created_projects]
-                )
-                created_projects += 1
+        categories = ProjectCategory.objects.bulk_create([
+            ProjectCategory(name=cat_name, slug=slugify(cat_name)) for cat_name in project_categories
+        ])
+        projects, slugs = [], set()
+        for i in range(5 * scale):
+            category = random.choice(categories)
+            title = f"{fake.bs().title()} {category.name} Project"
+            projects.append(Project(
+                category=category,
+                title=title,
+                slug=unique_slug(title, slugs),
+                description=fake.paragraph(nb_sentences=8),
+                tech_stack=", ".join(fake.words(nb=random.randint(4, 7))),
+                repo_url=f"https://github.com/{fake.user_name()}/{slugify(title)}",
+                live_url=fake.url(),
+                featured=random.choice([True, False, False]),
+                image=project_image_urls[i % len(project_image_urls)]
+            ))
+        Project.objects.bulk_create(projects, batch_size=batch_size)
+        sync_project_tags(projects)
 
         # --- 5. EXPERIENCE (At least 5) ---
         self.stdout.write('Creating Experience...')
-        for _ in range(5):
-            Experience.objects.create(
+        Experience.objects.bulk_create([
+            Experience(
                 company=fake.company(),
                 role=fake.job(),
                 start_date=fake.date_between(start_date='-10y', end_date='-1y'),
@@ -115,42 +181,50 @@ class Command(BaseCommand):
                 location=f"{fake.city()}, {fake.country()}",
                 description=fake.text(max_nb_chars=500)
             )
+            for _ in range(5 * scale)
+        ], batch_size=batch_size)
 
         # --- 6. EDUCATION (At least 5) ---
         self.stdout.write('Creating Education...')
-        for _ in range(5):
-            Education.objects.create(
+        Education.objects.bulk_create([
+            Education(
                 school=f"{fake.city().title()} University",
                 program=f"{random.choice(['B.S.', 'M.S.'])} in {fake.word().capitalize()} Science",
                 start_date=fake.date_between(start_date='-12y', end_date='-6y'),
                 end_date=fake.date_between(start_date='-5y', end_date='-1y'),
                 description=fake.sentence()
             )
+            for _ in range(5 * scale)
+        ], batch_size=batch_size)
 
         # --- 7. CERTIFICATIONS (At least 5) ---
         self.stdout.write('Creating Certifications...')
-        for _ in range(5):
-            Certification.objects.create(
+        Certification.objects.bulk_create([
+            Certification(
                 name=f"Certified {fake.job()}",
                 issuer=f"{fake.company()} Institute",
                 issue_date=fake.date_this_decade(),
                 url=fake.url()
             )
+            for _ in range(5 * scale)
+        ], batch_size=batch_size)
 
         # --- 8. SERVICES (At least 5) ---
         self.stdout.write('Creating Services...')
         service_icons = ['bi bi-briefcase', 'bi bi-card-checklist', 'bi bi-bar-chart', 'bi bi-binoculars', 'bi bi-brightness-high', 'bi bi-calendar4-week']
-        for i in range(5):
+        services, slugs = [], set()
+        for i in range(5 * scale):
             title = fake.catch_phrase()
-            Service.objects.create(
+            services.append(Service(
                 title=title,
-                slug=slugify(title),
+                slug=unique_slug(title, slugs),
                 short_description=fake.sentence(nb_words=10),
                 description=fake.text(max_nb_chars=400),
                 icon_class=random.choice(service_icons),
                 featured=random.choice([True, False]),
-                image=service_image_urls[i]
-            )
+                image=service_image_urls[i % len(service_image_urls)]
+            ))
+        Service.objects.bulk_create(services, batch_size=batch_size)
 
         # --- 9. STATS (At least 5) ---
         self.stdout.write('Creating Stats...')
@@ -159,21 +233,44 @@ class Command(BaseCommand):
             ('Hours of Support', 'bi bi-headset'), ('Awards Won', 'bi bi-award'),
             ('Cups of Coffee', 'bi bi-cup-hot'), ('Lines of Code', 'bi bi-file-code')
         ]
-        for label, icon in random.sample(stats_data, 5):
-            Stat.objects.create(
+        Stat.objects.bulk_create([
+            Stat(
                 label=label,
                 count=random.randint(20, 1000),
                 icon_class=icon
             )
+            for label, icon in random.sample(stats_data, 5)
+        ])
 
         # --- 10. AWARDS (At least 5) ---
         self.stdout.write('Creating Awards...')
-        for _ in range(5):
-            Award.objects.create(
+        Award.objects.bulk_create([
+            Award(
                 title=f"{fake.word().capitalize()} Award for Excellence in {fake.word()}",
                 issuer=f"{fake.company()} Foundation",
                 year=str(fake.year()),
                 description=fake.sentence()
             )
+            for _ in range(5 * scale)
+        ], batch_size=batch_size)
+
+        # --- 11. CONTACT MESSAGES (Only when asked for) ---
+        if messages:
+            self.stdout.write('Creating Contact Messages...')
+            ContactMessage.objects.bulk_create([
+                ContactMessage(
+                    name=fake.name(),
+                    email=fake.email(),
+                    subject=fake.sentence(nb_words=6),
+                    message=fake.text(max_nb_chars=800),
+                    read=random.choice([True, False])
+                )
+                for _ in range(messages)
+            ], batch_size=batch_size)
 
-        self.stdout.write(self.style.SUCCESS('Successfully populated the database with a rich set of dummy data.'))
+        # bulk_create sends no post_save signals, so reindex everything in the same
+        # transaction and tell the page cache and the chatbot once it commits
+        self.stdout.write('Rebuilding the search index...')
+        get_search_backend().rebuild()
+        transaction.on_commit(lambda: refresh_all_pages(old_paths))
+        transaction.on_commit(log_record_change)
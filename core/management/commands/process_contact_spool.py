@@ -0,0 +1,70 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from core.contact_spool import get_contact_spool, process_batch
+
+
+class Command(BaseCommand):
+    help = 'Moves queued contact form submissions into the database in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once the queue is empty instead of waiting for more submissions.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.CONTACT_SPOOL_BATCH_SIZE,
+            help='Submissions written per transaction.',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Seconds to wait before checking an empty queue again.',
+        )
+        parser.add_argument(
+            '--stats',
+            action='store_true',
+            help='Print the queue depth, the age of the oldest submission and the dead letter count, then exit.',
+        )
+        parser.add_argument(
+            '--requeue-dead-letters',
+            action='store_true',
+            help='Put submissions set aside after CONTACT_SPOOL_MAX_ATTEMPTS failures back in the queue, then exit.',
+        )
+
+    def handle(self, *args, **options):
+        spool = get_contact_spool()
+        if options['stats']:
+            self.stdout.write(
+                f'depth={spool.depth()} oldest_age={spool.oldest_age():.1f}s dead_letters={spool.dead_letter_count()}'
+            )
+            return
+        if options['requeue_dead_letters']:
+            self.stdout.write(self.style.SUCCESS(f'Requeued {spool.requeue_dead_letters()} contact messages.'))
+            return
+
+        total = 0
+        try:
+            while True:
+                try:
+                    moved = process_batch(spool, options['batch_size'])
+                except Exception as e:
+                    # The batch stays queued; try again after a pause
+                    self.stderr.write(f'Error processing contact spool: {e}')
+                    moved = 0
+                    if options['once']:
+                        break
+                if moved:
+                    total += moved
+                    self.stdout.write(f'Stored {moved} messages ({spool.depth()} waiting).')
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Stored {total} contact messages.'))
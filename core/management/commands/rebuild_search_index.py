@@ -0,0 +1,14 @@
+import time
+from django.core.management.base import BaseCommand
+from core.search import SEARCH_MODELS, get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the site search index from the database'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        get_search_backend().rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {len(SEARCH_MODELS)} models in {time.perf_counter() - started:.2f}s.'
+        ))
@@ -0,0 +1,21 @@
+# Generated by Django 4.1.2 on 2026-10-18 06:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_alter_certification_options_alter_education_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['-featured', '-created_at', '-id'], name='project_grid_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['category', '-featured', '-created_at', '-id'], name='project_category_grid_idx'),
+        ),
+    ]
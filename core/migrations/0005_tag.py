@@ -0,0 +1,36 @@
+# Generated by Django 4.1.2 on 2026-10-18 06:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_project_grid_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('name', models.CharField(max_length=60)),
+                ('slug', models.SlugField(max_length=60, unique=True)),
+                ('project_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-project_count', 'name'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['-project_count', 'name'], name='tag_popularity_idx'),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='tags',
+            field=models.ManyToManyField(blank=True, related_name='projects', to='core.tag'),
+        ),
+    ]
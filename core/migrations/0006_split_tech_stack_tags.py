@@ -0,0 +1,46 @@
+from django.db import migrations
+from django.utils.text import slugify
+
+
+def split_tech_stacks(apps, schema_editor):
+    Project = apps.get_model('core', 'Project')
+    Tag = apps.get_model('core', 'Tag')
+    Through = Project.tags.through
+
+    wanted = {}
+    for pk, tech_stack in Project.objects.values_list('pk', 'tech_stack'):
+        slugs = {}
+        for name in (tech_stack or '').split(','):
+            name = ' '.join(name.split())[:60]
+            slug = slugify(name)[:60]
+            if slug and slug not in slugs:
+                slugs[slug] = name
+        wanted[pk] = slugs
+
+    names = {}
+    for slugs in wanted.values():
+        for slug, name in slugs.items():
+            names.setdefault(slug, name)
+    Tag.objects.bulk_create([Tag(name=name, slug=slug) for slug, name in names.items()], ignore_conflicts=True)
+    tag_ids = dict(Tag.objects.values_list('slug', 'id'))
+
+    Through.objects.bulk_create([
+        Through(project_id=pk, tag_id=tag_ids[slug])
+        for pk, slugs in wanted.items()
+        for slug in slugs
+    ], batch_size=1000, ignore_conflicts=True)
+
+    for tag in Tag.objects.all():
+        tag.project_count = Through.objects.filter(tag_id=tag.pk).count()
+        tag.save(update_fields=['project_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_tag'),
+    ]
+
+    operations = [
+        migrations.RunPython(split_tech_stacks, migrations.RunPython.noop),
+    ]
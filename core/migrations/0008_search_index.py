@@ -0,0 +1,32 @@
+from django.db import migrations
+
+
+class SQLiteRunSQL(migrations.RunSQL):
+    """
+    RunSQL that only runs on SQLite; the FTS5 search backend refuses other databases.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'sqlite':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'sqlite':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_image_derivatives'),
+    ]
+
+    operations = [
+        # IF NOT EXISTS: the table used to be created on first use. It's filled by
+        # the post_migrate rebuild.
+        SQLiteRunSQL(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS core_search_index USING fts5("
+            " title, body, tokenize = 'porter unicode61 remove_diacritics 2')",
+            "DROP TABLE IF EXISTS core_search_index",
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from ordered_model.models import OrderedModel
 
+from . import images, remote_media
+
 
 class Timestamped(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
@@ -18,6 +20,8 @@ class Profile(Timestamped):
     email = models.EmailField(blank=True)
     location = models.CharField(max_length=120, blank=True)
     resume_file = models.FileField(upload_to="docs/", blank=True, null=True)
+    # Which derivatives of the headshot exist and their real widths, saved once they're generated
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
 
     def __str__(self):
         return self.full_name
@@ -25,19 +29,28 @@ class Profile(Timestamped):
     @property
     def display_image(self):
         if self.headshot and hasattr(self.headshot, 'name'):
-            # Check if the raw value is a full URL
+            # Check if the raw value is a full URL (served from the local mirror once fetched)
             if str(self.headshot.name).startswith('http'):
-                return self.headshot.name
+                return remote_media.local_url(self.headshot.name)
             # Otherwise, it's a file path, so use the .url property
             elif hasattr(self.headshot, 'url'):
                 return self.headshot.url
         return ""
 
+    @property
+    def display_srcset(self):
+        # WebP derivatives for <source srcset>; empty until they've been generated
+        return images.srcset(self.headshot, self.image_derivatives, 'webp')
+
+    @property
+    def display_srcset_fallback(self):
+        return images.srcset(self.headshot, self.image_derivatives, 'jpg')
+
     @property
     def get_resume_url(self):
         if self.resume_file and hasattr(self.resume_file, 'name'):
             if str(self.resume_file.name).startswith('http'):
-                return self.resume_file.name
+                return remote_media.local_url(self.resume_file.name)
             elif hasattr(self.resume_file, 'url'):
                 return self.resume_file.url
         return "#"
@@ -86,13 +99,32 @@ class ProjectCategory(Timestamped):
         return self.name
 
 
+class Tag(Timestamped):
+    """A technology from some project's tech_stack; kept in sync with it on save."""
+    name = models.CharField(max_length=60)
+    slug = models.SlugField(max_length=60, unique=True)
+    project_count = models.PositiveIntegerField(default=0)  # Precomputed for the tag filters
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        ordering = ['-project_count', 'name']
+        indexes = [
+            models.Index(fields=['-project_count', 'name'], name='tag_popularity_idx'),
+        ]
+
+
 class Project(Timestamped, OrderedModel):
     category = models.ForeignKey(ProjectCategory, on_delete=models.SET_NULL, null=True, related_name='projects')
     title = models.CharField(max_length=160)
     slug = models.SlugField(unique=True)
     description = models.TextField(blank=True)
     tech_stack = models.CharField(max_length=240, blank=True)  # comma-separated tags
+    tags = models.ManyToManyField(Tag, blank=True, related_name='projects')  # Parsed from tech_stack
     image = models.ImageField(upload_to="projects/", blank=True, null=True)
+    # Which derivatives of the image exist and their real widths, saved once they're generated
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
     repo_url = models.URLField(blank=True)
     live_url = models.URLField(blank=True)
     featured = models.BooleanField(default=False)
@@ -104,13 +136,27 @@ class Project(Timestamped, OrderedModel):
     def display_image(self):
         if self.image and hasattr(self.image, 'name'):
             if str(self.image.name).startswith('http'):
-                return self.image.name
+                return remote_media.local_url(self.image.name)
             elif hasattr(self.image, 'url'):
                 return self.image.url
         return ""
 
+    @property
+    def display_srcset(self):
+        # WebP derivatives for <source srcset>; empty until they've been generated
+        return images.srcset(self.image, self.image_derivatives, 'webp')
+
+    @property
+    def display_srcset_fallback(self):
+        return images.srcset(self.image, self.image_derivatives, 'jpg')
+
     class Meta(OrderedModel.Meta):
         ordering = ["-featured", "-created_at"]
+        indexes = [
+            # Keyset pagination of the portfolio grid, overall and per category
+            models.Index(fields=['-featured', '-created_at', '-id'], name='project_grid_idx'),
+            models.Index(fields=['category', '-featured', '-created_at', '-id'], name='project_category_grid_idx'),
+        ]
 
 
 class Experience(OrderedModel):
@@ -162,6 +208,8 @@ class Service(OrderedModel):
     description = models.TextField(blank=True)
     icon_class = models.CharField(max_length=80, blank=True)  # e.g., "bi bi-code-slash"
     image = models.ImageField(upload_to='services/', blank=True, null=True)
+    # Which derivatives of the image exist and their real widths, saved once they're generated
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
     featured = models.BooleanField(default=False)
 
     def __str__(self):
@@ -172,12 +220,21 @@ class Service(OrderedModel):
         if self.image and hasattr(self.image, 'name'):
             # Check if the raw value is a full URL
             if str(self.image.name).startswith('http'):
-                return self.image.name
+                return remote_media.local_url(self.image.name)
             # Otherwise, it's a file path, so use the .url property
             elif hasattr(self.image, 'url'):
                 return self.image.url
         return ""
 
+    @property
+    def display_srcset(self):
+        # WebP derivatives for <source srcset>; empty until they've been generated
+        return images.srcset(self.image, self.image_derivatives, 'webp')
+
+    @property
+    def display_srcset_fallback(self):
+        return images.srcset(self.image, self.image_derivatives, 'jpg')
+
     class Meta(OrderedModel.Meta):
         pass
 
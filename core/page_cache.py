@@ -0,0 +1,102 @@
+import re
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.urls import reverse
+
+PAGE_KEY = 'core:page:{path}'
+
+# Pages are purged explicitly when their content changes; the timeout only reclaims unused ones.
+PAGE_TIMEOUT = 60 * 60 * 24 * 7
+
+# Rendered CSRF tokens are swapped for this marker before caching, and a fresh
+# token for the current visitor is put back in when the page is served.
+CSRF_PLACEHOLDER = '__CSRF_TOKEN__'
+CSRF_INPUT = re.compile(r'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+
+# Set in the WSGI environ of the requests export_static_site renders. Only headers
+# reach the environ from a browser (as HTTP_*), so visitors can't set it.
+STATIC_EXPORT_ENVIRON = 'core.static_export'
+
+
+def page_key(path):
+    return PAGE_KEY.format(path=path)
+
+
+def is_static_export(request):
+    return bool(request.META.get(STATIC_EXPORT_ENVIRON))
+
+
+def is_cacheable_request(request):
+    # Anyone with a session (i.e. logged into the admin) gets a freshly rendered page,
+    # and exported pages differ from the served ones so they're kept out of the cache
+    return (
+        request.method in ('GET', 'HEAD')
+        and not request.GET
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+        and not is_static_export(request)
+    )
+
+
+def cache_page_for_visitors(view_func):
+    """
+    Caches the rendered HTML of a view for anonymous visitors, keyed by path.
+
+    Cached pages are removed by `purge_paths` when the content they show changes,
+    rather than expiring. A page whose render overlapped a content change isn't
+    kept, since the purge may have run before it was stored. Any CSRF token in
+    the page is replaced per request, so the contact form keeps working on a
+    cached page.
+    """
+    # content imports this module for the page paths
+    from .content import get_content_version
+
+    @wraps(view_func)
+    def wrapped_view(request, *args, **kwargs):
+        if not is_cacheable_request(request):
+            return view_func(request, *args, **kwargs)
+
+        key = page_key(request.path)
+        cached = cache.get(key)
+        if cached is not None:
+            page = cached['content'].replace(CSRF_PLACEHOLDER, get_token(request))
+            response = HttpResponse(page, content_type=cached['content_type'])
+            response['X-Page-Cache'] = 'hit'
+            return response
+
+        version = get_content_version()
+        response = view_func(request, *args, **kwargs)
+        if hasattr(response, 'render') and callable(response.render):
+            response = response.render()
+        if response.status_code == 200 and not response.streaming:
+            page = CSRF_INPUT.sub(
+                rf'\g<1>{CSRF_PLACEHOLDER}\g<2>', response.content.decode(response.charset)
+            )
+            cache.set(key, {'content': page, 'content_type': response['Content-Type']}, PAGE_TIMEOUT)
+            # Changes bump the content version before purging, so a new version now
+            # means a purge may have run while the page rendered, before it was stored
+            if get_content_version() != version:
+                cache.delete(key)
+            response['X-Page-Cache'] = 'miss'
+        return response
+
+    return wrapped_view
+
+
+def purge_paths(paths):
+    cache.delete_many([page_key(path) for path in paths])
+
+
+def homepage_path():
+    return reverse('homepage')
+
+
+def project_path(slug):
+    return reverse('project_detail', kwargs={'slug': slug})
+
+
+def service_path(slug):
+    return reverse('service_detail', kwargs={'slug': slug})
@@ -0,0 +1,83 @@
+import base64
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+
+from .models import Project
+from .page_cache import project_path
+
+# The homepage grid order; the primary key breaks ties so every project has one position
+PROJECT_ORDERING = ('-featured', '-created_at', '-pk')
+
+
+def encode_cursor(project):
+    """
+    Returns an opaque cursor pointing just past the given project.
+    """
+    position = [project.featured, project.created_at.isoformat(), project.pk]
+    return base64.urlsafe_b64encode(json.dumps(position).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Returns the (featured, created_at, pk) position of a cursor. Raises ValueError if it's malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        featured, created_at, pk = json.loads(raw)
+        return bool(featured), datetime.fromisoformat(created_at), int(pk)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def project_queryset(category=None, tag=None):
+    queryset = Project.objects.select_related('category').prefetch_related('tags').order_by(*PROJECT_ORDERING)
+    if category:
+        queryset = queryset.filter(category__slug=category)
+    if tag:
+        # An indexed join through the project/tag table, instead of splitting tech_stack strings
+        queryset = queryset.filter(tags__slug=tag)
+    return queryset
+
+
+def project_page(category=None, cursor=None, page_size=None, tag=None):
+    """
+    Returns (projects, next_cursor) for one page of the grid, optionally limited to a category or tag slug.
+
+    Pages are found by seeking past the cursor's position rather than with an
+    OFFSET, so a deep page costs the same as the first one. next_cursor is None
+    on the last page.
+    """
+    page_size = page_size or settings.PORTFOLIO_PAGE_SIZE
+    queryset = project_queryset(category, tag)
+    if cursor:
+        featured, created_at, pk = decode_cursor(cursor)
+        # Everything after the cursor in (-featured, -created_at, -pk) order
+        queryset = queryset.filter(
+            Q(featured__lt=featured)
+            | Q(featured=featured, created_at__lt=created_at)
+            | Q(featured=featured, created_at=created_at, pk__lt=pk)
+        )
+
+    # One extra row tells us whether there's a next page
+    projects = list(queryset[:page_size + 1])
+    if len(projects) > page_size:
+        projects = projects[:page_size]
+        return projects, encode_cursor(projects[-1])
+    return projects, None
+
+
+def serialize_project(project):
+    return {
+        'title': project.title,
+        'slug': project.slug,
+        'url': project_path(project.slug),
+        'category': {'name': project.category.name, 'slug': project.category.slug} if project.category else None,
+        'tech_stack': project.tech_stack,
+        'tags': [{'name': tag.name, 'slug': tag.slug} for tag in project.tags.all()],
+        'featured': project.featured,
+        'image': project.display_image,
+        'srcset': project.display_srcset,
+    }
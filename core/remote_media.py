@@ -0,0 +1,275 @@
+import hashlib
+import mimetypes
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connections
+
+# Refreshing last-used on every page render would turn reads into writes, so it's throttled
+TOUCH_INTERVAL = 60 * 60
+
+# An unreachable URL is left alone this long before a render tries it again
+RETRY_INTERVAL = 15 * 60
+
+# File fields that may hold a remote URL instead of an upload, by model label
+REMOTE_FIELDS = {
+    'core.profile': ('headshot', 'resume_file'),
+    'core.project': ('image',),
+    'core.service': ('image',),
+}
+
+_mirror = None
+_mirror_lock = threading.Lock()
+
+# local_url results for one content version: (version, {url: (served url, when to look it up again)}).
+# Fetches and evictions start a new content version, which empties it.
+_resolved = (None, {})
+
+
+def is_remote(value):
+    return str(value).startswith(('http://', 'https://'))
+
+
+def _extension(url, content_type):
+    extension = mimetypes.guess_extension((content_type or '').split(';')[0].strip()) or ''
+    if not extension:
+        extension = os.path.splitext(urlsplit(url).path)[1].lower()
+    # mimetypes guesses .jpe / .jfif for some JPEG types
+    return '.jpg' if extension in ('.jpe', '.jfif', '.jpeg') else extension
+
+
+class RemoteMediaMirror:
+    """
+    Copies remote files (image and resume URLs stored in file fields) into MEDIA_ROOT.
+
+    Files are named by a hash of their content, so URLs serving the same bytes
+    share one copy. The url -> file index is a SQLite file, and the least recently
+    used mirrors are evicted once the files on disk grow past `max_bytes`.
+    """
+
+    def __init__(self, index_path, directory, max_bytes, max_file_bytes, timeout):
+        self.index_path = str(index_path)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._failed = {}
+        # on_fetched callbacks waiting for the fetches in flight to finish
+        self._on_fetched = set()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='remote-media')
+
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        self._conn = sqlite3.connect(self.index_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS mirrors ("
+            " url TEXT PRIMARY KEY,"
+            " name TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS mirrors_last_used ON mirrors (last_used)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS mirrors_name ON mirrors (name)")
+        self._conn.commit()
+
+    def path(self, name):
+        return os.path.join(settings.MEDIA_ROOT, name)
+
+    def lookup(self, url):
+        """
+        Returns the media name of the mirrored copy of url, or None if it isn't mirrored.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT name, last_used FROM mirrors WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                return None
+            name, last_used = row
+            if not os.path.exists(self.path(name)):
+                # Removed from disk behind our back
+                self._conn.execute("DELETE FROM mirrors WHERE url = ?", (url,))
+                self._conn.commit()
+                return None
+            now = time.time()
+            if now - last_used > TOUCH_INTERVAL:
+                self._conn.execute("UPDATE mirrors SET last_used = ? WHERE url = ?", (now, url))
+                self._conn.commit()
+        return name
+
+    def fetch(self, url):
+        """
+        Downloads url into the mirror and returns its media name.
+        """
+        directory = self.path(self.directory)
+        os.makedirs(directory, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+
+        with requests.get(url, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            content_type = response.headers.get('Content-Type')
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=64 * 1024):
+                        size += len(chunk)
+                        if size > self.max_file_bytes:
+                            raise ValueError(f"{url} is larger than {self.max_file_bytes} bytes")
+                        digest.update(chunk)
+                        f.write(chunk)
+                name = f"{self.directory}/{digest.hexdigest()[:32]}{_extension(url, content_type)}"
+                os.replace(tmp, self.path(name))
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO mirrors (url, name, size, last_used) VALUES (?, ?, ?, ?)",
+                (url, name, size, time.time()),
+            )
+            self._evict()
+            self._conn.commit()
+        return name
+
+    def _evict(self):
+        # Each file counts once, however many URLs point at it
+        (total,) = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM (SELECT MAX(size) AS size FROM mirrors GROUP BY name)"
+        ).fetchone()
+        rows = self._conn.execute("SELECT url, name, size FROM mirrors ORDER BY last_used ASC").fetchall()
+        for url, name, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM mirrors WHERE url = ?", (url,))
+            (shared,) = self._conn.execute("SELECT COUNT(*) FROM mirrors WHERE name = ?", (name,)).fetchone()
+            if not shared:
+                if os.path.exists(self.path(name)):
+                    os.remove(self.path(name))
+                total -= size
+
+    def schedule_fetch(self, url, on_fetched=None):
+        """
+        Mirrors url in a background thread, unless it's already being fetched or failed recently.
+
+        on_fetched is called once no fetches are left in flight, if this one
+        succeeded. Fetches started together (e.g. for every image on a page)
+        call it once between them, not once each.
+        """
+        with self._lock:
+            if url in self._pending or time.monotonic() - self._failed.get(url, -RETRY_INTERVAL) < RETRY_INTERVAL:
+                return
+            self._pending.add(url)
+
+        def run():
+            fetched = False
+            try:
+                self.fetch(url)
+                fetched = True
+            except Exception as e:
+                print(f"Error mirroring {url}: {e}")
+            with self._lock:
+                self._pending.discard(url)
+                if not fetched:
+                    self._failed[url] = time.monotonic()
+                elif on_fetched:
+                    self._on_fetched.add(on_fetched)
+                callbacks = []
+                if not self._pending:
+                    callbacks, self._on_fetched = list(self._on_fetched), set()
+            for callback in callbacks:
+                callback()
+
+        self._executor.submit(run)
+
+    def clear(self):
+        with self._lock:
+            for (name,) in self._conn.execute("SELECT DISTINCT name FROM mirrors").fetchall():
+                if os.path.exists(self.path(name)):
+                    os.remove(self.path(name))
+            self._conn.execute("DELETE FROM mirrors")
+            self._conn.commit()
+
+
+def get_remote_media():
+    """
+    Returns the process-wide mirror, opening its index on first use.
+    """
+    global _mirror
+    with _mirror_lock:
+        if _mirror is None:
+            _mirror = RemoteMediaMirror(
+                settings.REMOTE_MEDIA_INDEX_PATH,
+                settings.REMOTE_MEDIA_DIR,
+                settings.REMOTE_MEDIA_MAX_BYTES,
+                settings.REMOTE_MEDIA_MAX_FILE_BYTES,
+                settings.REMOTE_MEDIA_TIMEOUT,
+            )
+        return _mirror
+
+
+def close_remote_media():
+    """
+    Closes the process-wide mirror's index, e.g. before forking workers that
+    mustn't share its SQLite connection. The next use opens it again.
+    """
+    global _mirror
+    with _mirror_lock:
+        if _mirror is not None:
+            _mirror._conn.close()
+            _mirror = None
+
+
+def _refresh_pages():
+    # Imported here because the models use this module
+    from .content import refresh_all_pages
+    try:
+        refresh_all_pages()
+    finally:
+        # This runs on a mirror thread, which shouldn't keep a connection open
+        connections.close_all()
+
+
+def local_url(url):
+    """
+    Returns the URL to serve for a remote file: the local copy if it's mirrored,
+    otherwise the remote URL itself while a copy is fetched in the background.
+
+    Mirrored URLs are remembered for the current content version, so renders don't
+    query the index or the disk for them. They're looked up again after
+    TOUCH_INTERVAL to keep their last use current for eviction.
+    """
+    global _resolved
+    if not settings.REMOTE_MEDIA_ENABLED or not is_remote(url):
+        return url
+
+    # Imported here because the models use this module
+    from .content import get_content_version
+    version, resolved = _resolved
+    current_version = get_content_version()
+    if version != current_version:
+        resolved = {}
+        _resolved = (current_version, resolved)
+    now = time.monotonic()
+    remembered = resolved.get(url)
+    if remembered is not None and remembered[1] > now:
+        return remembered[0]
+
+    mirror = get_remote_media()
+    name = mirror.lookup(url)
+    if name is None:
+        mirror.schedule_fetch(url, on_fetched=_refresh_pages)
+        return url
+    served = default_storage.url(name)
+    resolved[url] = (served, now + TOUCH_INTERVAL)
+    return served
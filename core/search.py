@@ -0,0 +1,373 @@
+import html
+import re
+import threading
+from collections import namedtuple
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .page_cache import homepage_path, project_path, service_path
+
+# Rows are stored under rowid = code << ROWID_SHIFT | pk, so a hit maps straight back to its row
+ROWID_SHIFT = 40
+
+# Snippet highlight markers: private-use characters that can't clash with page text
+MARK_START, MARK_END = '\ue000', '\ue001'
+
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+# --- Indexed models ---
+# code: a fixed number for the model in the index (never reuse one)
+# document: returns (title, body) for a row
+# url: the public page showing the row
+# public: whether the row may appear in public search results
+
+SearchModel = namedtuple('SearchModel', 'code document url public related')
+
+
+def _join(*parts):
+    return ' '.join(str(part) for part in parts if part)
+
+
+SEARCH_MODELS = {
+    'core.project': SearchModel(
+        code=1,
+        document=lambda obj: (obj.title, _join(obj.category.name if obj.category else '', obj.tech_stack, obj.description)),
+        url=lambda obj: project_path(obj.slug),
+        public=True,
+        related='category',
+    ),
+    'core.service': SearchModel(
+        code=2,
+        document=lambda obj: (obj.title, _join(obj.short_description, obj.description)),
+        url=lambda obj: service_path(obj.slug),
+        public=True,
+        related=None,
+    ),
+    'core.experience': SearchModel(
+        code=3,
+        document=lambda obj: (f"{obj.role} at {obj.company}", _join(obj.location, obj.description)),
+        url=lambda obj: f"{homepage_path()}#resume",
+        public=True,
+        related=None,
+    ),
+    'core.certification': SearchModel(
+        code=4,
+        document=lambda obj: (obj.name, obj.issuer),
+        url=lambda obj: obj.url or f"{homepage_path()}#resume",
+        public=True,
+        related=None,
+    ),
+    'core.education': SearchModel(
+        code=5,
+        document=lambda obj: (f"{obj.program} - {obj.school}", obj.description),
+        url=lambda obj: f"{homepage_path()}#resume",
+        public=True,
+        related=None,
+    ),
+    'core.award': SearchModel(
+        code=6,
+        document=lambda obj: (obj.title, _join(obj.issuer, obj.year, obj.description)),
+        url=lambda obj: f"{homepage_path()}#resume",
+        public=True,
+        related=None,
+    ),
+    # Only searched from the admin
+    'core.contactmessage': SearchModel(
+        code=7,
+        document=lambda obj: (obj.subject, _join(obj.name, obj.email, obj.message)),
+        url=lambda obj: None,
+        public=False,
+        related=None,
+    ),
+}
+
+LABEL_BY_CODE = {model.code: label for label, model in SEARCH_MODELS.items()}
+
+
+def make_rowid(label, pk):
+    return SEARCH_MODELS[label].code << ROWID_SHIFT | pk
+
+
+def split_rowid(rowid):
+    return LABEL_BY_CODE[rowid >> ROWID_SHIFT], rowid & ((1 << ROWID_SHIFT) - 1)
+
+
+def model_queryset(label):
+    queryset = apps.get_model(label).objects.all()
+    if SEARCH_MODELS[label].related:
+        queryset = queryset.select_related(SEARCH_MODELS[label].related)
+    return queryset
+
+
+# --- Backends ---
+
+class SearchBackend:
+    """
+    The interface a search backend implements. `search` returns (label, pk, score)
+    tuples, best first, and `snippets` maps those keys to highlighted excerpts.
+    """
+
+    def index(self, instances):
+        raise NotImplementedError
+
+    def remove(self, label, pks):
+        raise NotImplementedError
+
+    def rebuild(self):
+        raise NotImplementedError
+
+    def search(self, query, labels=None, limit=20):
+        raise NotImplementedError
+
+    def snippets(self, query, hits):
+        return {}
+
+    def matching(self, label, query):
+        """
+        Returns a Q filtering a model's rows to those matching the query.
+        """
+        return Q(pk__in=[pk for _, pk, _ in self.search(query, labels=[label], limit=None)])
+
+
+class SqliteFTS5Backend(SearchBackend):
+    """
+    Full-text search in an FTS5 table inside the site's SQLite database.
+
+    Living in the same database means an index update commits or rolls back with
+    the row it describes. Titles weigh more than body text in the bm25 ranking,
+    and the porter tokenizer matches word forms ("deploy" finds "deployed").
+    The table is created by migration 0008_search_index.
+    """
+    table = 'core_search_index'
+    title_weight = 10.0
+    body_weight = 1.0
+
+    def __init__(self):
+        if connection.vendor != 'sqlite':
+            raise ImproperlyConfigured('SqliteFTS5Backend needs the SQLite database backend.')
+
+    def index(self, instances):
+        rows = []
+        for instance in instances:
+            label = instance._meta.label_lower
+            title, body = SEARCH_MODELS[label].document(instance)
+            rows.append((make_rowid(label, instance.pk), title or '', body or ''))
+        if rows:
+            # One transaction, or SQLite commits after every row outside of one
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(f"DELETE FROM {self.table} WHERE rowid = %s", [(row[0],) for row in rows])
+                cursor.executemany(f"INSERT INTO {self.table} (rowid, title, body) VALUES (%s, %s, %s)", rows)
+
+    def remove(self, label, pks):
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {self.table} WHERE rowid = %s", [(make_rowid(label, pk),) for pk in pks])
+
+    def rebuild(self):
+        if self.table not in connection.introspection.table_names():
+            # Migrated back past 0008_search_index, so there's no index to fill
+            return
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {self.table}")
+            for label in SEARCH_MODELS:
+                self.index(model_queryset(label).iterator(chunk_size=2000))
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {self.table} ({self.table}) VALUES ('optimize')")
+
+    @staticmethod
+    def match_expression(query):
+        """
+        Turns free text into an FTS5 query: every word must match, the last one as a prefix.
+        """
+        tokens = TOKEN_PATTERN.findall(query.lower())[:16]
+        if not tokens:
+            return None
+        terms = [f'"{token}"' for token in tokens]
+        terms[-1] += '*'
+        return ' '.join(terms)
+
+    def _rowid_ranges(self, labels):
+        ranges = []
+        for label in labels:
+            code = SEARCH_MODELS[label].code
+            ranges.append((code << ROWID_SHIFT, (code + 1) << ROWID_SHIFT))
+        return ranges
+
+    def search(self, query, labels=None, limit=20):
+        expression = self.match_expression(query)
+        if expression is None:
+            return []
+
+        sql = f"SELECT rowid, bm25({self.table}, %s, %s) AS rank FROM {self.table} WHERE {self.table} MATCH %s"
+        params = [self.title_weight, self.body_weight, expression]
+        if labels is not None:
+            # Each model owns a contiguous rowid range, so this stays a rowid lookup
+            ranges = self._rowid_ranges(labels)
+            sql += ' AND (' + ' OR '.join('(rowid >= %s AND rowid < %s)' for _ in ranges) + ')'
+            params += [bound for pair in ranges for bound in pair]
+        sql += ' ORDER BY rank'
+        if limit is not None:
+            sql += ' LIMIT %s'
+            params.append(limit)
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            # bm25 is negative, lower is better; flip it so higher scores rank first
+            return [(*split_rowid(rowid), -rank) for rowid, rank in cursor.fetchall()]
+
+    def matching(self, label, query):
+        expression = self.match_expression(query)
+        if expression is None:
+            return Q(pk__in=[])
+        (start, end), = self._rowid_ranges([label])
+        # A subquery, so the database joins the matches instead of taking them back as a list of keys
+        return Q(pk__in=RawSQL(
+            f"SELECT rowid - %s FROM {self.table} WHERE {self.table} MATCH %s AND rowid >= %s AND rowid < %s",
+            (start, expression, start, end),
+        ))
+
+    def snippets(self, query, hits):
+        expression = self.match_expression(query)
+        if expression is None or not hits:
+            return {}
+        rowids = [make_rowid(label, pk) for label, pk, _ in hits]
+        placeholders = ', '.join(['%s'] * len(rowids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, snippet({self.table}, -1, %s, %s, '…', 16) FROM {self.table}"
+                f" WHERE {self.table} MATCH %s AND rowid IN ({placeholders})",
+                [MARK_START, MARK_END, expression, *rowids],
+            )
+            return {split_rowid(rowid): snippet for rowid, snippet in cursor.fetchall()}
+
+
+class DatabaseBackend(SearchBackend):
+    """
+    A fallback for databases without FTS5: case-insensitive LIKE matches on the
+    indexed fields, with title matches ranked first. Nothing needs maintaining.
+    """
+    fields = {
+        'core.project': (('title',), ('tech_stack', 'description', 'category__name')),
+        'core.service': (('title',), ('short_description', 'description')),
+        'core.experience': (('role', 'company'), ('location', 'description')),
+        'core.certification': (('name',), ('issuer',)),
+        'core.education': (('program', 'school'), ('description',)),
+        'core.award': (('title',), ('issuer', 'year', 'description')),
+        'core.contactmessage': (('subject',), ('name', 'email', 'message')),
+    }
+
+    def index(self, instances):
+        pass
+
+    def remove(self, label, pks):
+        pass
+
+    def rebuild(self):
+        pass
+
+    @staticmethod
+    def _all_tokens_in(fields, tokens):
+        matches = Q()
+        for token in tokens:
+            matches &= Q(*[Q(**{f'{field}__icontains': token}) for field in fields], _connector=Q.OR)
+        return matches
+
+    def search(self, query, labels=None, limit=20):
+        tokens = TOKEN_PATTERN.findall(query.lower())[:16]
+        if not tokens:
+            return []
+        hits = []
+        for label in labels or SEARCH_MODELS:
+            title_fields, body_fields = self.fields[label]
+            queryset = apps.get_model(label).objects.filter(self._all_tokens_in(title_fields + body_fields, tokens))
+            title_pks = set(queryset.filter(self._all_tokens_in(title_fields, tokens)).values_list('pk', flat=True))
+            hits += [(label, pk, 2.0 if pk in title_pks else 1.0) for pk in queryset.values_list('pk', flat=True)]
+        hits.sort(key=lambda hit: -hit[2])
+        return hits[:limit] if limit is not None else hits
+
+    def matching(self, label, query):
+        tokens = TOKEN_PATTERN.findall(query.lower())[:16]
+        if not tokens:
+            return Q(pk__in=[])
+        title_fields, body_fields = self.fields[label]
+        return self._all_tokens_in(title_fields + body_fields, tokens)
+
+
+def get_search_backend():
+    """
+    Returns the backend named by SEARCH_BACKEND, created on first use.
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = import_string(settings.SEARCH_BACKEND)()
+        return _backend
+
+
+# --- Queries ---
+
+def highlight(snippet):
+    """
+    Escapes a snippet for HTML and turns its match markers into <mark> tags.
+    """
+    return html.escape(snippet).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+def public_types():
+    return [label.split('.')[1] for label, model in SEARCH_MODELS.items() if model.public]
+
+
+def search_site(query, types=None, limit=20):
+    """
+    Returns ranked public search results as dicts of type, title, url, snippet and score,
+    optionally limited to some result types (e.g. ['project', 'service']).
+    """
+    backend = get_search_backend()
+    labels = [
+        label for label, model in SEARCH_MODELS.items()
+        if model.public and (not types or label.split('.')[1] in types)
+    ]
+    hits = backend.search(query, labels=labels, limit=limit)
+    snippets = backend.snippets(query, hits)
+
+    # One query per model for the rows behind the hits
+    pks_by_label = {}
+    for label, pk, _ in hits:
+        pks_by_label.setdefault(label, []).append(pk)
+    rows = {}
+    for label, pks in pks_by_label.items():
+        for obj in model_queryset(label).filter(pk__in=pks):
+            rows[(label, obj.pk)] = obj
+
+    results = []
+    for label, pk, score in hits:
+        obj = rows.get((label, pk))
+        if obj is None:
+            continue
+        title, body = SEARCH_MODELS[label].document(obj)
+        snippet = snippets.get((label, pk))
+        results.append({
+            'type': label.split('.')[1],
+            'title': title,
+            'url': SEARCH_MODELS[label].url(obj),
+            'snippet': highlight(snippet) if snippet else html.escape((body or '')[:160]),
+            'score': round(score, 4),
+        })
+    return results
+
+
+def matching(model, query):
+    """
+    Returns a Q filtering a model's rows to those matching the query, for the admin search.
+    """
+    return get_search_backend().matching(model._meta.label_lower, query)
@@ -0,0 +1,141 @@
+from django.apps import apps
+from django.db import transaction
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_delete, pre_save
+from . import page_cache
+from .content import bump_content_version, refresh_all_pages
+from .images import schedule_derivatives
+from .models import Profile, Project, ProjectCategory, Service
+from .search import SEARCH_MODELS, get_search_backend
+from .tags import sync_project_tags, update_tag_counts
+
+# Contact messages are never shown on the site, so they don't change its content
+EXCLUDED_MODELS = ('contactmessage',)
+
+# Models with their own detail page, mapped to the function giving its path
+DETAIL_PAGES = {
+    Project: page_cache.project_path,
+    Service: page_cache.service_path,
+}
+
+# Image fields that get responsive derivatives, by model
+IMAGE_FIELDS = {
+    Profile: 'headshot',
+    Project: 'image',
+    Service: 'image',
+}
+
+
+def _purge_on_commit(paths):
+    paths = set(paths)
+    transaction.on_commit(lambda: page_cache.purge_paths(paths))
+
+
+def content_changed(sender, instance, **kwargs):
+    transaction.on_commit(bump_content_version)
+
+    # Every model on the site appears on the homepage
+    paths = [page_cache.homepage_path()]
+    if sender in DETAIL_PAGES:
+        paths.append(DETAIL_PAGES[sender](instance.slug))
+        old_slug = getattr(instance, '_page_cache_old_slug', None)
+        if old_slug and old_slug != instance.slug:
+            paths.append(DETAIL_PAGES[sender](old_slug))
+    elif sender is ProjectCategory:
+        # Project pages show their category's name
+        slugs = getattr(instance, '_page_cache_project_slugs', None)
+        if slugs is None:
+            slugs = instance.projects.values_list('slug', flat=True)
+        paths.extend(page_cache.project_path(slug) for slug in slugs)
+    _purge_on_commit(paths)
+
+
+def image_saved(sender, instance, **kwargs):
+    # Pages rendered before the derivatives existed have no srcset, so drop them once they do
+    paths = [page_cache.homepage_path()]
+    if sender in DETAIL_PAGES:
+        paths.append(DETAIL_PAGES[sender](instance.slug))
+
+    def derivatives_generated():
+        bump_content_version()
+        page_cache.purge_paths(paths)
+
+    schedule_derivatives(instance, IMAGE_FIELDS[sender], on_generated=derivatives_generated)
+
+
+def project_saved(sender, instance, raw=False, **kwargs):
+    # Fixtures load the tag relations themselves
+    if not raw:
+        sync_project_tags([instance])
+
+
+def remember_project_tags(sender, instance, **kwargs):
+    # The project's tag relations are deleted with it, before post_delete
+    instance._tag_ids = list(instance.tags.values_list('pk', flat=True))
+
+
+def project_deleted(sender, instance, **kwargs):
+    update_tag_counts(getattr(instance, '_tag_ids', ()))
+
+
+def search_indexed(sender, instance, **kwargs):
+    # The index lives in the same database, so it commits or rolls back with the row
+    get_search_backend().index([instance])
+
+
+def search_removed(sender, instance, **kwargs):
+    get_search_backend().remove(sender._meta.label_lower, [instance.pk])
+
+
+def category_search_indexed(sender, instance, **kwargs):
+    # Project documents include their category's name
+    pks = getattr(instance, '_search_project_pks', None)
+    if pks is None:
+        pks = instance.projects.values_list('pk', flat=True)
+    get_search_backend().index(Project.objects.select_related('category').filter(pk__in=list(pks)))
+
+
+def core_migrated(sender, **kwargs):
+    # Migrations can change what any page shows without sending model signals
+    refresh_all_pages()
+    get_search_backend().rebuild()
+
+
+def remember_old_slug(sender, instance, **kwargs):
+    # A renamed slug leaves the page at the old path to be purged too
+    if instance.pk:
+        instance._page_cache_old_slug = (
+            sender.objects.filter(pk=instance.pk).values_list('slug', flat=True).first()
+        )
+
+
+def remember_category_projects(sender, instance, **kwargs):
+    # Deleting a category nulls its projects' foreign key without sending signals for them
+    instance._page_cache_project_slugs = list(instance.projects.values_list('slug', flat=True))
+    instance._search_project_pks = list(instance.projects.values_list('pk', flat=True))
+
+
+def connect_signals():
+    for model in apps.get_app_config('core').get_models():
+        if model._meta.model_name in EXCLUDED_MODELS:
+            continue
+        label = model._meta.label_lower
+        post_save.connect(content_changed, sender=model, dispatch_uid=f'core-save-{label}')
+        post_delete.connect(content_changed, sender=model, dispatch_uid=f'core-delete-{label}')
+
+    for model in DETAIL_PAGES:
+        pre_save.connect(remember_old_slug, sender=model, dispatch_uid=f'core-old-slug-{model._meta.label_lower}')
+    post_save.connect(project_saved, sender=Project, dispatch_uid='core-project-tags')
+    pre_delete.connect(remember_project_tags, sender=Project, dispatch_uid='core-project-tags-deleted')
+    post_delete.connect(project_deleted, sender=Project, dispatch_uid='core-project-tag-counts')
+
+    for model in IMAGE_FIELDS:
+        post_save.connect(image_saved, sender=model, dispatch_uid=f'core-images-{model._meta.label_lower}')
+    for label in SEARCH_MODELS:
+        model = apps.get_model(label)
+        post_save.connect(search_indexed, sender=model, dispatch_uid=f'core-search-save-{label}')
+        post_delete.connect(search_removed, sender=model, dispatch_uid=f'core-search-delete-{label}')
+    post_save.connect(category_search_indexed, sender=ProjectCategory, dispatch_uid='core-search-category-save')
+    post_delete.connect(category_search_indexed, sender=ProjectCategory, dispatch_uid='core-search-category-delete')
+
+    post_migrate.connect(core_migrated, sender=apps.get_app_config('core'), dispatch_uid='core-migrated')
+    pre_delete.connect(remember_category_projects, sender=ProjectCategory, dispatch_uid='core-category-projects')
@@ -0,0 +1,103 @@
+import mimetypes
+import os
+import threading
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from .storage import ENCODINGS, CompressedManifestStaticFilesStorage
+
+# Hashed names change whenever their content does, so they can be cached for good
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+_compressed_manifest = {'mtime': None, 'files': {}}
+_manifest_lock = threading.Lock()
+
+
+def get_compressed_files():
+    """
+    Returns {hashed name: [encodings]} from the collectstatic manifest, re-read when the file changes.
+    """
+    if not isinstance(staticfiles_storage, CompressedManifestStaticFilesStorage):
+        return {}
+    try:
+        mtime = os.stat(staticfiles_storage.path(staticfiles_storage.compressed_manifest_name)).st_mtime_ns
+    except OSError:
+        return {}
+
+    with _manifest_lock:
+        if _compressed_manifest['mtime'] != mtime:
+            _compressed_manifest['files'] = staticfiles_storage.read_compressed_manifest()
+            _compressed_manifest['mtime'] = mtime
+        return _compressed_manifest['files']
+
+
+def accepted_encodings(request):
+    """
+    Returns the content codings the client accepts, ignoring any with q=0.
+    """
+    accepted = set()
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        coding, _, params = part.strip().partition(';')
+        q = params.strip()
+        if q.startswith('q='):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def serve_static(request, path):
+    """
+    Serves a collected static file, picking its brotli or gzip variant when the client accepts one.
+
+    Content-hashed files get far-future cache headers; anything else (such as a
+    file requested by its original name) is cached for STATIC_MAX_AGE. Responses
+    carry an ETag and Last-Modified from the served file, so a revalidating client
+    gets a 304.
+    """
+    try:
+        fullpath = safe_join(settings.STATIC_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('File not found')
+    if not os.path.isfile(fullpath):
+        raise Http404('File not found')
+
+    encodings = get_compressed_files().get(path)
+    content_type = mimetypes.guess_type(fullpath)[0] or 'application/octet-stream'
+    served, content_encoding = fullpath, None
+    if encodings:
+        accepted = accepted_encodings(request)
+        for encoding in ENCODINGS:
+            if encoding in encodings and encoding in accepted:
+                served, content_encoding = fullpath + ENCODINGS[encoding][0], encoding
+                break
+
+    # Each variant is its own representation, so the encoding is part of its ETag
+    stat = os.stat(served)
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}{"-" + content_encoding if content_encoding else ""}"'
+    last_modified = int(stat.st_mtime)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = FileResponse(open(served, 'rb'), content_type=content_type, filename=os.path.basename(fullpath))
+        if content_encoding:
+            response['Content-Encoding'] = content_encoding
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    if encodings:
+        patch_vary_headers(response, ['Accept-Encoding'])
+    if encodings is not None:
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    else:
+        response['Cache-Control'] = f'public, max-age={settings.STATIC_MAX_AGE}'
+    return response
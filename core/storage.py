@@ -0,0 +1,103 @@
+import gzip
+import json
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; without it only gzip variants are built
+    brotli = None
+
+# Text formats worth compressing; images and fonts are already compressed
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.cjs', '.mjs', '.map', '.svg', '.json', '.txt', '.html', '.xml', '.ico')
+
+# Below this size the encoding overhead outweighs the savings
+MIN_COMPRESS_SIZE = 256
+
+
+def _gzip(data):
+    # A fixed mtime keeps the output identical across runs
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _brotli(data):
+    return brotli.compress(data, quality=11)
+
+
+# Content-Encoding -> (file suffix, compressor), in order of preference
+ENCODINGS = {'br': ('.br', _brotli), 'gzip': ('.gz', _gzip)}
+
+
+def available_encodings():
+    return [encoding for encoding in ENCODINGS if encoding != 'br' or brotli is not None]
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Content-hashed static files with gzip and brotli variants built at collectstatic time.
+
+    The variants of each hashed file are listed in a second manifest. A hashed
+    name only ever holds one content, so a file already listed there with its
+    variants on disk is skipped on the next run instead of being compressed again.
+    """
+    compressed_manifest_name = 'staticfiles.compressed.json'
+    compressed_manifest_version = '1'
+
+    def post_process(self, *args, **kwargs):
+        yield from super().post_process(*args, **kwargs)
+        if kwargs.get('dry_run'):
+            return
+
+        previous = self.read_compressed_manifest()
+        compressed = {}
+        for hashed_name in sorted(set(self.hashed_files.values())):
+            encodings = previous.get(hashed_name)
+            if encodings is None or not all(self.exists(self.variant_name(hashed_name, e)) for e in encodings):
+                encodings = self.compress(hashed_name)
+            compressed[hashed_name] = encodings
+        self.save_compressed_manifest(compressed)
+
+    def compress(self, name):
+        """
+        Writes the compressed variants of a file that are smaller than it. Returns their encodings.
+        """
+        if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+            return []
+        with self.open(name) as f:
+            data = f.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return []
+
+        encodings = []
+        for encoding in available_encodings():
+            suffix, compressor = ENCODINGS[encoding]
+            variant = compressor(data)
+            if len(variant) < len(data):
+                variant_name = self.variant_name(name, encoding)
+                if self.exists(variant_name):
+                    self.delete(variant_name)
+                self._save(variant_name, ContentFile(variant))
+                encodings.append(encoding)
+        return encodings
+
+    @staticmethod
+    def variant_name(name, encoding):
+        return name + ENCODINGS[encoding][0]
+
+    def read_compressed_manifest(self):
+        try:
+            with self.manifest_storage.open(self.compressed_manifest_name) as manifest:
+                stored = json.loads(manifest.read().decode())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        # Installing brotli later means every file needs its new variant
+        if stored.get('version') != self.compressed_manifest_version or stored.get('encodings') != available_encodings():
+            return {}
+        return stored.get('files', {})
+
+    def save_compressed_manifest(self, files):
+        payload = {'files': files, 'encodings': available_encodings(), 'version': self.compressed_manifest_version}
+        if self.manifest_storage.exists(self.compressed_manifest_name):
+            self.manifest_storage.delete(self.compressed_manifest_name)
+        self.manifest_storage._save(self.compressed_manifest_name, ContentFile(json.dumps(payload).encode()))
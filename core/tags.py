@@ -0,0 +1,68 @@
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.text import slugify
+
+from .models import Project, Tag
+
+
+def split_tags(tech_stack):
+    """
+    Returns the (name, slug) pairs in a comma-separated tech stack, without duplicates.
+    """
+    tags = {}
+    for name in (tech_stack or '').split(','):
+        name = ' '.join(name.split())[:60]
+        slug = slugify(name)[:60]
+        if slug and slug not in tags:
+            tags[slug] = name
+    return [(name, slug) for slug, name in tags.items()]
+
+
+def sync_project_tags(projects):
+    """
+    Makes each project's tags match its tech_stack, creating any new tags, then
+    refreshes the counts of the tags that were added or removed.
+
+    Works in a fixed number of queries however many projects are passed, so it
+    suits both a single admin save and a bulk import.
+    """
+    wanted = {project.pk: split_tags(project.tech_stack) for project in projects}
+    names = {}
+    for tags in wanted.values():
+        for name, slug in tags:
+            names.setdefault(slug, name)
+
+    Tag.objects.bulk_create([Tag(name=name, slug=slug) for slug, name in names.items()], ignore_conflicts=True)
+    tag_ids = dict(Tag.objects.filter(slug__in=names).values_list('slug', 'id'))
+    wanted_pairs = {(pk, tag_ids[slug]) for pk, tags in wanted.items() for _, slug in tags}
+
+    through = Project.tags.through
+    existing = {
+        (project_id, tag_id): row_id
+        for row_id, project_id, tag_id in through.objects.filter(project_id__in=wanted)
+        .values_list('id', 'project_id', 'tag_id')
+    }
+    removed = set(existing) - wanted_pairs
+    added = wanted_pairs - set(existing)
+
+    if removed:
+        through.objects.filter(id__in=[existing[pair] for pair in removed]).delete()
+    through.objects.bulk_create([
+        through(project_id=project_id, tag_id=tag_id) for project_id, tag_id in added
+    ], batch_size=1000)
+    update_tag_counts({tag_id for _, tag_id in removed | added})
+
+
+def update_tag_counts(tag_ids):
+    """
+    Recomputes the given tags' project_count in one UPDATE and drops those no project uses.
+    """
+    if not tag_ids:
+        return
+    counts = (
+        Project.tags.through.objects.filter(tag_id=OuterRef('pk'))
+        .order_by().values('tag_id').annotate(count=Count('*')).values('count')
+    )
+    tags = Tag.objects.filter(pk__in=list(tag_ids))
+    tags.update(project_count=Coalesce(Subquery(counts), 0))
+    tags.filter(project_count=0).delete()
@@ -1,3 +1,638 @@
-from django.test import TestCase
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+from PIL import Image
+
+from chatbot import metrics as chatbot_metrics
+
+from . import contact_spool, images, page_cache, remote_media, search
+from .content import bump_content_version, get_content_version
+from .management.commands import export_static_site
+from .models import ContactMessage, Project, Tag
+from .page_cache import CSRF_INPUT, page_key, project_path
+
+# Rendered pages are cached; keep them out of the site's file-based cache
+LOCMEM_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': alias}
+    for alias in ('default', 'content_version')
+}
+
+
+class StaticServeTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        tmp = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(tmp.cleanup)
+        source = os.path.join(tmp.name, 'source')
+        os.makedirs(source)
+        with open(os.path.join(source, 'site.css'), 'w') as f:
+            f.write('body { margin: 0; }\n' * 50)
+
+        # Only this directory is collected, not the admin's files
+        settings_override = override_settings(
+            STATICFILES_DIRS=[source],
+            STATIC_ROOT=os.path.join(tmp.name, 'collected'),
+            STATICFILES_STORAGE='core.storage.CompressedManifestStaticFilesStorage',
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+        )
+        settings_override.enable()
+        cls.addClassCleanup(settings_override.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+        with open(os.path.join(tmp.name, 'collected', 'staticfiles.json')) as f:
+            cls.hashed_name = json.load(f)['paths']['site.css']
+
+    def test_hashed_file_served_compressed_and_immutable(self):
+        response = self.client.get(f'/static/{self.hashed_name}', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertTrue(response['ETag'].endswith('-gzip"'))
+        self.assertIn('Last-Modified', response)
+
+    def test_revalidation_returns_not_modified(self):
+        response = self.client.get(f'/static/{self.hashed_name}')
+        self.assertNotIn('Content-Encoding', response)
+
+        revalidated = self.client.get(f'/static/{self.hashed_name}', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated['ETag'], response['ETag'])
+
+        revalidated = self.client.get(f'/static/{self.hashed_name}', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_unhashed_name_gets_short_cache(self):
+        response = self.client.get('/static/site.css')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('immutable', response['Cache-Control'])
+
+    def test_missing_file(self):
+        self.assertEqual(self.client.get('/static/missing.css').status_code, 404)
+        self.assertEqual(self.client.get('/static/../settings.py').status_code, 404)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class DefaultStaticStorageTests(TestCase):
+    def test_pages_render_without_collectstatic(self):
+        # The test runner turns DEBUG off, which a manifest storage can't render without its manifest
+        self.assertEqual(self.client.get('/').status_code, 200)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, IMAGE_DERIVATIVE_WIDTHS=[320, 640, 1280])
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        os.makedirs(os.path.join(self.media_root, 'projects'))
+        self.path = os.path.join(self.media_root, 'projects', 'app.png')
+        Image.new('RGB', (1260, 630), (30, 120, 200)).save(self.path)
+
+    def test_generated_widths_never_upscale(self):
+        written, widths = images.generate_derivatives(self.path, [320, 640, 1280])
+        self.assertEqual(written, 6)
+        self.assertEqual(widths, [[320, 320], [640, 640], [1280, 1260]])
+        with Image.open(images.derivative_name(self.path, 1280, 'webp')) as derivative:
+            self.assertEqual(derivative.width, 1260)
+
+        # A second run finds every file and writes nothing, but still reports the widths
+        self.assertEqual(images.generate_derivatives(self.path, [320, 640, 1280]), (0, widths))
+
+    def test_srcset_uses_recorded_widths_without_filesystem_access(self):
+        project = Project.objects.create(title='App', slug='app', image='projects/app.png')
+        self.assertEqual(project.display_srcset, '')
+
+        _, widths = images.generate_derivatives(self.path, [320, 640, 1280])
+        self.assertTrue(images.record_derivatives(project, 'image', 'projects/app.png', widths))
+        self.assertFalse(images.record_derivatives(project, 'image', 'projects/app.png', widths))
+
+        project = Project.objects.get(pk=project.pk)
+        with mock.patch('os.path.exists', side_effect=AssertionError), \
+                mock.patch('os.stat', side_effect=AssertionError):
+            srcset = project.display_srcset
+            fallback = project.display_srcset_fallback
+        self.assertEqual(srcset, '/media/projects/app.w320.webp 320w, /media/projects/app.w640.webp 640w, '
+                                 '/media/projects/app.w1280.webp 1260w')
+        self.assertTrue(fallback.endswith('/media/projects/app.w1280.jpg 1260w'))
+
+    def test_record_of_replaced_image_is_ignored(self):
+        project = Project.objects.create(title='App', slug='app', image='projects/app.png')
+        images.record_derivatives(project, 'image', 'projects/app.png', [[320, 320]])
+        Project.objects.filter(pk=project.pk).update(image='projects/new.png')
+
+        project = Project.objects.get(pk=project.pk)
+        self.assertEqual(project.display_srcset, '')
+        # A late worker for the old upload doesn't overwrite anything
+        self.assertFalse(images.record_derivatives(project, 'image', 'projects/old.png', [[320, 320]]))
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Serves `server.files` ({path: bytes}) and counts the requests for each path."""
+
+    def do_GET(self):
+        self.server.requests[self.path] = self.server.requests.get(self.path, 0) + 1
+        body = self.server.files.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RemoteMediaTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, REMOTE_MEDIA_ENABLED=True)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        # An offline stand-in for the remote image host
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+        self.server.files = {
+            '/a.png': b'a' * 100,
+            '/same-as-a.png': b'a' * 100,
+            '/b.png': b'b' * 100,
+            '/c.png': b'c' * 100,
+        }
+        self.server.requests = {}
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def url(self, path):
+        return f'http://127.0.0.1:{self.server.server_address[1]}{path}'
+
+    def make_mirror(self, max_bytes=10_000):
+        mirror = remote_media.RemoteMediaMirror(
+            os.path.join(self.media_root, 'index.sqlite3'), 'remote', max_bytes, 1000, 5
+        )
+        self.addCleanup(mirror._conn.close)
+        return mirror
+
+    def test_fetches_once_and_shares_identical_content(self):
+        mirror = self.make_mirror()
+        name = mirror.fetch(self.url('/a.png'))
+        self.assertTrue(name.startswith('remote/') and name.endswith('.png'))
+        self.assertEqual(mirror.fetch(self.url('/same-as-a.png')), name)
+        self.assertEqual(mirror.lookup(self.url('/a.png')), name)
+        self.assertEqual(self.server.requests, {'/a.png': 1, '/same-as-a.png': 1})
+
+        # Still served once the remote host is gone
+        self.server.shutdown()
+        self.assertEqual(mirror.lookup(self.url('/a.png')), name)
+        with open(os.path.join(self.media_root, name), 'rb') as f:
+            self.assertEqual(f.read(), b'a' * 100)
+
+    def test_least_recently_used_file_evicted(self):
+        mirror = self.make_mirror(max_bytes=250)
+        oldest = mirror.fetch(self.url('/a.png'))
+        mirror.fetch(self.url('/b.png'))
+        mirror.fetch(self.url('/c.png'))
+
+        self.assertIsNone(mirror.lookup(self.url('/a.png')))
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, oldest)))
+        self.assertIsNotNone(mirror.lookup(self.url('/c.png')))
+
+    def test_oversized_file_rejected(self):
+        self.server.files['/big.png'] = b'x' * 2000
+        with self.assertRaises(ValueError):
+            self.make_mirror().fetch(self.url('/big.png'))
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'remote')), [])
+
+    def test_fetches_started_together_refresh_once(self):
+        mirror = self.make_mirror()
+        fetch = mirror.fetch
+        release = threading.Event()
+        refreshed = mock.Mock()
+
+        def held_fetch(url):
+            release.wait(5)
+            return fetch(url)
+
+        with mock.patch.object(mirror, 'fetch', side_effect=held_fetch):
+            for path in ('/a.png', '/b.png', '/c.png', '/missing.png'):
+                mirror.schedule_fetch(self.url(path), on_fetched=refreshed)
+            release.set()
+            mirror._executor.shutdown(wait=True)
+
+        refreshed.assert_called_once_with()
+        self.assertIsNotNone(mirror.lookup(self.url('/c.png')))
+
+    def test_local_url_remembered_per_content_version(self):
+        mirror = self.make_mirror()
+        name = mirror.fetch(self.url('/a.png'))
+        with mock.patch('core.remote_media.get_remote_media', return_value=mirror):
+            self.assertEqual(remote_media.local_url(self.url('/a.png')), f'/media/{name}')
+            with mock.patch.object(mirror, 'lookup') as lookup:
+                self.assertEqual(remote_media.local_url(self.url('/a.png')), f'/media/{name}')
+                lookup.assert_not_called()
+
+                bump_content_version()
+                remote_media.local_url(self.url('/a.png'))
+                lookup.assert_called_once_with(self.url('/a.png'))
+
+
+@override_settings(CACHES=LOCMEM_CACHES, REMOTE_MEDIA_ENABLED=False)
+class PageCacheTests(TestCase):
+    message = {'name': 'Ada', 'email': 'ada@example.com', 'subject': 'Hello', 'message': 'Hi there.'}
+
+    def setUp(self):
+        cache.clear()
+
+    def test_miss_then_hit(self):
+        self.assertEqual(self.client.get('/')['X-Page-Cache'], 'miss')
+        self.assertEqual(self.client.get('/')['X-Page-Cache'], 'hit')
+
+    def test_warm_homepage_runs_no_queries(self):
+        Project.objects.create(title='App', slug='app')
+        self.client.get('/')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/').status_code, 200)
+
+    def test_content_version_survives_culling(self):
+        version = get_content_version()
+        cache.clear()
+        self.assertEqual(get_content_version(), version)
+
+    def test_each_visitor_gets_their_own_csrf_token(self):
+        self.client.get('/')
+        tokens = []
+        for _ in range(2):
+            visitor = Client(enforce_csrf_checks=True)
+            response = visitor.get('/')
+            self.assertEqual(response['X-Page-Cache'], 'hit')
+            token = CSRF_INPUT.search(response.content.decode()).group(0)
+            token = re.search(r'value="([^"]*)"', token).group(1)
+            self.assertNotEqual(token, page_cache.CSRF_PLACEHOLDER)
+            tokens.append(token)
+            self.assertRedirects(visitor.post('/', {**self.message, 'csrfmiddlewaretoken': token}), '/')
+        self.assertNotEqual(tokens[0], tokens[1])
+        self.assertEqual(ContactMessage.objects.count(), 2)
+
+    def test_project_save_purges_its_page_and_the_homepage(self):
+        first = Project.objects.create(title='First', slug='first')
+        Project.objects.create(title='Second', slug='second')
+        paths = ['/', project_path('first'), project_path('second')]
+        for path in paths:
+            self.client.get(path)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.title = 'First, renamed'
+            first.save()
+
+        self.assertIsNone(cache.get(page_key('/')))
+        self.assertIsNone(cache.get(page_key(project_path('first'))))
+        self.assertIsNotNone(cache.get(page_key(project_path('second'))))
+        self.assertIn('First, renamed', self.client.get(project_path('first')).content.decode())
+
+    def test_render_overlapping_a_change_is_not_kept(self):
+        def view(request):
+            bump_content_version()
+            return HttpResponse('before the save')
+
+        request = RequestFactory().get('/overlap/')
+        self.assertEqual(page_cache.cache_page_for_visitors(view)(request)['X-Page-Cache'], 'miss')
+        self.assertIsNone(cache.get(page_key('/overlap/')))
+
+
+@override_settings(CACHES=LOCMEM_CACHES, REMOTE_MEDIA_ENABLED=False)
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Project.objects.create(title='App', slug='app')
+
+    def warm(self, path):
+        # The first response sets the CSRF cookie the homepage's ETag depends on
+        self.client.get(path)
+        return self.client.get(path)
+
+    def test_matching_etag_is_not_modified(self):
+        for path in ('/', project_path('app')):
+            response = self.warm(path)
+            self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_unchanged_since_last_modified(self):
+        for path in ('/', project_path('app')):
+            response = self.warm(path)
+            not_modified = self.client.get(path, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+            self.assertEqual(not_modified.status_code, 304)
+
+    def test_content_change_moves_the_etag(self):
+        for path in ('/', project_path('app')):
+            etag = self.warm(path)['ETag']
+            bump_content_version()
+            response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+
+    def test_homepage_etag_follows_the_csrf_cookie(self):
+        etag = self.warm('/')['ETag']
+        self.client.cookies[settings.CSRF_COOKIE_NAME] = 'a' * 32
+        response = self.client.get('/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ExportStaticSiteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.output = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output)
+
+    def test_exported_homepage_has_no_contact_form(self):
+        self.assertEqual(export_static_site.render_page((self.output, '/')), ('/', 200))
+        with open(export_static_site.output_file(self.output, '/'), encoding='utf-8') as f:
+            html = f.read()
+        self.assertNotIn('csrfmiddlewaretoken', html)
+        self.assertIn('mailto:', html)
+        # The export neither reads nor fills the page cache
+        self.assertIsNone(cache.get(page_key('/')))
+        self.assertIn('csrfmiddlewaretoken', self.client.get('/').content.decode())
+
+    @override_settings(PORTFOLIO_PAGE_SIZE=2)
+    def test_exported_homepage_has_every_project(self):
+        tag = Tag.objects.create(name='Django', slug='django')
+        for i in range(5):
+            Project.objects.create(title=f'Project {i}', slug=f'project-{i}')
+        Project.objects.get(slug='project-3').tags.add(tag)
+
+        export_static_site.render_page((self.output, '/'))
+        with open(export_static_site.output_file(self.output, '/'), encoding='utf-8') as f:
+            html = f.read()
+        for i in range(5):
+            self.assertIn(project_path(f'project-{i}'), html)
+        # The grid is filtered in the page rather than through the project list endpoint
+        self.assertNotIn('data-url=', html)
+        self.assertIn('data-tags="django "', html)
+
+    def test_fingerprints_follow_derivatives_mirror_and_static_manifest(self):
+        project = Project.objects.create(title='App', slug='app', image='https://example.com/app.png')
+        path = project_path('app')
+        mirror = mock.Mock()
+        mirror.lookup.return_value = None
+
+        def fingerprint():
+            return export_static_site.page_fingerprints()[path]
+
+        with override_settings(REMOTE_MEDIA_ENABLED=True), \
+                mock.patch.object(export_static_site, 'get_remote_media', return_value=mirror):
+            before = fingerprint()
+            self.assertEqual(fingerprint(), before)
+
+            mirror.lookup.return_value = 'remote/app.png'
+            mirrored = fingerprint()
+            self.assertNotEqual(mirrored, before)
+
+            images.record_derivatives(project, 'image', project.image.name, [[320, 320]])
+            derived = fingerprint()
+            self.assertNotEqual(derived, mirrored)
+
+            manifest = mock.Mock(read_manifest=mock.Mock(return_value='{"paths": {"site.css": "site.1.css"}}'))
+            with mock.patch.object(export_static_site, 'staticfiles_storage', manifest):
+                self.assertNotEqual(fingerprint(), derived)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, REMOTE_MEDIA_ENABLED=False)
+class PopulateDbTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        settings_override = override_settings(CHATBOT_RECORDS_JOURNAL_PATH=os.path.join(tmp, 'records.journal'))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def populate(self, seed):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('populate_db', seed=seed, stdout=io.StringIO())
+
+    def test_pages_of_removed_rows_are_purged(self):
+        Project.objects.create(title='Old App', slug='old-app')
+        self.assertEqual(self.client.get(project_path('old-app'))['X-Page-Cache'], 'miss')
+        self.assertIsNotNone(cache.get(page_key(project_path('old-app'))))
+
+        self.populate(seed=7)
+        self.assertFalse(Project.objects.filter(slug='old-app').exists())
+        self.assertIsNone(cache.get(page_key(project_path('old-app'))))
+
+    def test_seed_repeats_the_data(self):
+        self.populate(seed=7)
+        first = list(Project.objects.order_by('slug').values_list('slug', flat=True))
+        self.populate(seed=7)
+        self.assertEqual(list(Project.objects.order_by('slug').values_list('slug', flat=True)), first)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, REMOTE_MEDIA_ENABLED=False, PORTFOLIO_PAGE_SIZE=3)
+class ProjectListTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        for i in range(8):
+            Project.objects.create(title=f'Project {i}', slug=f'project-{i}', featured=i in (2, 5))
+        # Ties on created_at fall back to the primary key
+        Project.objects.filter(slug__in=['project-0', 'project-1', 'project-3']).update(
+            created_at=Project.objects.get(slug='project-0').created_at
+        )
+
+    def walk(self, **params):
+        slugs, cursor = [], ''
+        while True:
+            response = self.client.get('/portfolio/', {**params, 'cursor': cursor})
+            self.assertEqual(response.status_code, 200)
+            page = response.json()
+            self.assertLessEqual(len(page['projects']), 3)
+            slugs += [project['slug'] for project in page['projects']]
+            cursor = page['next']
+            if not cursor:
+                return slugs
+
+    def test_pages_cover_every_project_once_in_grid_order(self):
+        expected = list(Project.objects.order_by('-featured', '-created_at', '-pk').values_list('slug', flat=True))
+        self.assertEqual(self.walk(), expected)
+        self.assertEqual(expected[:2], ['project-5', 'project-2'])
+
+    def test_html_format_returns_next_cursor_header(self):
+        response = self.client.get('/portfolio/', {'format': 'html'})
+        self.assertIn('project-5', response.content.decode())
+        self.assertEqual(response['X-Next-Cursor'], self.client.get('/portfolio/').json()['next'])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/portfolio/', {'cursor': 'not-a-cursor'}).status_code, 400)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, REMOTE_MEDIA_ENABLED=False)
+class TagSyncTests(TestCase):
+    def counts(self):
+        return dict(Tag.objects.values_list('slug', 'project_count'))
+
+    def test_counts_follow_tech_stack(self):
+        first = Project.objects.create(title='One', slug='one', tech_stack='Django, Python')
+        second = Project.objects.create(title='Two', slug='two', tech_stack='python ,React, React')
+        self.assertEqual(self.counts(), {'django': 1, 'python': 2, 'react': 1})
+        self.assertEqual(set(second.tags.values_list('slug', flat=True)), {'python', 'react'})
+
+        first.tech_stack = 'Django'
+        first.save()
+        self.assertEqual(self.counts(), {'django': 1, 'python': 1, 'react': 1})
+
+        second.delete()
+        self.assertEqual(self.counts(), {'django': 1})
+
+    def test_only_added_or_removed_tags_are_recounted(self):
+        project = Project.objects.create(title='One', slug='one', tech_stack='Django, Python')
+        Tag.objects.filter(slug='python').update(project_count=99)
+
+        project.tech_stack = 'Django, Python, Go'
+        project.save()
+        self.assertEqual(self.counts(), {'django': 1, 'python': 99, 'go': 1})
+
+    def test_tags_cannot_be_deleted_in_admin(self):
+        tag_admin = admin.site._registry[Tag]
+        request = RequestFactory().get('/admin/core/tag/')
+        request.user = User(is_superuser=True, is_staff=True, is_active=True)
+        self.assertFalse(tag_admin.has_delete_permission(request))
+        self.assertFalse(tag_admin.has_add_permission(request))
+
+
+@override_settings(CACHES=LOCMEM_CACHES, REMOTE_MEDIA_ENABLED=False)
+class SearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Project.objects.create(title='Deploy Pipeline', slug='deploy-pipeline', description='Deployed with Docker.')
+        Project.objects.create(title='Chess Engine', slug='chess-engine', description='A bitboard engine.')
+        ContactMessage.objects.create(name='Ada', email='ada@example.com', subject='Docker question', message='Hi')
+
+    def test_site_search_ranks_and_highlights(self):
+        results = self.client.get('/search/', {'q': 'deploy'}).json()['results']
+        self.assertEqual([result['title'] for result in results], ['Deploy Pipeline'])
+        self.assertIn('<mark>', results[0]['snippet'])
+        # Contact messages are only searched from the admin
+        self.assertEqual(self.client.get('/search/', {'q': 'docker', 'type': 'project'}).json()['results'][0]['title'],
+                         'Deploy Pipeline')
+        self.assertEqual(self.client.get('/search/', {'q': 'question'}).json()['results'], [])
+
+    def test_admin_search_filters_with_a_subquery(self):
+        matches = Project.objects.filter(search.matching(Project, 'engin'))
+        self.assertIn('core_search_index', str(matches.query))
+        self.assertEqual([project.slug for project in matches], ['chess-engine'])
+        self.assertEqual(ContactMessage.objects.filter(search.matching(ContactMessage, 'docker')).count(), 1)
+        self.assertFalse(Project.objects.filter(search.matching(Project, '!!')).exists())
+
+    def test_index_follows_saves_and_deletes(self):
+        project = Project.objects.get(slug='chess-engine')
+        project.title = 'Go Engine'
+        project.save()
+        self.assertTrue(Project.objects.filter(search.matching(Project, 'go')).exists())
+        project.delete()
+        self.assertFalse(Project.objects.filter(search.matching(Project, 'engine')).exists())
+
+    def test_admin_changelist_search(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        response = self.client.get('/admin/core/project/', {'q': 'engine'})
+        self.assertContains(response, 'Chess Engine')
+        self.assertNotContains(response, 'Deploy Pipeline')
+
+
+@override_settings(CACHES=LOCMEM_CACHES, REMOTE_MEDIA_ENABLED=False)
+class ContactSpoolTests(TestCase):
+    message = {'name': 'Ada', 'email': 'ada@example.com', 'subject': 'Hello', 'message': 'Hi there.'}
+
+    def setUp(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        settings_override = override_settings(CONTACT_SPOOL_PATH=os.path.join(tmp, 'spool.sqlite3'))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(self.reset_spool)
+
+    @staticmethod
+    def reset_spool():
+        if contact_spool._spool is not None:
+            contact_spool._spool._conn.close()
+        contact_spool._spool = None
+
+    def test_saved_during_the_request_by_default(self):
+        self.assertRedirects(self.client.post('/', self.message), '/')
+        self.assertEqual(ContactMessage.objects.get().subject, 'Hello')
+        self.assertNotIn('\ncontact_spool_depth ', chatbot_metrics.render())
+
+    @override_settings(CONTACT_SPOOL_ENABLED=True)
+    def test_spooled_then_stored_in_batches(self):
+        self.assertRedirects(self.client.post('/', self.message), '/')
+        self.assertRedirects(self.client.post('/', {**self.message, 'subject': 'Again'}), '/')
+        self.assertFalse(ContactMessage.objects.exists())
+        self.assertIn('\ncontact_spool_depth 2\n', chatbot_metrics.render())
+
+        call_command('process_contact_spool', once=True, batch_size=1, stdout=io.StringIO())
+        self.assertEqual(list(ContactMessage.objects.order_by('pk').values_list('subject', flat=True)), ['Hello', 'Again'])
+        self.assertIn('\ncontact_spool_depth 0\n', chatbot_metrics.render())
+
+    @override_settings(CONTACT_SPOOL_MAX_ATTEMPTS=2)
+    def test_bad_submission_becomes_a_dead_letter(self):
+        spool = contact_spool.get_contact_spool()
+        spool.enqueue({**self.message, 'subject': 'Broken', 'unknown_field': 1})
+        spool.enqueue(self.message)
+
+        with mock.patch('builtins.print'):
+            self.assertEqual(contact_spool.process_batch(spool, 10), 1)
+            self.assertEqual(spool.dead_letter_count(), 0)
+            spool.enqueue({**self.message, 'subject': 'Again'})
+            self.assertEqual(contact_spool.process_batch(spool, 10), 1)
+
+        self.assertEqual(spool.depth(), 0)
+        self.assertEqual(spool.dead_letter_count(), 1)
+        self.assertEqual(list(ContactMessage.objects.order_by('pk').values_list('subject', flat=True)), ['Hello', 'Again'])
+
+        output = io.StringIO()
+        call_command('process_contact_spool', requeue_dead_letters=True, stdout=output)
+        self.assertIn('Requeued 1', output.getvalue())
+        self.assertEqual(spool.peek(10)[0][1]['subject'], 'Broken')
+        self.assertEqual(spool.depth(), 1)
+
+    @override_settings(CONTACT_SPOOL_MAX_ATTEMPTS=1)
+    def test_outage_does_not_use_up_attempts(self):
+        spool = contact_spool.get_contact_spool()
+        spool.enqueue(self.message)
+        spool.enqueue({**self.message, 'subject': 'Again'})
+
+        with mock.patch.object(ContactMessage.objects, 'bulk_create', side_effect=RuntimeError('database is down')):
+            for _ in range(3):
+                with self.assertRaises(RuntimeError):
+                    contact_spool.process_batch(spool, 10)
+        self.assertEqual(spool.dead_letter_count(), 0)
+        self.assertEqual(contact_spool.process_batch(spool, 10), 2)
+
+    @override_settings(CONTACT_SPOOL_ENABLED=True, CONTACT_SPOOL_MAX_DEPTH=1)
+    def test_full_spool_asks_visitor_to_retry(self):
+        self.client.post('/', self.message)
+        response = self.client.post('/', self.message)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '120')
+        self.assertEqual(contact_spool.get_contact_spool().depth(), 1)
@@ -5,6 +5,9 @@ from .views import ProjectDetailView, ServiceDetailView
 urlpatterns = [
     path('', views.index, name='homepage'),
     path('preview/', views.preview, name='preview'),
+    path('portfolio/', views.project_list, name='project_list'),
+    path('tags/', views.tag_list, name='tag_list'),
+    path('search/', views.search, name='search'),
     path('portfolio/<slug:slug>/', ProjectDetailView.as_view(), name='project_detail'),
     path('services/<slug:slug>/', ServiceDetailView.as_view(), name='service_detail'),
 ]
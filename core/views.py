@@ -1,47 +1,136 @@
+import hashlib
+
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render, redirect
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET
 from django.views.generic import DetailView
 
-from .forms import ContactForm
-from .models import (
-    Profile, SocialLink, SkillCategory, Project, ProjectCategory,
-    Experience, Education, Certification, Service, Stat, Award, ContactMessage
+from .contact_spool import SpoolFull, get_contact_spool
+from .content import (
+    get_content_last_modified, get_content_version, get_homepage_context, get_project_page, get_search_results
 )
+from .forms import ContactForm
+from .models import Project, Service, Tag
+from .page_cache import cache_page_for_visitors, is_static_export
+from .portfolio import project_queryset
+from .search import public_types
+
+
+# --- Conditional GET ---
+# Pages are validated against the site-wide content version, so an unchanged
+# page gets a 304 without touching the cache of rendered pages or the database.
+
+def content_etag(request, *args, **kwargs):
+    return get_content_version()
+
+
+def homepage_etag(request, *args, **kwargs):
+    # The contact form's CSRF token belongs to the visitor's cookie, so a browser
+    # that got a new cookie must not reuse a page rendered for the old one.
+    csrf_cookie = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+    return f"{get_content_version()}-{hashlib.sha256(csrf_cookie.encode()).hexdigest()[:12]}"
+
 
+def content_last_modified(request, *args, **kwargs):
+    return get_content_last_modified()
 
+
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=homepage_etag, last_modified_func=content_last_modified)
+@cache_page_for_visitors
 def index(request):
+    status = 200
     if request.method == 'POST':
         form = ContactForm(request.POST)
         if form.is_valid():
-            form.save()
-            return redirect('homepage')
+            if not settings.CONTACT_SPOOL_ENABLED:
+                form.save()
+                return redirect('homepage')
+            try:
+                # Queued outside the site database; process_contact_spool stores it
+                get_contact_spool().enqueue(form.cleaned_data)
+                return redirect('homepage')
+            except SpoolFull:
+                form.add_error(None, "We're receiving a lot of messages right now. Please try again in a few minutes.")
+                status = 503
     else:
         form = ContactForm()
 
-    # Get the most recently updated profile
-    profile = Profile.objects.latest('updated_at') if Profile.objects.exists() else None
+    # The content comes from a cached snapshot that is rebuilt after any admin edit
+    context = get_homepage_context()
+    context['form'] = form
+    # A static copy can't take a POST, and a CSRF token baked into it would be shared by every visitor
+    context['static_export'] = is_static_export(request)
+    if context['static_export']:
+        # Nor can it page through the project list endpoint, so its grid holds every project
+        context['projects'] = list(project_queryset())
+        context['projects_next'] = None
+    response = render(request, template_name='index_snapfolio.html', context=context, status=status)
+    if status == 503:
+        response['Retry-After'] = '120'
+    return response
+
+
+@require_GET
+@cache_control(no_cache=True)
+@condition(etag_func=content_etag, last_modified_func=content_last_modified)
+def project_list(request):
+    """
+    One page of the portfolio grid, as JSON with a rendered HTML fragment.
+
+    Takes an optional `category` or `tag` slug and the `cursor` returned as `next`
+    by the previous page. `format=html` returns just the fragment, with the next cursor
+    in the X-Next-Cursor header.
+    """
+    try:
+        page = get_project_page(
+            request.GET.get('category') or None,
+            request.GET.get('cursor') or None,
+            tag=request.GET.get('tag') or None,
+        )
+    except ValueError:
+        return JsonResponse({'error': 'Invalid cursor.'}, status=400)
+
+    if request.GET.get('format') == 'html':
+        response = HttpResponse(page['html'])
+        response['X-Next-Cursor'] = page['next'] or ''
+        return response
+    return JsonResponse(page)
 
-    context = {
-        'profile': profile,
-        'socials': SocialLink.objects.all(),
-        'skill_categories': SkillCategory.objects.prefetch_related('skills').all(),
 
-        # Portfolio Section
-        # select_related boosts performance by fetching the category in the same query
-        'projects': Project.objects.select_related('category').all(),
-        'project_categories': ProjectCategory.objects.all(),  # For the filter buttons
+@require_GET
+@cache_control(no_cache=True)
+@condition(etag_func=content_etag, last_modified_func=content_last_modified)
+def tag_list(request):
+    """Every tag with the number of projects using it, most used first."""
+    tags = Tag.objects.values('name', 'slug', 'project_count')
+    return JsonResponse({'tags': [
+        {'name': tag['name'], 'slug': tag['slug'], 'count': tag['project_count']} for tag in tags
+    ]})
 
-        # Resume Section
-        'experiences': Experience.objects.all(),
-        'education_list': Education.objects.all(),
-        'certifications': Certification.objects.all(),
-        'awards': Award.objects.all(),
 
-        # Other Sections
-        'stats': Stat.objects.all(),
-        'services': Service.objects.all(),
-        'form': form,
-    }
-    return render(request, template_name='index_snapfolio.html', context=context)
+@require_GET
+@cache_control(no_cache=True)
+@condition(etag_func=content_etag, last_modified_func=content_last_modified)
+def search(request):
+    """
+    Ranked full-text search over projects, services and the resume.
+
+    Takes the query as `q` and optionally one or more `type`s to search
+    (project, service, experience, ...). Matches in the snippets are wrapped in <mark>.
+    """
+    query = request.GET.get('q', '').strip()
+    if len(query) > settings.SEARCH_QUERY_MAX_LENGTH:
+        return JsonResponse({'error': 'Query too long.'}, status=400)
+    types = request.GET.getlist('type')
+    if any(type_ not in public_types() for type_ in types):
+        return JsonResponse({'error': 'Unknown type.', 'types': public_types()}, status=400)
+
+    results = get_search_results(query, types) if query else []
+    return JsonResponse({'query': query, 'results': results})
 
 
 def preview(request):
@@ -49,11 +138,20 @@ def preview(request):
     return render(request, 'index_snapfolio.html', {})
 
 
+detail_page_decorators = [
+    cache_control(no_cache=True),
+    condition(etag_func=content_etag, last_modified_func=content_last_modified),
+    cache_page_for_visitors,
+]
+
+
+@method_decorator(detail_page_decorators, name='dispatch')
 class ProjectDetailView(DetailView):
     model = Project
     template_name = 'portfolio_detail_snapfolio.html'
 
 
+@method_decorator(detail_page_decorators, name='dispatch')
 class ServiceDetailView(DetailView):
     model = Service
     template_name = 'service_detail_snapfolio.html'
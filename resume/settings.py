@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 import os.path
+import sys
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -86,6 +87,34 @@ DATABASES = {
 }
 
 
+# Cache
+# File-based so every worker process shares it: a content change saved by one
+# process (e.g. the admin) invalidates the cached pages of all the others.
+# 'default' holds pages, snapshots and search results (keyed by visitors'
+# queries), and culls a third of its entries at random once it's full. The
+# content version lives in a cache of its own so that culling can't drop it,
+# which would invalidate every snapshot and change every page's ETag.
+# `manage.py test` keeps both in memory instead of writing into BASE_DIR/cache.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '5000'))},
+    },
+    'content_version': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'content-version',
+    },
+}
+
+if sys.argv[1:2] == ['test']:
+    CACHES = {
+        alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': alias}
+        for alias in CACHES
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -132,12 +161,165 @@ STATICFILES_DIRS = [
 # The destination folder for collected static files (used in production or collectstatic)
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# With STATIC_HASHED_FILES=1 in the environment (set it on the production server), collectstatic
+# writes content-hashed copies of every file plus gzip (and, with the brotli package installed,
+# brotli) variants, served by core.static_views.serve_static. Pages then can't be rendered with
+# DEBUG off until collectstatic has run, so development and `manage.py test` keep plain names.
+if os.getenv('STATIC_HASHED_FILES') == '1':
+    STATICFILES_STORAGE = 'core.storage.CompressedManifestStaticFilesStorage'
+else:
+    STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+
+# Cache lifetime in seconds for static files requested by their unhashed name
+STATIC_MAX_AGE = 60 * 60
+
 # Media files (uploads)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Remote image and resume URLs stored in file fields are mirrored under MEDIA_ROOT/REMOTE_MEDIA_DIR
+# on first use and served from there; the least recently used copies go past REMOTE_MEDIA_MAX_BYTES
+REMOTE_MEDIA_ENABLED = True
+REMOTE_MEDIA_DIR = 'remote'
+REMOTE_MEDIA_INDEX_PATH = BASE_DIR / 'remote_media.sqlite3'
+REMOTE_MEDIA_MAX_BYTES = 256 * 1024 * 1024
+REMOTE_MEDIA_MAX_FILE_BYTES = 20 * 1024 * 1024
+REMOTE_MEDIA_TIMEOUT = 10
+
+# Widths of the WebP/JPEG derivatives generated next to each uploaded image, for srcset
+IMAGE_DERIVATIVE_WIDTHS = [320, 640, 960, 1280]
+
+# Worker processes that generate image derivatives in the background after an upload
+IMAGE_DERIVATIVE_WORKERS = 2
+
+# Projects per page of the homepage portfolio grid; later pages load as the grid scrolls
+PORTFOLIO_PAGE_SIZE = 6
+
+# Number of most-used tech stack tags offered as filters next to the portfolio grid
+PORTFOLIO_TAG_LIMIT = 12
+
+# Contact form submissions are saved during the request. With CONTACT_SPOOL_ENABLED they are
+# queued in CONTACT_SPOOL_PATH instead and moved into the database in batches by
+# `manage.py process_contact_spool`, which must then run regularly (e.g. from cron); the form asks
+# visitors to retry once CONTACT_SPOOL_MAX_DEPTH wait. The queue depth is on the chatbot metrics endpoint.
+CONTACT_SPOOL_ENABLED = os.getenv('CONTACT_SPOOL_ENABLED') == '1'
+CONTACT_SPOOL_PATH = BASE_DIR / 'contact_spool.sqlite3'
+CONTACT_SPOOL_MAX_DEPTH = 10000
+CONTACT_SPOOL_BATCH_SIZE = 200
+# A submission that fails to store this many times (while others are stored) is set aside
+# as a dead letter; `process_contact_spool --requeue-dead-letters` puts them back.
+CONTACT_SPOOL_MAX_ATTEMPTS = 5
+
+# Backend holding the site search index; core.search.DatabaseBackend falls back to LIKE queries
+# on databases without FTS5
+SEARCH_BACKEND = 'core.search.SqliteFTS5Backend'
+
+# Results returned by the public search endpoint, and the longest query it accepts
+SEARCH_RESULT_LIMIT = 20
+SEARCH_QUERY_MAX_LENGTH = 100
+
+# Where `manage.py export_static_site` writes the pre-rendered pages
+STATIC_EXPORT_DIR = BASE_DIR / 'static_export'
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Chatbot
+# Prebuilt FAISS artifacts written by `manage.py build_chatbot_index`, one directory per content hash
+CHATBOT_INDEX_DIR = BASE_DIR / 'chatbot' / 'data' / 'index'
+
+# Persistent cache of chunk and query embeddings, keyed by model and normalized text
+CHATBOT_EMBEDDING_CACHE_PATH = BASE_DIR / 'chatbot' / 'data' / 'embedding_cache.sqlite3'
+CHATBOT_EMBEDDING_CACHE_MAX_ENTRIES = 20000
+
+# Answer cache: exact normalized repeats, then near-duplicates above the cosine similarity threshold
+CHATBOT_ANSWER_CACHE_TTL = 60 * 60 * 24
+CHATBOT_ANSWER_CACHE_SIMILARITY = 0.95
+CHATBOT_ANSWER_CACHE_MAX_ENTRIES = 500
+
+# Async /chatbot/ask/async/ endpoint: concurrent LLM calls per event loop and per-question timeout (seconds)
+CHATBOT_MAX_CONCURRENT_REQUESTS = 32
+CHATBOT_REQUEST_TIMEOUT = 30
+
+# Rate limits for the /chatbot/ask/ endpoints: token buckets per client IP and for the whole site.
+# Buckets live in CHATBOT_RATE_LIMIT_STORE: chatbot.rate_limit.SqliteBucketStore shares them between
+# worker processes through CHATBOT_RATE_LIMIT_PATH, MemoryBucketStore keeps them per process.
+# Behind a proxy, set CHATBOT_CLIENT_IP_HEADER (e.g. 'HTTP_X_FORWARDED_FOR') to find the client's IP, and
+# CHATBOT_TRUSTED_PROXY_HOPS to the number of proxies of ours that append to it (the client's IP is
+# that many entries from the right; anything further left was sent by the client).
+CHATBOT_RATE_LIMIT_ENABLED = True
+CHATBOT_RATE_LIMIT_STORE = 'chatbot.rate_limit.SqliteBucketStore'
+CHATBOT_RATE_LIMIT_PATH = BASE_DIR / 'chatbot' / 'data' / 'rate_limits.sqlite3'
+CHATBOT_RATE_LIMIT_CLIENT_PER_MINUTE = 6
+CHATBOT_RATE_LIMIT_CLIENT_BURST = 5
+CHATBOT_RATE_LIMIT_GLOBAL_PER_MINUTE = 120
+CHATBOT_RATE_LIMIT_GLOBAL_BURST = 30
+CHATBOT_CLIENT_IP_HEADER = None
+CHATBOT_TRUSTED_PROXY_HOPS = 1
+
+# Model backends: 'google' (Gemini) or the offline stand-ins in chatbot.backends,
+# 'local' hashed embeddings and an 'echo' LLM with simulated latency (seconds)
+CHATBOT_EMBEDDING_BACKEND = os.getenv('CHATBOT_EMBEDDING_BACKEND', 'google')
+CHATBOT_LLM_BACKEND = os.getenv('CHATBOT_LLM_BACKEND', 'google')
+CHATBOT_LOCAL_EMBEDDING_DIM = 512
+CHATBOT_ECHO_LATENCY = float(os.getenv('CHATBOT_ECHO_LATENCY', '0'))
+CHATBOT_ECHO_TOKEN_DELAY = float(os.getenv('CHATBOT_ECHO_TOKEN_DELAY', '0'))
+
+# Hybrid retrieval: BM25 and FAISS candidates (fetch_k each) merged by reciprocal-rank fusion into k chunks.
+# When the best BM25 hit reaches the skip score (normalized 0-1) and leads the runner-up by the margin,
+# the BM25 results are used alone and the query is never embedded.
+CHATBOT_RETRIEVAL_K = 4
+CHATBOT_HYBRID_FETCH_K = 10
+CHATBOT_HYBRID_RRF_K = 60
+CHATBOT_HYBRID_LEXICAL_SKIP_SCORE = 0.8
+CHATBOT_HYBRID_LEXICAL_SKIP_MARGIN = 0.3
+
+# Chunking of biography.txt: a strategy from chatbot.rag_logic.CHUNK_STRATEGIES ('recursive', 'sentence'
+# or 'line') with chunk size and overlap in characters. Changing these builds a new index version.
+CHATBOT_CHUNK_STRATEGY = 'recursive'
+CHATBOT_CHUNK_SIZE = 1000
+CHATBOT_CHUNK_OVERLAP = 200
+
+# Maximal marginal relevance over the fused candidates (1 = relevance only, lower = more varied chunks);
+# None keeps the plain fused ranking
+CHATBOT_MMR_LAMBDA = 0.6
+
+# Approximate prompt tokens of retrieved context sent to the LLM; overlapping chunks are deduplicated
+# and the last one that fits is trimmed. None sends the k chunks as they are.
+# Tune both with `manage.py evaluate_retrieval`.
+CHATBOT_CONTEXT_TOKEN_BUDGET = 650
+
+# Every core record change is appended to this journal, so each worker re-reads only the changed rows
+# into its records index; past CHATBOT_RECORDS_JOURNAL_MAX_BYTES a new journal is started and every
+# worker re-syncs in full once
+CHATBOT_RECORDS_JOURNAL_PATH = CHATBOT_INDEX_DIR / 'records.journal'
+CHATBOT_RECORDS_JOURNAL_MAX_BYTES = 1024 * 1024
+
+# Per-stage timers and counters for the chatbot pipeline, served in the Prometheus text format at
+# /chatbot/metrics/ to staff users or to requests sending `Authorization: Bearer <CHATBOT_METRICS_TOKEN>`.
+# With CHATBOT_METRICS_LOG_REQUESTS on, each question also logs its stage timings to 'chatbot.metrics'.
+CHATBOT_METRICS_ENABLED = True
+CHATBOT_METRICS_LOG_REQUESTS = False
+CHATBOT_METRICS_TOKEN = os.getenv('CHATBOT_METRICS_TOKEN')
+
+# Sends the chatbot's per-request metrics lines to the console; Django's own logging is left as it is
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'chatbot.metrics': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}